@@ -0,0 +1,96 @@
+# app/api/admin.py
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+
+from ..core.config import settings
+from ..core.db import pool_stats, read_engine
+from ..schemas.pharmacy import InventoryFeedReport
+from ..services.availability import availability_cache
+from ..services.debug_capture import debug_capture
+from ..services.inventory_events import inventory_events
+from ..services.inventory_feed import FORMATS, FeedError, ingest, iter_lines, parse_feed
+from ..services.replica import replica_monitor
+from ..services.search import search_cache
+from ..services.slow_queries import slow_queries
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Admin routes don't exist unless a token is configured
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+
+router = APIRouter(prefix="/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/cache/search")
+async def search_cache_stats():
+    """Hit/miss counters of the product search result cache, for sizing it."""
+    return search_cache.stats()
+
+
+@router.get("/cache/availability")
+async def availability_cache_stats():
+    """Availability response cache counters and the state of the inventory change stream feeding it."""
+    return {
+        **availability_cache.stats(),
+        "listener_connected": inventory_events.connected,
+        "notifications": inventory_events.notifications,
+        "dispatches": inventory_events.dispatches,
+    }
+
+
+@router.get("/pool")
+async def database_pool_stats():
+    """
+    Connection pool occupancy and checkout waits (tells pool starvation apart
+    from slow queries), plus replica lag and routing counts when configured.
+    """
+    stats = {"primary": pool_stats()}
+    if read_engine is not None:
+        stats["replica"] = {
+            **pool_stats(read_engine),
+            "lag_seconds": round(replica_monitor.lag_seconds, 3),
+            "usable": replica_monitor.usable,
+            "replica_reads": replica_monitor.replica_reads,
+            "primary_reads": replica_monitor.primary_reads,
+        }
+    return stats
+
+
+@router.get("/captures")
+async def recent_captures(name: Optional[str] = None, limit: int = Query(20, ge=1, le=500)):
+    """Most recent sampled responses (newest first), optionally for one endpoint name."""
+    return {
+        "sample_rate": debug_capture.sample_rate,
+        "dropped": debug_capture.dropped,
+        "captures": debug_capture.recent(name, limit),
+    }
+
+
+@router.get("/slow-queries")
+async def recent_slow_queries(limit: int = Query(20, ge=1, le=500), min_ms: float = Query(0.0, ge=0)):
+    """Most recent statements over SLOW_QUERY_MS (newest first) with parameters and, when taken, their plan."""
+    return {
+        "threshold_ms": slow_queries.threshold_seconds * 1000,
+        "recorded": slow_queries.recorded,
+        "explained": slow_queries.explained,
+        "rate_limited": slow_queries.rate_limited,
+        "queries": slow_queries.recent(limit, min_ms),
+    }
+
+
+@router.post("/inventory/feed", response_model=InventoryFeedReport)
+async def inventory_feed(request: Request, format: str = Query("csv", enum=list(FORMATS))):
+    """
+    Stream a CSV/NDJSON partner feed (request body) into pharmacy_inventory.
+    A malformed line rejects the whole feed.
+    """
+    try:
+        return await ingest(parse_feed(iter_lines(request.stream()), format))
+    except FeedError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
@@ -0,0 +1,66 @@
+# app/api/bookings.py
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.auth import get_current_user
+from ..core.config import settings
+from ..core.db import get_db
+from ..models import Booking
+from ..schemas.booking import BookingCreate, BookingOut
+from ..services import reservations
+from ..services.replica import mark_write
+
+router = APIRouter(prefix="/bookings", tags=["bookings"])
+
+
+@router.post("", response_model=BookingOut, status_code=status.HTTP_201_CREATED)
+async def create_booking(
+    body: BookingCreate,
+    response: Response,
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """Hold qty units at a pharmacy for RESERVATION_MINUTES; 409 when they are not in stock."""
+    if body.qty > settings.RESERVATION_MAX_QTY:
+        raise HTTPException(status_code=422, detail=f"At most {settings.RESERVATION_MAX_QTY} units per booking")
+    try:
+        booking = await reservations.hold(db, user["uid"], body.pharmacy_id, body.package_id, body.qty)
+    except reservations.InsufficientStock:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Not enough stock")
+    mark_write(response)
+    return booking
+
+
+@router.get("", response_model=List[BookingOut])
+async def list_bookings(
+    limit: int = Query(50, ge=1, le=200),
+    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    rows = await db.execute(
+        select(Booking).where(Booking.user_uid == user["uid"]).order_by(Booking.created_at.desc()).limit(limit)
+    )
+    return rows.scalars().all()
+
+
+@router.post("/{booking_id}/confirm", response_model=BookingOut)
+async def confirm_booking(
+    booking_id: str, response: Response, user=Depends(get_current_user), db: AsyncSession = Depends(get_db),
+):
+    booking = await reservations.confirm(db, booking_id, user["uid"])
+    if booking is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No live hold with this id")
+    mark_write(response)
+    return booking
+
+
+@router.post("/{booking_id}/cancel", status_code=status.HTTP_204_NO_CONTENT)
+async def cancel_booking(
+    booking_id: str, response: Response, user=Depends(get_current_user), db: AsyncSession = Depends(get_db),
+):
+    if not await reservations.cancel(db, booking_id, user["uid"]):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="No live hold with this id")
+    mark_write(response)
@@ -1,18 +1,30 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy import select, func, literal_column
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, func, literal, literal_column, true
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, DefaultDict, Optional
+from typing import Dict, List, DefaultDict, Optional, Tuple
 from collections import defaultdict
-from ..core.db import get_db
+from ..core.config import settings
 from ..models import Pharmacy, PharmacyInventory, Package, Brand
-from ..schemas.product import PharmaciesSearchRequest, PharmacySearchResult, PharmacyPackageLine
+from ..schemas.product import (
+    PharmaciesSearchRequest, PharmacySearchResult, PharmacyPackageLine,
+    BasketQuoteRequest, BasketQuote, BasketPharmacyQuote, BasketLine,
+)
+from ..schemas.pharmacy import NearbyPharmacy
+from ..services.availability import availability_cache, availability_cache_active, availability_cache_fillable
+from ..services.basket import cheapest_split
+from ..services.debug_capture import debug_capture
+from ..services.geo_index import nearby_pharmacies, pharmacy_geo
+from ..services.replica import get_read_db
+from ..services.stock_index import pharmacies_with_all
 
 router = APIRouter(prefix="/pharmacies", tags=["pharmacies"])
 
 @router.post("/search", response_model=List[PharmacySearchResult])
 async def search_pharmacies(
     body: PharmaciesSearchRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     if not body.package_ids:
         return []
@@ -22,7 +34,29 @@ async def search_pharmacies(
     if body.lat is not None and body.lng is not None and body.radius_km is None:
         body.radius_km = DEFAULT_RADIUS_KM
 
-    # Build the base grouped query for header rows
+    cache_key = (
+        "pharmacy_search", tuple(sorted(set(body.package_ids))), body.lat, body.lng, body.radius_km,
+        body.must_have_all, body.sort_by, body.limit,
+    )
+    use_cache = availability_cache_active()
+    if use_cache:
+        cached = availability_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    in_stock = [
+        PharmacyInventory.package_id.in_(body.package_ids),
+        PharmacyInventory.stock_quantity.isnot(None),
+        PharmacyInventory.stock_quantity > 0,
+    ]
+
+    # must_have_all: intersect the in-stock bitmaps first so the aggregate
+    # only sees pharmacies that can match (HAVING below still double-checks)
+    stocked = pharmacies_with_all(body.package_ids) if body.must_have_all else None
+    if stocked is not None and not stocked:
+        return []
+
+    # Header aggregates per pharmacy; ordered and LIMITed before any lines are built
     header_stmt = (
         select(
             Pharmacy.id,
@@ -37,104 +71,205 @@ async def search_pharmacies(
             func.count(func.distinct(PharmacyInventory.package_id)).label("pkg_count"),
         )
         .join(PharmacyInventory, Pharmacy.id == PharmacyInventory.pharmacy_id)
-        .where(PharmacyInventory.package_id.in_(body.package_ids))
-        .where(PharmacyInventory.stock_quantity.isnot(None), PharmacyInventory.stock_quantity > 0)
+        .where(*in_stock)
         .group_by(Pharmacy.id)
     )
 
-
-    # Add distance column and radius filter conditionally (after broad filters)
-    if body.lat is not None and body.lng is not None:
-        distance_expr = Pharmacy.distance_to(body.lat, body.lng)
-        header_stmt = header_stmt.add_columns(func.min(distance_expr).label("distance_km"))
-        if body.radius_km is not None:
-            header_stmt = header_stmt.where(Pharmacy.lat.isnot(None), Pharmacy.lng.isnot(None))
-            header_stmt = header_stmt.where(distance_expr <= body.radius_km)
+    has_location = body.lat is not None and body.lng is not None
+    if has_location:
+        # radius_km is always set here (defaulted above). nearby yields one
+        # distance per pharmacy, which is selected, filtered and sorted on as is
+        nearby = nearby_pharmacies(body.lat, body.lng, body.radius_km, among=stocked)
+        header_stmt = (
+            header_stmt
+            .join(nearby, nearby.c.pharmacy_id == Pharmacy.id)
+            .add_columns(nearby.c.distance_km)
+            .group_by(nearby.c.distance_km)
+        )
     else:
         header_stmt = header_stmt.add_columns(literal_column("NULL").label("distance_km"))
+        if stocked is not None:
+            header_stmt = header_stmt.where(Pharmacy.id.in_(list(stocked)))
 
     # Apply HAVING if must_have_all (for multi-package: require all packages)
     if body.must_have_all:
         header_stmt = header_stmt.having(func.count(func.distinct(PharmacyInventory.package_id)) == len(body.package_ids))
 
-    # Apply sorting based on sort_by
-    if body.sort_by == "price":
-        header_stmt = header_stmt.order_by(func.min(PharmacyInventory.price_cents).asc().nulls_last())
-    elif body.sort_by == "name":
-        header_stmt = header_stmt.order_by(Pharmacy.name.asc())
-    else:
-        # Default: distance if available, else name
-        if body.lat is not None and body.lng is not None:
-            header_stmt = header_stmt.order_by(func.min(Pharmacy.distance_to(body.lat, body.lng)).asc().nulls_last())
-        else:
-            header_stmt = header_stmt.order_by(Pharmacy.name.asc())
-
-    # Apply limit
-    header_stmt = header_stmt.limit(body.limit)
-
-    # Execute header query
-    head_res = await db.execute(header_stmt)
-    header_rows = head_res.all()
-    if not header_rows:
-        return []
+    def ordering(cols):
+        if body.sort_by == "price":
+            return [cols.min_price_cents.asc().nulls_last()]
+        if body.sort_by == "name" or not has_location:
+            # Default: distance if available, else name
+            return [cols.name.asc()]
+        return [cols.distance_km.asc().nulls_last()]
+
+    header = (
+        header_stmt
+        .order_by(*ordering(header_stmt.selected_columns))
+        .limit(body.limit)
+        .subquery("header")
+    )
+
+    # Per-package lines, built only for the LIMITed pharmacies
+    line = func.jsonb_build_object(
+        "package_id", PharmacyInventory.package_id,
+        "price_cents", PharmacyInventory.price_cents,
+        "currency", PharmacyInventory.currency,
+        "stock_quantity", PharmacyInventory.stock_quantity,
+        "last_updated", PharmacyInventory.last_updated,
+        "brand_name", Brand.brand_name,
+    )
+    lines = (
+        select(func.coalesce(func.jsonb_agg(line), literal([], JSONB), type_=JSONB).label("packages"))
+        .select_from(PharmacyInventory)
+        .join(Package, PharmacyInventory.package_id == Package.id)
+        .join(Brand, Package.brand_id == Brand.id, isouter=True)  # Outer join since brand_id nullable
+        .where(PharmacyInventory.pharmacy_id == header.c.id, *in_stock)
+        .lateral("lines")
+    )
 
-    pharmacy_ids = [r[0] for r in header_rows]
+    rows = (await db.execute(
+        select(header, lines.c.packages)
+        .select_from(header)
+        .join(lines, true())
+        .order_by(*ordering(header.c))
+    )).mappings().all()
 
-    # Pull per-package lines, including brand_name via joins
-    lines_res = await db.execute(
+    results = [
+        PharmacySearchResult(
+            pharmacy_id=row["id"],
+            pharmacy_name=row["name"],
+            address=row["address"],
+            city=row["city"],
+            country=row["country"],
+            lat=row["lat"],
+            lng=row["lng"],
+            distance_km=float(row["distance_km"]) if row["distance_km"] is not None else None,
+            min_price_cents=int(row["min_price_cents"]) if row["min_price_cents"] is not None else None,
+            total_price_cents=int(row["total_price_cents"]) if row["total_price_cents"] is not None else None,
+            pkg_count=row["pkg_count"],
+            packages=[PharmacyPackageLine(**p) for p in row["packages"]],
+        )
+        for row in rows
+    ]
+    if use_cache and availability_cache_fillable(db):
+        availability_cache.set(cache_key, results, tags=set(body.package_ids))
+
+    debug_capture.capture(
+        "pharmacy_search", lambda: [r.model_dump(mode="json") for r in results],
+        request=body,
+    )
+    return results
+
+
+@router.post("/basket-quote", response_model=BasketQuote)
+async def basket_quote(
+    body: BasketQuoteRequest,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Cheapest way to buy the whole basket from at most max_pharmacies pharmacies in range."""
+    quantities: Dict[str, int] = {}
+    for item in body.items:
+        quantities[item.package_id] = quantities.get(item.package_id, 0) + item.quantity
+    package_ids = list(quantities)
+    item_index = {pkg_id: i for i, pkg_id in enumerate(package_ids)}
+
+    nearby = nearby_pharmacies(body.lat, body.lng, body.radius_km)
+    rows = (await db.execute(
         select(
             PharmacyInventory.pharmacy_id,
             PharmacyInventory.package_id,
             PharmacyInventory.price_cents,
             PharmacyInventory.currency,
             PharmacyInventory.stock_quantity,
-            PharmacyInventory.last_updated,
-            Brand.brand_name,
+            nearby.c.distance_km,
         )
-        .join(Package, PharmacyInventory.package_id == Package.id)
-        .join(Brand, Package.brand_id == Brand.id, isouter=True)  # Outer join since brand_id nullable
-        .where(PharmacyInventory.pharmacy_id.in_(pharmacy_ids))
-        .where(PharmacyInventory.package_id.in_(body.package_ids))
-        .where(PharmacyInventory.stock_quantity.isnot(None), PharmacyInventory.stock_quantity > 0)
+        .join(nearby, nearby.c.pharmacy_id == PharmacyInventory.pharmacy_id)
+        .where(PharmacyInventory.package_id.in_(package_ids))
+        .where(PharmacyInventory.price_cents.isnot(None), PharmacyInventory.stock_quantity > 0)
+    )).all()
+
+    # offers[pharmacy][item] = cheapest line cost among rows that cover the quantity
+    offers: DefaultDict[str, Dict[int, int]] = defaultdict(dict)
+    unit_prices: Dict[Tuple[str, int], Tuple[int, Optional[str]]] = {}
+    distances: Dict[str, float] = {}
+    for ph_id, pkg_id, price, currency, stock, distance in rows:
+        item = item_index[pkg_id]
+        if stock < quantities[pkg_id]:
+            continue
+        cost = int(price) * quantities[pkg_id]
+        if cost < offers[ph_id].get(item, cost + 1):
+            offers[ph_id][item] = cost
+            unit_prices[ph_id, item] = (int(price), currency)
+        distances[ph_id] = float(distance)
+
+    available = {item for items in offers.values() for item in items}
+    missing = [pkg_id for pkg_id in package_ids if item_index[pkg_id] not in available]
+    if missing:
+        return BasketQuote(feasible=False, missing_package_ids=missing)
+
+    split = await asyncio.to_thread(
+        cheapest_split, offers, len(package_ids), body.max_pharmacies, distances,
+        settings.BASKET_TIME_BUDGET_MS,
     )
-    lines = lines_res.all()
-
-    per_pharmacy: DefaultDict[str, List[PharmacyPackageLine]] = defaultdict(list)
-    for ph_id, pkg_id, price, curr, stock, lu, brand_name in lines:
-        per_pharmacy[ph_id].append(PharmacyPackageLine(
-            package_id=pkg_id,
-            price_cents=int(price) if price is not None else None,
-            currency=curr,
-            stock_quantity=stock,
-            last_updated=lu.isoformat() if lu else None,
-            brand_name=brand_name,  # Will be None if no brand
-        ))
+    if split is None:
+        # every package is in range, just not within max_pharmacies stops
+        return BasketQuote(feasible=False)
 
-    # Build final list
-    results: List[PharmacySearchResult] = []
-    for row in header_rows:
-        # Unpack row (adjust index if distance_km is present)
-        ph_id, name, addr, city, country, lat, lng, min_price, total_price, pkg_count = row[:10]
-        distance_km = row[10] if len(row) > 10 else None  # Handles case without distance
-        results.append(PharmacySearchResult(
+    pharmacies = {
+        p.id: p for p in (await db.execute(
+            select(Pharmacy).where(Pharmacy.id.in_(list(split.assignment)))
+        )).scalars()
+    }
+    quotes: List[BasketPharmacyQuote] = []
+    for ph_id, items in split.assignment.items():
+        lines = []
+        for item in items:
+            unit_price, currency = unit_prices[ph_id, item]
+            pkg_id = package_ids[item]
+            lines.append(BasketLine(
+                package_id=pkg_id,
+                quantity=quantities[pkg_id],
+                unit_price_cents=unit_price,
+                line_total_cents=offers[ph_id][item],
+                currency=currency,
+            ))
+        pharmacy = pharmacies[ph_id]
+        quotes.append(BasketPharmacyQuote(
             pharmacy_id=ph_id,
-            pharmacy_name=name,
-            address=addr,
-            city=city,
-            country=country,
-            lat=lat,
-            lng=lng,
-            distance_km=float(distance_km) if distance_km is not None else None,
-            min_price_cents=int(min_price) if min_price is not None else None,
-            total_price_cents=int(total_price) if total_price is not None else None,
-            pkg_count=pkg_count,
-            packages=per_pharmacy.get(ph_id, []),
+            pharmacy_name=pharmacy.name,
+            address=pharmacy.address,
+            city=pharmacy.city,
+            distance_km=round(distances[ph_id], 3),
+            subtotal_cents=sum(line.line_total_cents for line in lines),
+            lines=lines,
         ))
+    quotes.sort(key=lambda q: q.distance_km)
+
+    result = BasketQuote(
+        feasible=True,
+        total_cents=split.total_cents,
+        total_distance_km=round(split.distance_km, 3),
+        optimal=split.exhaustive,
+        pharmacies=quotes,
+    )
+    debug_capture.capture("basket_quote", lambda: result.model_dump(mode="json"), request=body)
+    return result
 
-    # For debugging: Serialize to JSON
-    serializable_results = [result.model_dump() for result in results]
-    import json
-    with open("pharma_results.json", "w") as file:
-        json.dump(serializable_results, file, indent=2)
 
-    return results
\ No newline at end of file
+@router.get("/nearest", response_model=List[NearbyPharmacy])
+async def nearest_pharmacies(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=100),
+    max_radius_km: Optional[float] = Query(None, gt=0),
+):
+    """k nearest pharmacies, answered from the in-memory geo index."""
+    if not pharmacy_geo.ready:
+        raise HTTPException(503, "Pharmacy index is not loaded yet")
+    index = pharmacy_geo.index
+    results = []
+    for pid, distance in index.nearest(lat, lng, k, max_radius_km):
+        country, city = index.place(pid)
+        results.append(NearbyPharmacy(pharmacy_id=pid, distance_km=round(distance, 3), country=country, city=city))
+    return results
@@ -1,40 +1,106 @@
 # app/routers/products.py
-from fastapi import APIRouter, Depends, Query, HTTPException
+import asyncio
+import logging
+from fastapi import APIRouter, Depends, Query, HTTPException, WebSocket, WebSocketDisconnect
 from sqlalchemy import select, or_, and_, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from typing import Optional, List, Dict, DefaultDict
-from collections import defaultdict
+from typing import Optional
 
-from ..core.db import get_db
-from ..models import Product, Package, Brand, PharmacyInventory, Pharmacy, Translation
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import Product, Brand, Translation
 from ..schemas.product import (
     ProductSearchItem,
     ProductDetailModel,
     PackageAvailabilityInfo,
-    PharmacyLocationInfo,
 )
+from ..services.availability import availability_cache, availability_cache_active, availability_cache_fillable, product_detail_stmt
+from ..services.catalog_snapshot import catalog_snapshot, package_locations_stmt
+from ..services.catalog_version import catalog_versions
+from ..services.debug_capture import debug_capture
+from ..services.inventory_events import inventory_events
+from ..services.live_stock import RESYNC, LiveSubscription, live_stock
+from ..services.replica import get_read_db
+from ..services.search import docs_search_stmt, fold, search_cache, trigram_search_stmt
+from ..services.translations import translation_stmt
+from ..services.typeahead import typeahead
+
+log = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/products", tags=["products"])
 
+@router.get("/typeahead", response_model=list[ProductSearchItem])
+async def typeahead_products(
+    q: str,
+    limit: int = Query(10, ge=1, le=50),
+    language: Optional[str] = Query("en"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Prefix suggestions served from the in-memory index (no database round trip).
+    Falls back to the ranked database search until the index has been built.
+    """
+    if settings.TYPEAHEAD_ENABLED and typeahead.ready:
+        return typeahead.search(q, language, limit)
+    return await search_products(q=q, limit=limit, language=language, mode="docs", db=db)
+
+
 @router.get("/search", response_model=list[ProductSearchItem])
 async def search_products(
     q: str,
     limit: int = Query(20, ge=1, le=100),
     language: Optional[str] = Query("en"),
-    db: AsyncSession = Depends(get_db)
+    mode: Optional[str] = Query(None, pattern="^(docs|trigram|ilike)$"),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Simple product search for typeahead/search functionality.
     Returns minimal product info without inventory/location data.
+
+    mode="docs" (default, see SEARCH_MODE) ranks rows of product_search_docs;
+    mode="trigram" ranks pg_trgm matches across the source tables;
+    mode="ilike" keeps the old unordered substring match.
+    Results are cached per (q, language, limit, mode) until the catalog changes.
     """
+    mode = mode or settings.SEARCH_MODE
+    # docs mode matches on folded text; the other modes only ignore case
+    normalized = fold(q) if mode == "docs" else q.lower()
+    key = (normalized, language, limit, mode, catalog_versions.get("catalog"))
+    items = search_cache.get(key)
+    if items is None:
+        items = await _search_products(q, limit, language, mode, db)
+        search_cache.set(key, items)
+    return items
+
+
+async def _search_products(
+    q: str, limit: int, language: Optional[str], mode: str, db: AsyncSession
+) -> list[ProductSearchItem]:
+    if mode in ("docs", "trigram"):
+        stmt = docs_search_stmt(q, language, limit) if mode == "docs" else trigram_search_stmt(q, language, limit)
+        res = await db.execute(stmt)
+        return [
+            ProductSearchItem(
+                product_id=pid,
+                inn_name=inn_name,
+                display_name=display_name,
+                form=form,
+                strength=strength,
+            )
+            for pid, inn_name, display_name, form, strength in res.all()
+        ]
+
     q_like = f"%{q}%"
 
+    # only the name the language resolves to, never every language's rows
+    translated_name = translation_stmt(Product.id, language, Translation.translated_name).scalar_subquery()
     stmt = (
-        select(Product)
-        .options(
-            selectinload(Product.brands),
-            selectinload(Product.translations)
+        select(
+            Product.id,
+            Product.inn_name,
+            func.coalesce(translated_name, Product.inn_name),
+            Product.form,
+            Product.strength,
         )
         .join(Brand, isouter=True)
         .join(Translation, isouter=True)
@@ -54,25 +120,16 @@ async def search_products(
     )
 
     res = await db.execute(stmt)
-    products = res.scalars().all()
-
-    items: list[ProductSearchItem] = []
-    for p in products:
-        display_name = p.inn_name
-        for t in p.translations:
-            if t.language_code == language and t.translated_name:
-                display_name = t.translated_name
-                break
-        
-        items.append(ProductSearchItem(
-            product_id=p.id,
-            inn_name=p.inn_name,
+    return [
+        ProductSearchItem(
+            product_id=pid,
+            inn_name=inn_name,
             display_name=display_name,
-            form=p.form,
-            strength=p.strength,
-        ))
-
-    return items
+            form=form,
+            strength=strength,
+        )
+        for pid, inn_name, display_name, form, strength in res.all()
+    ]
 
 
 
@@ -84,158 +141,141 @@ async def get_product_packages(
     lng: Optional[float] = Query(None),
     radius_km: Optional[int] = Query(120, ge=1, le=200),
     only_in_stock: bool = True,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
     Search for packages of a specific product with their pharmacy locations and prices.
     Now includes proper location filtering to prevent fetching from entire database.
     Only returns packages that have pharmacies within the specified location criteria.
+
+    Product, translation, brand, package and image data come from the
+    in-memory catalog snapshot; the one query reads nearby inventory. Without
+    a snapshot (or for a product it does not know yet) Postgres assembles the
+    whole document in a single round trip instead.
     """
-    # 1) Load product + brands + translations (no inventories yet)
-    prod_stmt = (
-        select(Product)
-        .options(
-            selectinload(Product.brands),
-            selectinload(Product.translations),
-        )
-        .where(Product.id == product_id)
-    )
-    prod_res = await db.execute(prod_stmt)
-    product = prod_res.scalar_one_or_none()
-    if not product:
-        raise HTTPException(404, "Product not found")
+    cache_key = ("product_packages", product_id, language, lat, lng, radius_km, only_in_stock)
+    use_cache = availability_cache_active()
+    if use_cache:
+        cached = availability_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-    # choose display name
-    display_name = product.inn_name
-    description = None
-    for t in product.translations:
-        if t.language_code == language and t.translated_name:
-            display_name = t.translated_name
-            description = t.translated_description
-            break
-
-    # 2) Load packages for product
-    pkg_stmt = (
-        select(Package)
-        .options(
-            selectinload(Package.brand),
-            selectinload(Package.images)
+    snapshot = catalog_snapshot.snapshot if settings.CATALOG_SNAPSHOT_ENABLED else None
+    product = snapshot.product(product_id) if snapshot is not None else None
+    if product is not None:
+        rows = await db.execute(
+            package_locations_stmt(product.package_ids, lat, lng, radius_km, only_in_stock)
+        ) if product.package_ids else ()
+        model = snapshot.product_detail(product, language, dict(rows))
+        package_ids = product.package_ids
+    else:
+        model, package_ids = await _product_detail_joined(
+            db, product_id, language, lat, lng, radius_km, only_in_stock,
         )
-        .where(Package.product_id == product_id)
+
+    if use_cache and availability_cache_fillable(db):
+        # any stock/price change to one of the product's packages drops this entry
+        availability_cache.set(cache_key, model, tags=package_ids or ())
+
+    debug_capture.capture(
+        "product_packages", lambda: model.model_dump(mode="json"),
+        product_id=product_id, language=language, lat=lat, lng=lng, radius_km=radius_km,
     )
-    pkg_res = await db.execute(pkg_stmt)
-    packages = pkg_res.scalars().all()
-    if not packages:
-        return ProductDetailModel(
-            product_id=product.id,
-            inn_name=product.inn_name,
-            display_name=display_name,
-            description=description,
-            atc_code=product.atc_code,
-            form=product.form,
-            strength=product.strength,
-            brand_names=sorted({b.brand_name for b in product.brands}),
-            available_packages=[],
-            language=language,
-        )
+    return model
 
-    package_ids = [p.id for p in packages]
 
-    # 3) Load inventories + pharmacies for these packages with LOCATION FILTERING
-    # This is the key improvement - filter pharmacies by location BEFORE loading inventory
-    inv_stmt = (
-        select(PharmacyInventory, Pharmacy)
-        .join(Pharmacy, PharmacyInventory.pharmacy_id == Pharmacy.id)
-        .where(PharmacyInventory.package_id.in_(package_ids))
+async def _product_detail_joined(db, product_id, language, lat, lng, radius_km, only_in_stock):
+    res = await db.execute(
+        product_detail_stmt(product_id, language, lat, lng, radius_km, only_in_stock)
     )
+    row = res.one_or_none()
+    if not row:
+        raise HTTPException(404, "Product not found")
 
-    # Apply location filtering first to limit the pharmacy set
-    if lat is not None and lng is not None and radius_km is not None:
-        # Only include pharmacies with coordinates within radius
-        inv_stmt = inv_stmt.where(Pharmacy.lat.isnot(None), Pharmacy.lng.isnot(None))
-        inv_stmt = inv_stmt.where(Pharmacy.distance_to(lat, lng) <= radius_km)
-    else:
-        # If no location provided, still require pharmacies to have coordinates
-        # to avoid returning pharmacies without location data
-        inv_stmt = inv_stmt.where(Pharmacy.lat.isnot(None), Pharmacy.lng.isnot(None))
-
-    # Apply stock filtering
-    if only_in_stock:
-        inv_stmt = inv_stmt.where(PharmacyInventory.stock_quantity.isnot(None)) \
-                           .where(PharmacyInventory.stock_quantity > 0)
-
-    inv_res = await db.execute(inv_stmt)
-    rows = inv_res.all()
-
-    # 4) Group inventories by package_id
-    pkg_map: Dict[str, Package] = {p.id: p for p in packages}
-    grouped: DefaultDict[str, List[PharmacyLocationInfo]] = defaultdict(list)
-
-    for inv, ph in rows:
-        grouped[inv.package_id].append(PharmacyLocationInfo(
-            pharmacy_id=ph.id,
-            pharmacy_name=ph.name,
-            pharmacy_address=ph.address or "",
-            pharmacy_city=ph.city or "",
-            pharmacy_country=ph.country or "",
-            lat=ph.lat,
-            lng=ph.lng,
-            price_cents=int(inv.price_cents) if inv.price_cents is not None else None,
-            currency=inv.currency or "EUR",
-            stock_quantity=inv.stock_quantity or 0,
-            last_updated=inv.last_updated.isoformat() if inv.last_updated else None,
-        ))
-
-    # 5) Build response packages; only include packages with pharmacy locations in the specified area
-    available_packages: List[PackageAvailabilityInfo] = []
-    for pid, locations in grouped.items():
-        pkg = pkg_map.get(pid)
-        if not pkg:
-            continue
-        # Only include packages that have at least one pharmacy location
-        if locations:
-            print(pkg.images)
-            print("AAAA ", pkg.images[0].image_url)
-            image_urls = [img.image_url for img in pkg.images] if pkg.images else None
-            available_packages.append(PackageAvailabilityInfo(
-                package_id=pid,
-                gtin=pkg.gtin,
-                pack_size=pkg.pack_size,
-                brand_name=pkg.brand.brand_name if pkg.brand else None,
-                manufacturer=pkg.brand.manufacturer if pkg.brand else None,
-                country_code=pkg.country_code,
-                image_urls=image_urls,
-                pharmacy_locations=locations
-            ))
+    (pid, inn_name, atc_code, form, strength,
+     translated_name, translated_description, brand_names, packages, package_ids) = row
 
     model = ProductDetailModel(
-        product_id=product.id,
-        inn_name=product.inn_name,
-        display_name=display_name,
-        description=description,
-        atc_code=product.atc_code,
-        form=product.form,
-        strength=product.strength,
-        brand_names=sorted({b.brand_name for b in product.brands}),
-        available_packages=available_packages,
+        product_id=pid,
+        inn_name=inn_name,
+        display_name=translated_name or inn_name,
+        description=translated_description if translated_name else None,
+        atc_code=atc_code,
+        form=form,
+        strength=strength,
+        brand_names=sorted(brand_names or []),
+        available_packages=[PackageAvailabilityInfo.model_validate(p) for p in packages],
         language=language,
     )
+    return model, package_ids
 
-    # Made for a debug. Only for some time
-    import json
-    with open("search_results.json", "w", encoding="utf-8") as f:
-        json.dump(model.model_dump(), f, ensure_ascii=False, indent=2)
 
-    return model
-    ProductDetailModel(
-        product_id=product.id,
-        inn_name=product.inn_name,
-        display_name=display_name,
-        description=description,
-        atc_code=product.atc_code,
-        form=product.form,
-        strength=product.strength,
-        brand_names=sorted({b.brand_name for b in product.brands}),
-        available_packages=available_packages,
-        language=language,
-    )
\ No newline at end of file
+@router.websocket("/{product_id}/live")
+async def live_product_packages(
+    websocket: WebSocket,
+    product_id: str,
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius_km: int = Query(120, ge=1, le=200),
+):
+    """
+    Stock and price deltas for the pharmacies in range of an open product page,
+    instead of re-polling /products/{id}/packages.
+
+    Messages: {"type": "deltas", "changes": [...]} where each change is one of
+    in_stock (with the pharmacy's details), out_of_stock, price or stock; and
+    {"type": "resync"} when events may have been missed and the page should
+    fetch the full document again.
+    """
+    await websocket.accept()
+    sub = LiveSubscription(product_id, lat, lng, radius_km)
+    try:
+        async with SessionLocal() as db:
+            if not await sub.load_packages(db):
+                await websocket.close(code=4404, reason="Product not found")
+                return
+            # registered before the baseline is read; changes meanwhile are buffered and replayed
+            live_stock.add(sub)
+            await sub.load_state(db)
+        await websocket.send_json({
+            "type": "subscribed",
+            "live": inventory_events.connected,
+            "packages": len(sub.package_ids),
+            "pharmacies": len(sub.pharmacies),
+        })
+
+        async def drain_client():
+            # nothing is expected from the client; this only notices it leaving
+            while True:
+                await websocket.receive_text()
+
+        async def send_updates():
+            while True:
+                message = await sub.queue.get()
+                if message is RESYNC or sub.overflowed:
+                    # reload the baseline while staying registered; the client refetches the full document
+                    sub.begin_load()
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.overflowed = False
+                    async with SessionLocal() as db:
+                        await sub.load_packages(db)
+                        live_stock.reindex(sub)
+                        await sub.load_state(db)
+                    message = RESYNC
+                await websocket.send_json(message)
+
+        tasks = [asyncio.create_task(drain_client()), asyncio.create_task(send_updates())]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() and not isinstance(task.exception(), WebSocketDisconnect):
+                    log.warning("live product feed failed", exc_info=task.exception())
+        finally:
+            for task in tasks:
+                task.cancel()
+            # let a resync that was mid-reload unwind before the subscription is removed
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        # removes whatever ids the subscription is registered under by now
+        live_stock.remove(sub)
@@ -1,27 +1,211 @@
-import firebase_admin
+# app/core/auth.py
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer
-from firebase_admin import auth as fb_auth
-from firebase_admin import credentials
+
+from ..services.cache import TTLCache
+from .config import settings
+
+log = logging.getLogger(__name__)
+
+# jwt, httpx and cryptography (and firebase_admin in the fallback) are
+# imported on first use: only authenticated routes need them, and they are a
+# large share of the app's import time
 
 bearer = HTTPBearer(auto_error=False)
-_init = False
 
+# Google's x509 certificates for Firebase ID tokens, keyed by `kid`
+CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+
+# () -> ({kid: PEM certificate}, max-age seconds)
+CertFetcher = Callable[[], Awaitable[Tuple[Dict[str, str], float]]]
+
+
+def max_age(cache_control: Optional[str], default: float = 3600.0) -> float:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return float(match.group(1)) if match else default
+
+
+async def fetch_google_certs() -> Tuple[Dict[str, str], float]:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=5.0) as client:
+        response = await client.get(CERTS_URL)
+        response.raise_for_status()
+        return response.json(), max_age(response.headers.get("cache-control"))
+
+
+def _load_keys(certs: Dict[str, str]) -> Dict[str, Any]:
+    from cryptography import x509
+
+    return {kid: x509.load_pem_x509_certificate(pem.encode()).public_key() for kid, pem in certs.items()}
+
+
+class SigningKeys:
+    """
+    Firebase signing keys by `kid`, kept for the lifetime Google's
+    Cache-Control allows. Refreshed in the background once inside
+    refresh_margin of expiry, so requests only wait on a fetch when the
+    keys are missing or already stale, or for a kid rotated in early.
+    """
+
+    def __init__(self, fetch: CertFetcher = fetch_google_certs, refresh_margin: float = 300.0,
+                 min_refetch_seconds: float = 60.0):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.min_refetch_seconds = min_refetch_seconds
+        self.fetches = 0
+        self._keys: Dict[str, Any] = {}
+        self._expires_at = 0.0
+        self._fetched_at = float("-inf")
+        self._lock = asyncio.Lock()
+        self._background: Optional[asyncio.Task] = None
+
+    async def refresh(self, if_older_than: Optional[float] = None) -> None:
+        async with self._lock:
+            # whoever waited on the lock may find the keys already fresh
+            if if_older_than is not None and self._fetched_at >= if_older_than:
+                return
+            certs, lifetime = await self.fetch()
+            keys = await asyncio.to_thread(_load_keys, certs)
+            now = time.monotonic()
+            self._keys, self._fetched_at, self._expires_at = keys, now, now + lifetime
+            self.fetches += 1
+            log.info("loaded %d firebase signing keys, valid %.0fs", len(keys), lifetime)
+
+    async def _refresh_quietly(self) -> None:
+        try:
+            await self.refresh(if_older_than=time.monotonic() - self.min_refetch_seconds)
+        except Exception:
+            log.warning("background refresh of firebase signing keys failed", exc_info=True)
+
+    async def get(self, kid: Optional[str]) -> Optional[Any]:
+        now = time.monotonic()
+        if now >= self._expires_at:
+            await self.refresh(if_older_than=now)
+        elif now >= self._expires_at - self.refresh_margin and (self._background is None or self._background.done()):
+            self._background = asyncio.create_task(self._refresh_quietly())
+        key = self._keys.get(kid)
+        if key is None and now - self._fetched_at >= self.min_refetch_seconds:
+            # a key rotated in before our copy expired; refetch, but not once per bad token
+            await self.refresh(if_older_than=now - self.min_refetch_seconds)
+            key = self._keys.get(kid)
+        return key
 
-def _ensure_firebase():
-    global _init
-    if not _init:
-        # Use ADC or service account JSON via GOOGLE_APPLICATION_CREDENTIALS
-        firebase_admin.initialize_app()
-        _init = True
+
+class TokenVerifier:
+    """
+    Verifies Firebase ID tokens with PyJWT against SigningKeys (the checks
+    firebase_admin.auth.verify_id_token does, minus revocation). Decoded
+    claims are cached by token hash until the token's exp, so a client
+    reusing its token pays one dict lookup per request; the RSA check
+    itself runs in a thread.
+    """
+
+    def __init__(self, project_id: str, keys: SigningKeys, cache_size: int, leeway_seconds: float = 5.0):
+        self.project_id = project_id
+        self.keys = keys
+        self.leeway_seconds = leeway_seconds
+        # Firebase ID tokens live an hour; entries expire with their token
+        self.cache = TTLCache(cache_size, 3600.0)
+
+    def _decode(self, token: str, key: Any) -> Dict[str, Any]:
+        import jwt
+
+        claims = jwt.decode(
+            token, key, algorithms=["RS256"], audience=self.project_id,
+            issuer=f"https://securetoken.google.com/{self.project_id}",
+            leeway=self.leeway_seconds, options={"require": ["exp", "iat", "aud", "iss", "sub"]},
+        )
+        sub = claims["sub"]
+        if not isinstance(sub, str) or not sub or len(sub) > 128:
+            raise jwt.InvalidTokenError("bad sub claim")
+        auth_time = claims.get("auth_time", 0)
+        if not isinstance(auth_time, (int, float)) or isinstance(auth_time, bool):
+            raise jwt.InvalidTokenError("bad auth_time claim")
+        if auth_time > time.time() + self.leeway_seconds:
+            raise jwt.ImmatureSignatureError("auth_time is in the future")
+        claims["uid"] = sub
+        return claims
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Decoded claims (with 'uid'); raises jwt.InvalidTokenError."""
+        digest = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(digest)
+        if claims is not None:
+            return claims
+        import jwt
+
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") != "RS256":
+            raise jwt.InvalidAlgorithmError(f"unexpected alg {header.get('alg')!r}")
+        key = await self.keys.get(header.get("kid"))
+        if key is None:
+            raise jwt.InvalidTokenError(f"unknown kid {header.get('kid')!r}")
+        claims = await asyncio.to_thread(self._decode, token, key)
+        ttl = claims["exp"] - time.time()
+        if ttl > 0:
+            self.cache.set(digest, claims, ttl_seconds=ttl)
+        return claims
+
+
+token_verifier: Optional[TokenVerifier] = (
+    TokenVerifier(settings.FIREBASE_PROJECT_ID, SigningKeys(), settings.AUTH_TOKEN_CACHE_SIZE)
+    if settings.FIREBASE_PROJECT_ID else None
+)
+
+
+async def prefetch_signing_keys() -> None:
+    """Load the signing keys ahead of the first authenticated request (no-op without a project id)."""
+    if token_verifier is None:
+        return
+    try:
+        await token_verifier.keys.refresh()
+    except Exception:
+        log.warning("could not prefetch firebase signing keys; the first request will retry", exc_info=True)
+
+
+# first requests initialize the SDK from worker threads at the same time
+_firebase_init_lock = threading.Lock()
+
+
+def _firebase_admin_verify(token: str) -> Dict[str, Any]:
+    # Without FIREBASE_PROJECT_ID the project comes from ADC, which needs the
+    # SDK (and its grpc/google-cloud imports)
+    import firebase_admin
+    from firebase_admin import auth as fb_auth
+
+    with _firebase_init_lock:
+        try:
+            firebase_admin.get_app()
+        except ValueError:
+            # Use ADC or service account JSON via GOOGLE_APPLICATION_CREDENTIALS
+            firebase_admin.initialize_app()
+    return fb_auth.verify_id_token(token)
 
 
 async def get_current_user(token=Depends(bearer)):
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    _ensure_firebase()
+    if token_verifier is None:
+        try:
+            return await asyncio.to_thread(_firebase_admin_verify, token.credentials)
+        except Exception:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    import httpx
+    import jwt
+
     try:
-        decoded = fb_auth.verify_id_token(token.credentials)
-        return decoded  # contains 'uid'
-    except Exception:
+        return await token_verifier.verify(token.credentials)  # contains 'uid'
+    except jwt.InvalidTokenError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    except (httpx.HTTPError, ValueError):
+        log.warning("could not load firebase signing keys", exc_info=True)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Cannot verify tokens right now")
@@ -1,13 +1,128 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from typing import Any, Dict
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from .config import settings
 
 Base = declarative_base()
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+# upper bounds (seconds) of the checkout wait histogram
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class PoolTelemetry:
+    """How long checkouts waited for a pooled connection, and how often they gave up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS) + 1)  # last one is +Inf
+
+    def record(self, waited: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += waited
+            if waited > self.wait_seconds_max:
+                self.wait_seconds_max = waited
+            self.buckets[bisect_left(WAIT_BUCKETS, waited)] += 1
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that times every checkout into `telemetry`."""
+
+    telemetry = PoolTelemetry()
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.telemetry.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.telemetry.record(time.perf_counter() - started)
+        return conn
+
+
+def _connect_args() -> Dict[str, Any]:
+    server_settings = {
+        # pg_trgm reads these for the `%` / `<%` operators used by product search
+        "pg_trgm.similarity_threshold": str(settings.SEARCH_SIMILARITY_THRESHOLD),
+        "pg_trgm.word_similarity_threshold": str(settings.SEARCH_SIMILARITY_THRESHOLD),
+    }
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    if settings.DB_PGBOUNCER:
+        # Transaction pooling hands each transaction a different server
+        # connection: named prepared statements would not exist there, and
+        # PgBouncer refuses unknown startup parameters, so the settings above
+        # have to come from ALTER ROLE/DATABASE ... SET instead
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid.uuid4()}__",
+        }
+    return {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE, "server_settings": server_settings}
+
+
+class ReplicaPool(InstrumentedPool):
+    telemetry = PoolTelemetry()
+
+
+def _make_engine(url: str, poolclass):
+    return create_async_engine(
+        url,
+        echo=False,
+        future=True,
+        poolclass=poolclass,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+
+
+engine = _make_engine(settings.DATABASE_URL, InstrumentedPool)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
+# Optional streaming replica for read-only routes (see services.replica.get_read_db)
+read_engine = _make_engine(settings.DATABASE_REPLICA_URL, ReplicaPool) if settings.DATABASE_REPLICA_URL else None
+ReadSessionLocal = (
+    async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession, info={"replica": True})
+    if read_engine is not None else None
+)
+
+
+def pool_stats(target=None) -> Dict[str, Any]:
+    """Current pool occupancy plus cumulative checkout wait telemetry."""
+    pool = (target or engine).pool
+    telemetry = type(pool).telemetry
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": telemetry.checkouts,
+        "timeouts": telemetry.timeouts,
+        "wait_seconds_total": round(telemetry.wait_seconds_total, 6),
+        "wait_seconds_max": round(telemetry.wait_seconds_max, 6),
+        "wait_buckets": dict(zip([*map(str, WAIT_BUCKETS), "+Inf"], telemetry.buckets)),
+    }
+
 
 async def get_db():
     async with SessionLocal() as session:
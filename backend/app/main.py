@@ -1,24 +1,117 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import text
 
+from .api.admin import router as admin_router
+from .api.bookings import router as bookings_router
 from .api.products import router as products_router
 from .api.pharmacies import router as pharmacy_router
+from .core.auth import prefetch_signing_keys
 from .core.config import settings
+from .core.db import engine
+from .services.availability import clear_availability_cache, invalidate_availability
+from .services.catalog_snapshot import catalog_snapshot
+from .services.catalog_version import catalog_versions
+from .services.debug_capture import debug_capture
+from .services.geo_index import pharmacy_geo
+from .services.inventory_events import inventory_events
+from .services.live_stock import live_stock
+from .services.metrics import MetricsMiddleware, metrics_exporter
+from .services.query_stats import QueryStatsMiddleware
+from .services.replica import READ_YOUR_WRITES_HEADER, replica_monitor
+from .services.reservations import reservation_sweeper
+from .services.search import doc_languages, invalidate_search_cache
+from .services.slow_queries import slow_queries
+from .services.stock_index import pharmacy_stock
+from .services.typeahead import typeahead
+from .services.warmup import warm_up
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await debug_capture.start()
+    await metrics_exporter.start()
+    await slow_queries.start()
+    # read the version baseline first so changes during the initial build trigger a rebuild
+    await catalog_versions.start()
+    catalog_versions.subscribe("catalog", invalidate_search_cache)
+    catalog_versions.subscribe("catalog", clear_availability_cache)
+    catalog_versions.subscribe("pharmacies", clear_availability_cache)
+    # cache invalidation first: the stock bitmaps may rebuild on a reset
+    inventory_events.subscribe(invalidate_availability)
+    inventory_events.subscribe(live_stock.on_inventory_changes)
+    # independent of each other and mostly waiting on the database, so they
+    # run together: the worker is ready after the slowest, not after the sum
+    startups = [warm_up(), replica_monitor.start(), doc_languages.start()]
+    if settings.INVENTORY_EVENTS_ENABLED:
+        startups.append(inventory_events.start())
+    if settings.TYPEAHEAD_ENABLED:
+        startups.append(typeahead.start())
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        startups.append(catalog_snapshot.start())
+    if settings.GEO_INDEX_ENABLED and not (settings.CATALOG_SNAPSHOT_ENABLED and catalog_snapshot.directory):
+        # with a shared snapshot file the geo index is loaded from it
+        startups.append(pharmacy_geo.start())
+    if settings.STOCK_INDEX_ENABLED and settings.INVENTORY_EVENTS_ENABLED:
+        # the bitmaps are kept current by inventory events only
+        startups.append(pharmacy_stock.start())
+    await asyncio.gather(*startups)
+    await reservation_sweeper.start()
+    # fetched in the background; the first authenticated request would otherwise wait for it
+    prefetch = asyncio.create_task(prefetch_signing_keys())
+    yield
+    prefetch.cancel()
+    await reservation_sweeper.stop()
+    await inventory_events.stop()
+    await catalog_versions.stop()
+    await replica_monitor.stop()
+    await slow_queries.stop()
+    await metrics_exporter.stop()
+    await debug_capture.stop()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],#settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[READ_YOUR_WRITES_HEADER],  # browsers must be able to read it to echo it
 )
+app.add_middleware(QueryStatsMiddleware)
+if settings.METRICS_ENABLED:
+    # added last so it is outermost and times everything below it
+    app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/health")
-async def health():
+async def health(ready: bool = False):
+    """Liveness; with ?ready=true also checks the database (for readiness probes)."""
+    if ready:
+        try:
+            # the connect is bounded too: an unreachable database must answer 503, not hang the probe
+            async with asyncio.timeout(2.0):
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+        except Exception:
+            raise HTTPException(status_code=503, detail="database unreachable")
+        return {"ok": True, "db": True}
     return {"ok": True}
 
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def prometheus_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404)
+    return PlainTextResponse(await metrics_exporter.collect(), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(products_router)
 app.include_router(pharmacy_router)
+app.include_router(bookings_router)
+app.include_router(admin_router)
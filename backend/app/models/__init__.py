@@ -12,9 +12,12 @@ from app.models.translation import Translation
 from app.models.pharmacies import Pharmacy
 from app.models.pharmacy_inventory import PharmacyInventory
 from app.models.bookings import Booking
+from app.models.catalog_version import CatalogVersion
+from app.models.product_search_doc import ProductSearchDoc
 
 __all__ = [
     "Base",
-    "Product", "Brand", "Package", "ProductImage", "Translation", "Pharmacy", "PharmacyInventory", "Booking"
+    "Product", "Brand", "Package", "ProductImage", "Translation", "Pharmacy", "PharmacyInventory", "Booking",
+    "CatalogVersion", "ProductSearchDoc",
 ]
 
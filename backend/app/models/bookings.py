@@ -1,16 +1,32 @@
 from app.core.db import Base
-from sqlalchemy import String
+from sqlalchemy import CheckConstraint, DateTime, ForeignKey, Index, Integer, String, func, text
 from sqlalchemy.orm import Mapped, mapped_column
+import datetime
+
+# held -> confirmed | cancelled | expired; only held rows have stock set aside
+BOOKING_STATUSES = ("held", "confirmed", "cancelled", "expired")
 
 
 class Booking(Base):
     __tablename__ = "bookings"
+    __table_args__ = (
+        CheckConstraint("qty > 0", name="ck_bookings_qty_positive"),
+        CheckConstraint("status IN ('held', 'confirmed', 'cancelled', 'expired')", name="ck_bookings_status"),
+        # the expiry sweep only reads live holds, oldest first
+        Index("idx_bookings_held_expires_at", "expires_at", postgresql_where=text("status = 'held'")),
+        Index("idx_bookings_pharmacy_package", "pharmacy_id", "package_id"),
+    )
+
     id: Mapped[str] = mapped_column(String, primary_key=True)
     user_uid: Mapped[str] = mapped_column(String, index=True)
     pharmacy_id: Mapped[str] = mapped_column(String)
     product_id: Mapped[str] = mapped_column(String)
-    qty: Mapped[str] = mapped_column(String)
-    price_cents_at_booking: Mapped[str] = mapped_column(String)
+    package_id: Mapped[str] = mapped_column(ForeignKey("packages.id"), nullable=True)
+    qty: Mapped[int] = mapped_column(Integer)
+    price_cents_at_booking: Mapped[int] = mapped_column(Integer, nullable=True)
     status: Mapped[str] = mapped_column(String)
-    expires_at: Mapped[str] = mapped_column(String)
-    created_at: Mapped[str] = mapped_column(String)
+    expires_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+    created_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    updated_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), nullable=True)
+# No import directrly because it will lead to circularity
+# from . import bookings, pharmacies, product
@@ -0,0 +1,16 @@
+# app/models/catalog_version.py
+import datetime
+from sqlalchemy import BigInteger, DateTime, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+
+class CatalogVersion(Base):
+    """Change counters bumped by statement triggers (see bump_catalog_version())."""
+    __tablename__ = "catalog_versions"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)  # "catalog", ...
+    version: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0")
+    updated_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now()
+    )
@@ -1,15 +1,32 @@
 # app/models/pharmacies.py
-from typing import List
-from sqlalchemy import String, func, cast, literal
+from typing import List, Tuple
+from sqlalchemy import String, Float, func, literal
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.ext.hybrid import hybrid_method
 from app.core.db import Base
-from sqlalchemy.types import Float
 import math
 
 EARTH_RADIUS_KM = 6371
 
+
+def bounding_box(lat: float, lng: float, radius_km: float) -> Tuple[float, float, float, float]:
+    """
+    (min_lat, min_lng, max_lat, max_lng) enclosing the circle of radius_km.
+    Near the poles or across the antimeridian the longitude range widens to the full world.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    dlat = math.degrees(angular)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0
+    dlng = math.degrees(math.asin(math.sin(angular) / math.cos(math.radians(lat))))
+    min_lng, max_lng = lng - dlng, lng + dlng
+    if min_lng < -180 or max_lng > 180:
+        return min_lat, -180.0, max_lat, 180.0
+    return min_lat, min_lng, max_lat, max_lng
+
+
 class Pharmacy(Base):
     __tablename__ = "pharmacies"
 
@@ -18,8 +35,8 @@ class Pharmacy(Base):
     country: Mapped[str] = mapped_column(String(2), nullable=False)  # e.g. "AT"
     city: Mapped[str] = mapped_column(String, nullable=False)
     address: Mapped[str] = mapped_column(String, nullable=True)
-    lat: Mapped[str] = mapped_column(String, nullable=True) # TODO: Change to INT type
-    lng: Mapped[str] = mapped_column(String, nullable=True)
+    lat: Mapped[float] = mapped_column(Float, nullable=True)  # GiST index on point(lng, lat)
+    lng: Mapped[float] = mapped_column(Float, nullable=True)
     phone: Mapped[str] = mapped_column(String, nullable=True)
     opening_hours: Mapped[dict] = mapped_column(JSONB, nullable=True)
 
@@ -33,11 +50,8 @@ class Pharmacy(Base):
         """
         if self.lat is None or self.lng is None:
             return None
-        try:
-            plat = float(self.lat)
-            plng = float(self.lng)
-        except ValueError:
-            return None
+        plat = self.lat
+        plng = self.lng
         dlat = math.radians(plat - lat)
         dlng = math.radians(plng - lng)
         a = math.sin(dlat / 2) ** 2 + \
@@ -50,12 +64,19 @@ class Pharmacy(Base):
     def distance_to(cls, lat: float, lng: float):
         lat1 = func.radians(literal(lat))
         lng1 = func.radians(literal(lng))
-        lat2 = func.radians(cast(cls.lat, Float))
-        lng2 = func.radians(cast(cls.lng, Float))
+        lat2 = func.radians(cls.lat)
+        lng2 = func.radians(cls.lng)
         dlat = lat2 - lat1
         dlng = lng2 - lng1
         a = func.power(func.sin(dlat / 2), 2) + \
             func.cos(lat1) * func.cos(lat2) * func.power(func.sin(dlng / 2), 2)
         c = 2 * func.asin(func.sqrt(a))
         return literal(EARTH_RADIUS_KM) * c
-    
\ No newline at end of file
+
+    @classmethod
+    def in_bounding_box(cls, lat: float, lng: float, radius_km: float):
+        """`point(lng, lat) <@ box` prefilter for a radius query (idx_pharmacies_geo)."""
+        min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_km)
+        return func.point(cls.lng, cls.lat).op("<@")(
+            func.box(func.point(min_lng, min_lat), func.point(max_lng, max_lat))
+        )
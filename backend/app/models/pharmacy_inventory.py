@@ -1,5 +1,5 @@
 # app/models/pharmacy_inventory.py
-from sqlalchemy import String, Integer, Boolean
+from sqlalchemy import String, Integer, Boolean, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.core.db import Base
 from sqlalchemy import DateTime, func
@@ -8,6 +8,10 @@ import datetime
 
 class PharmacyInventory(Base):
     __tablename__ = "pharmacy_inventory"
+    __table_args__ = (
+        # one row per pharmacy and package; the feed merge upserts on it
+        UniqueConstraint("pharmacy_id", "package_id", name="uq_pharmacy_inventory_pharmacy_package"),
+    )
 
     id: Mapped[str] = mapped_column(String, primary_key=True)
     pharmacy_id: Mapped[str] = mapped_column(String, nullable=False)
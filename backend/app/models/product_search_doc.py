@@ -0,0 +1,26 @@
+# app/models/product_search_doc.py
+from sqlalchemy import ForeignKey, String
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.db import Base
+
+
+class ProductSearchDoc(Base):
+    """
+    Denormalized search row per (product, language).
+
+    Maintained by triggers on products/brands/translations through
+    refresh_product_search_docs(); never written by the application.
+    """
+    __tablename__ = "product_search_docs"
+
+    product_id: Mapped[str] = mapped_column(
+        String, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True
+    )
+    language_code: Mapped[str] = mapped_column(String(5), primary_key=True)
+    display_name: Mapped[str] = mapped_column(String, nullable=False)  # translation -> en -> inn_name; searches resolve LANGUAGE_FALLBACKS instead
+    inn_name: Mapped[str] = mapped_column(String, nullable=False)
+    form: Mapped[str] = mapped_column(String, nullable=True)
+    strength: Mapped[str] = mapped_column(String, nullable=True)
+    search_text: Mapped[str] = mapped_column(String, nullable=False)  # lower(unaccent(names...))
+    search_tsv: Mapped[str] = mapped_column(TSVECTOR, nullable=False)
@@ -1,8 +1,11 @@
 from .product import ProductSearchItem, PharmacyLocationInfo, PackageAvailabilityInfo, ProductDetailModel, PharmaciesSearchRequest, PharmacyPackageLine, PharmacySearchResult
+from .product import BasketItem, BasketQuoteRequest, BasketLine, BasketPharmacyQuote, BasketQuote
 from .package import PackageBase, PackageCreate, PackageUpdate, PackageOut
 from .translation import TranslationBase, TranslationCreate, TranslationOut, TranslationUpdate
 from .pharmacy import (
     PharmacyBase, PharmacyCreate, PharmacyUpdate, PharmacyOut,
-    PharmacyInventoryBase, PharmacyInventoryCreate, PharmacyInventoryUpdate, PharmacyInventoryOut
+    PharmacyInventoryBase, PharmacyInventoryCreate, PharmacyInventoryUpdate, PharmacyInventoryOut,
+    NearbyPharmacy, InventoryFeedReport,
 )
-from .brand import BrandBase, BrandCreate, BrandUpdate, BrandOut
\ No newline at end of file
+from .brand import BrandBase, BrandCreate, BrandUpdate, BrandOut
+from .booking import BookingCreate, BookingOut
@@ -0,0 +1,24 @@
+from pydantic import BaseModel, Field
+from datetime import datetime
+from typing import Optional
+
+
+class BookingCreate(BaseModel):
+    pharmacy_id: str
+    package_id: str
+    qty: int = Field(1, ge=1)
+
+
+class BookingOut(BaseModel):
+    id: str
+    pharmacy_id: str
+    product_id: str
+    package_id: Optional[str] = None
+    qty: int
+    price_cents_at_booking: Optional[int] = None
+    status: str
+    expires_at: datetime
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
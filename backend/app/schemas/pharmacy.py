@@ -44,3 +44,22 @@ class PharmacyInventoryOut(PharmacyInventoryBase):
 
     class Config:
         from_attributes = True
+
+
+class NearbyPharmacy(BaseModel):
+    pharmacy_id: str
+    distance_km: float
+    country: Optional[str] = None
+    city: Optional[str] = None
+
+
+class InventoryFeedReport(BaseModel):
+    batch_id: str
+    staged: int  # rows received
+    inserted: int
+    updated: int  # price, currency or stock changed
+    unchanged: int
+    duplicates: int  # repeated pharmacy/package pairs; the last one wins
+    rejected: int  # unknown pharmacy_id or package_id
+    seconds: float
+    rows_per_second: float
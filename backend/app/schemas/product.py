@@ -1,5 +1,5 @@
 # app/schemas/product.py
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -101,5 +101,43 @@ class PharmacySearchResult(BaseModel):
     class Config:
         from_attributes = True
 
+# Basket quote request: what to buy and how many pharmacies the user will visit
+class BasketItem(BaseModel):
+    package_id: str
+    quantity: int = Field(1, ge=1)
+
+class BasketQuoteRequest(BaseModel):
+    items: List[BasketItem] = Field(..., min_length=1, max_length=30)
+    lat: float = Field(..., ge=-90, le=90)
+    lng: float = Field(..., ge=-180, le=180)
+    radius_km: float = Field(20.0, gt=0, le=200)
+    max_pharmacies: int = Field(2, ge=1, le=3)
+
+# One package bought at one pharmacy
+class BasketLine(BaseModel):
+    package_id: str
+    quantity: int
+    unit_price_cents: int
+    line_total_cents: int
+    currency: Optional[str] = "EUR"
+
+class BasketPharmacyQuote(BaseModel):
+    pharmacy_id: str
+    pharmacy_name: str
+    address: Optional[str] = None
+    city: Optional[str] = None
+    distance_km: float
+    subtotal_cents: int
+    lines: List[BasketLine]
+
+# Cheapest split of a basket over at most max_pharmacies pharmacies
+class BasketQuote(BaseModel):
+    feasible: bool
+    total_cents: Optional[int] = None
+    total_distance_km: Optional[float] = None
+    optimal: bool = True  # False when the search hit its time budget
+    pharmacies: List[BasketPharmacyQuote] = []
+    missing_package_ids: List[str] = []  # not stocked in sufficient quantity anywhere in range
+
 # Legacy schema names for backward compatibility
 ProductTypeaheadItem = ProductSearchItem  # Alias for backward compatibility
\ No newline at end of file
@@ -0,0 +1,136 @@
+# app/seeds/reservation_stress.py
+"""
+Concurrency stress scenario of the reservation engine against Postgres.
+
+Sets one pharmacy_inventory row to `stock` units and fires `clients`
+concurrent holds of 1..max_qty units at it, then races user cancels
+against expiry sweeps from several "workers" over the same holds. Checks
+that no more than the stock was ever handed out, that every hold ended in
+exactly one of cancelled/expired, and that the stock came back to where it
+started. The row and the scenario's bookings are restored/deleted
+afterwards. Run by tests/test_reservations_stress.py (pytest -m stress)
+and scripts/stress_reservations.py.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.models import Booking, PharmacyInventory
+from app.services import reservations
+
+log = logging.getLogger(__name__)
+
+USER = "stress-reservations"
+
+
+async def hold_one(sessions: async_sessionmaker, pharmacy_id: str, package_id: str, qty: int):
+    async with sessions() as db:
+        try:
+            # minutes=0: the hold is already due, so the sweepers below can race the cancels for it
+            return await reservations.hold(db, USER, pharmacy_id, package_id, qty, minutes=0)
+        except reservations.InsufficientStock:
+            return None
+
+
+async def cancel_one(sessions: async_sessionmaker, booking_id: str) -> bool:
+    async with sessions() as db:
+        return await reservations.cancel(db, booking_id, USER)
+
+
+async def sweep_until_idle(sessions: async_sessionmaker, batch_size: int) -> int:
+    expired = 0
+    for _ in range(200):
+        async with sessions() as db:
+            result = await reservations.sweep_expired(db, batch_size)
+        if result is None:
+            await asyncio.sleep(0.005)  # another sweeper holds the lock
+            continue
+        if not result[0]:
+            return expired
+        expired += result[0]
+    return expired
+
+
+async def stock_of(sessions: async_sessionmaker, inv_id: str) -> int:
+    async with sessions() as db:
+        return (await db.execute(
+            select(PharmacyInventory.stock_quantity).where(PharmacyInventory.id == inv_id)
+        )).scalar_one()
+
+
+async def run_stress(
+    sessions: async_sessionmaker,
+    clients: int = 300, stock: int = 200, max_qty: int = 3, sweepers: int = 4, batch: int = 50,
+) -> Optional[List[str]]:
+    """
+    Failures found (empty when all is well); None when there is no priced
+    inventory row to use. The caller owns the engine behind `sessions`.
+    """
+    async with sessions() as db:
+        row = (await db.execute(
+            select(PharmacyInventory.id, PharmacyInventory.pharmacy_id,
+                   PharmacyInventory.package_id, PharmacyInventory.stock_quantity)
+            .where(PharmacyInventory.price_cents.isnot(None)).limit(1)
+        )).one_or_none()
+        if row is None:
+            return None
+        inv_id, pharmacy_id, package_id, original_stock = row
+        await db.execute(update(PharmacyInventory).where(PharmacyInventory.id == inv_id)
+                         .values(stock_quantity=stock))
+        await db.commit()
+
+    failures = []
+    try:
+        qtys = [random.randint(1, max_qty) for _ in range(clients)]
+        started = time.perf_counter()
+        results = await asyncio.gather(*(hold_one(sessions, pharmacy_id, package_id, q) for q in qtys))
+        hold_seconds = time.perf_counter() - started
+        held = [b for b in results if b is not None]
+        held_units = sum(b.qty for b in held)
+        left = await stock_of(sessions, inv_id)
+        log.info("%d/%d holds, %d units in %.2fs; stock left %d", len(held), clients, held_units, hold_seconds, left)
+        if held_units > stock:
+            failures.append(f"oversold: {held_units} units held from a stock of {stock}")
+        if left != stock - held_units:
+            failures.append(f"stock {left} != {stock} - {held_units}")
+        if left < 0:
+            failures.append(f"negative stock {left}")
+        # every refused hold must have asked for more than was left when it ran
+        if len(held) < clients and left >= max_qty:
+            failures.append(f"holds refused while {left} units were still free")
+
+        ids = [b.id for b in held]
+        to_cancel = random.sample(ids, len(ids) // 2)
+        started = time.perf_counter()
+        outcome = await asyncio.gather(
+            asyncio.gather(*(cancel_one(sessions, i) for i in to_cancel)),
+            *(sweep_until_idle(sessions, batch) for _ in range(sweepers)),
+        )
+        cancelled, expired = sum(outcome[0]), sum(outcome[1:])
+        log.info("%d cancelled, %d expired by %d sweepers in %.2fs",
+                 cancelled, expired, sweepers, time.perf_counter() - started)
+
+        async with sessions() as db:
+            statuses = dict((await db.execute(
+                select(Booking.status, func.count()).where(Booking.id.in_(ids)).group_by(Booking.status)
+            )).all())
+        if statuses.get("held"):
+            failures.append(f"{statuses['held']} holds neither cancelled nor expired")
+        if cancelled + expired != len(ids) or statuses.get("cancelled", 0) != cancelled:
+            failures.append(f"released {cancelled}+{expired} of {len(ids)} holds; table says {statuses}")
+        final = await stock_of(sessions, inv_id)
+        if final != stock:
+            failures.append(f"stock ended at {final}, expected {stock}")
+    finally:
+        async with sessions() as db:
+            await db.execute(delete(Booking).where(Booking.user_uid == USER))
+            await db.execute(update(PharmacyInventory).where(PharmacyInventory.id == inv_id)
+                             .values(stock_quantity=original_stock))
+            await db.commit()
+    return failures
+
@@ -371,8 +371,8 @@ async def main():
                 country=country_code,
                 city=city,
                 address=fake.street_address(),
-                lat=str(round(lat, 6)),
-                lng=str(round(lng, 6)),
+                lat=round(lat, 6),
+                lng=round(lng, 6),
                 phone=fake.phone_number(),
                 opening_hours=opening_hours,
             )
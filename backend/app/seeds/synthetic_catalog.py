@@ -0,0 +1,23 @@
+# app/seeds/synthetic_catalog.py
+"""
+Synthetic catalog rows in the shape CatalogSnapshot.build takes, for
+checks and benchmarks that need a catalog without a database.
+"""
+
+LANGUAGES = ("en", "de", "sk")
+
+
+def synthetic(products: int):
+    rows, brands, translations, packages, images = [], [], [], [], []
+    for p in range(products):
+        pid = f"prod-{p:07d}"
+        rows.append((pid, f"inn {p}", f"N0{p % 10}", "tablet" if p % 3 else None, f"{p % 500} mg"))
+        brands.append((f"brand-{p}", pid, f"Brand {p} é", None if p % 4 else "Maker"))
+        for lang in LANGUAGES[: 1 + p % 3]:
+            translations.append((pid, lang, f"{lang} name {p}", f"{lang} description {p}" if p % 2 else None))
+        for k in range(1 + p % 3):
+            package_id = f"pkg-{p:07d}-{k}"
+            packages.append((package_id, pid, f"brand-{p}", f"{p:09d}{k}" if k else None, f"{k * 10} tabs", "SK"))
+            if k == 0:
+                images.append((package_id, f"https://img.example/{package_id}.jpg"))
+    return rows, brands, translations, sorted(packages), images
@@ -0,0 +1,156 @@
+# app/services/availability.py
+import time
+from typing import List, Optional
+
+from sqlalchemy import func, literal, select, true
+from sqlalchemy.dialects.postgresql import JSONB
+
+from ..core.config import settings
+from ..models import Brand, Package, Pharmacy, PharmacyInventory, Product, ProductImage, Translation
+from .cache import TTLCache
+from .geo_index import nearby_pharmacies
+from .inventory_events import InventoryChange, inventory_events
+from .replica import on_replica, replica_monitor
+from .translations import translation_stmt
+
+# Responses built from pharmacy_inventory, tagged with the package ids they
+# depend on. Only used while the inventory listener is connected, since that
+# is what drops entries when stock or prices change.
+availability_cache = TTLCache(settings.AVAILABILITY_CACHE_SIZE, settings.AVAILABILITY_CACHE_TTL_SECONDS)
+
+# monotonic time of the last invalidation; a replica that has not replayed up
+# to it could refill the cache with the very data that was just dropped
+_invalidated_at = float("-inf")
+
+
+def availability_cache_active() -> bool:
+    return settings.AVAILABILITY_CACHE_SIZE > 0 and inventory_events.connected
+
+
+def availability_cache_fillable(db) -> bool:
+    """Whether a response read through `db` may be cached (primary, or a replica known to be past the last change)."""
+    return not on_replica(db) or replica_monitor.caught_up_since(_invalidated_at)
+
+
+async def invalidate_availability(changes: List[InventoryChange], reset: bool) -> None:
+    """inventory_events listener: drop the entries built from changed packages."""
+    global _invalidated_at
+    _invalidated_at = time.monotonic()
+    if reset:
+        availability_cache.clear()
+    else:
+        availability_cache.invalidate_tags({change.package_id for change in changes})
+
+
+async def clear_availability_cache(version: int) -> None:
+    """catalog_versions listener (packages, names, pharmacy locations changed)."""
+    global _invalidated_at
+    _invalidated_at = time.monotonic()
+    availability_cache.clear()
+
+
+def product_detail_stmt(
+    product_id: str,
+    language: Optional[str],
+    lat: Optional[float],
+    lng: Optional[float],
+    radius_km: Optional[int],
+    only_in_stock: bool,
+):
+    """
+    Whole product availability document in one statement.
+
+    Returns at most one row: product columns, the translation `language`
+    resolves to (see language_chain),
+    brand names, a jsonb array shaped like List[PackageAvailabilityInfo]
+    (only packages with at least one matching pharmacy) and the ids of all
+    the product's packages (what a cached copy depends on).
+    """
+    # Pharmacies without coordinates are never returned
+    inv_filters = [Pharmacy.lat.isnot(None), Pharmacy.lng.isnot(None)]
+    if only_in_stock:
+        inv_filters += [PharmacyInventory.stock_quantity.isnot(None), PharmacyInventory.stock_quantity > 0]
+
+    location = func.jsonb_build_object(
+        "pharmacy_id", Pharmacy.id,
+        "pharmacy_name", Pharmacy.name,
+        "pharmacy_address", func.coalesce(Pharmacy.address, ""),
+        "pharmacy_city", func.coalesce(Pharmacy.city, ""),
+        "pharmacy_country", func.coalesce(Pharmacy.country, ""),
+        "lat", Pharmacy.lat,
+        "lng", Pharmacy.lng,
+        "price_cents", PharmacyInventory.price_cents,
+        "currency", func.coalesce(PharmacyInventory.currency, "EUR"),
+        "stock_quantity", func.coalesce(PharmacyInventory.stock_quantity, 0),
+        "last_updated", PharmacyInventory.last_updated,
+    )
+    locations = (
+        select(
+            PharmacyInventory.package_id,
+            func.jsonb_agg(location, type_=JSONB).label("pharmacy_locations"),
+        )
+        .join(Pharmacy, PharmacyInventory.pharmacy_id == Pharmacy.id)
+        .join(Package, PharmacyInventory.package_id == Package.id)
+        .where(Package.product_id == product_id, *inv_filters)
+        .group_by(PharmacyInventory.package_id)
+    )
+    if lat is not None and lng is not None and radius_km is not None:
+        nearby = nearby_pharmacies(lat, lng, radius_km)
+        locations = locations.join(nearby, nearby.c.pharmacy_id == PharmacyInventory.pharmacy_id)
+    locations = locations.cte("locations")
+
+    image_urls = (
+        select(func.jsonb_agg(ProductImage.image_url, type_=JSONB))
+        .where(ProductImage.package_id == Package.id)
+        .scalar_subquery()
+    )
+    package_doc = func.jsonb_build_object(
+        "package_id", Package.id,
+        "gtin", Package.gtin,
+        "pack_size", Package.pack_size,
+        "brand_name", Brand.brand_name,
+        "manufacturer", Brand.manufacturer,
+        "country_code", Package.country_code,
+        "image_urls", image_urls,
+        "pharmacy_locations", locations.c.pharmacy_locations,
+    )
+    packages = (
+        select(func.coalesce(func.jsonb_agg(package_doc), literal([], JSONB), type_=JSONB))
+        .select_from(locations)
+        .join(Package, Package.id == locations.c.package_id)
+        .join(Brand, Package.brand_id == Brand.id, isouter=True)
+        .scalar_subquery()
+    )
+
+    brand_names = (
+        select(func.array_agg(Brand.brand_name.distinct()))
+        .where(Brand.product_id == Product.id)
+        .scalar_subquery()
+    )
+
+    package_ids = (
+        select(func.array_agg(Package.id))
+        .where(Package.product_id == Product.id)
+        .scalar_subquery()
+    )
+
+    translation = translation_stmt(
+        Product.id, language, Translation.translated_name, Translation.translated_description,
+    ).lateral("translation")
+
+    return (
+        select(
+            Product.id,
+            Product.inn_name,
+            Product.atc_code,
+            Product.form,
+            Product.strength,
+            translation.c.translated_name,
+            translation.c.translated_description,
+            brand_names.label("brand_names"),
+            packages.label("available_packages"),
+            package_ids.label("package_ids"),
+        )
+        .outerjoin(translation, true())
+        .where(Product.id == product_id)
+    )
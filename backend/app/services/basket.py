@@ -0,0 +1,157 @@
+# app/services/basket.py
+import time
+from typing import Dict, List, Optional, Tuple
+
+INF = float("inf")
+
+# Cost vectors are packed into one int, FIELD bits per item, so element-wise
+# min/difference over a whole basket is a handful of big-int operations
+# (SWAR). The top bit of each field is a guard for the comparison; a missing
+# offer is stored as MISSING, which is larger than any real line cost.
+FIELD = 48
+MISSING = (1 << (FIELD - 1)) - 1
+
+
+class BasketSplit:
+    """Cheapest assignment found: total cost and, per pharmacy, the item indices bought there."""
+
+    __slots__ = ("total_cents", "distance_km", "assignment", "exhaustive")
+
+    def __init__(self, total_cents: int, distance_km: float, assignment: Dict[str, List[int]], exhaustive: bool):
+        self.total_cents = total_cents
+        self.distance_km = distance_km
+        self.assignment = assignment
+        # False when the time budget ran out before the search space was
+        # exhausted; the split is then the best one found, not proven optimal
+        self.exhaustive = exhaustive
+
+
+def cheapest_split(
+    offers: Dict[str, Dict[int, int]],
+    n_items: int,
+    max_pharmacies: int,
+    distances: Optional[Dict[str, float]] = None,
+    time_budget_ms: Optional[float] = None,
+) -> Optional[BasketSplit]:
+    """
+    Cheapest way to buy items 0..n_items-1 from at most max_pharmacies pharmacies.
+
+    `offers[pharmacy_id][item]` is the line cost (unit price * quantity) for an
+    item the pharmacy can fully supply. Ties are broken by fewer pharmacies,
+    then by total distance. Returns None when no feasible split exists.
+
+    Every set is enumerated from the member that wins the most items, which
+    wins at least ceil(n/k) of them. With G the sum of per-item minimums over
+    all pharmacies, the set then costs at least G plus that member's
+    ceil(n/k) smallest per-item excesses over the minimum; anchors are tried
+    in ascending order of that bound, which ends the search early. For each
+    anchor A the saving of every other pharmacy against A is computed in one
+    packed pass: pairs are priced exactly from it, and triples are tried in
+    descending-saving order until cost(A) - s_B - s_C can no longer win.
+
+    With `time_budget_ms` the search stops at the deadline and returns the
+    best split found so far (strongest anchors are tried first).
+    """
+    deadline = time.perf_counter() + time_budget_ms / 1000 if time_budget_ms else INF
+    distances = distances or {}
+    full = (1 << n_items) - 1
+    guards = sum(1 << (i * FIELD + FIELD - 1) for i in range(n_items))
+    low_bits = (1 << (FIELD - 1)) - 1
+    fold = (1 << FIELD) - 1  # x % fold sums the fields, given the sum fits in one
+
+    global_min = [INF] * n_items
+    global_max = [0] * n_items
+    for items in offers.values():
+        for item, cost in items.items():
+            global_min[item] = min(global_min[item], cost)
+            global_max[item] = max(global_max[item], cost)
+    if any(g == INF for g in global_min):
+        return None  # some item is not available anywhere
+    base = sum(global_min)
+    max_pharmacies = min(max_pharmacies, n_items)
+    anchor_share = -(-n_items // max_pharmacies)
+
+    def pack(values) -> int:
+        return sum(v << (i * FIELD) for i, v in enumerate(values))
+
+    candidates = []
+    for pid, items in offers.items():
+        mask = 0
+        for item in items:
+            mask |= 1 << item
+        excesses = sorted(cost - global_min[item] for item, cost in items.items())
+        anchor_bound = base + sum(excesses[:anchor_share]) if len(excesses) >= anchor_share else INF
+        # `packed` has MISSING holes; `capped` fills them with one cent more
+        # than the worst offer for the item so it can stand in as an anchor
+        # (any pharmacy that has the item then saves something against it)
+        packed = pack(items.get(i, MISSING) for i in range(n_items))
+        capped = pack(items.get(i, global_max[i] + 1) for i in range(n_items))
+        candidates.append((anchor_bound, distances.get(pid, 0.0), pid, mask, packed, capped))
+    candidates.sort(key=lambda c: (c[0], c[1]))
+
+    best_key: Tuple[float, int, float] = (INF, 0, INF)
+    best_set: Tuple[int, ...] = ()
+
+    def consider(key: Tuple[float, int, float], members: Tuple[int, ...]) -> None:
+        nonlocal best_key, best_set
+        if key < best_key:
+            best_key, best_set = key, members
+
+    for a, (_, dist, _, mask, packed, _) in enumerate(candidates):
+        if mask == full:
+            consider((packed % fold, 1, dist), (a,))
+
+    exhaustive = True
+    if max_pharmacies >= 2:
+        for a, (anchor_bound, dist_a, _, mask_a, _, anchor) in enumerate(candidates):
+            if anchor_bound > best_key[0]:
+                break
+            if not exhaustive or time.perf_counter() > deadline:
+                exhaustive = False
+                break
+            anchor_total = anchor % fold
+            guarded = anchor | guards
+            savings = []
+            for b, (_, dist_b, _, mask_b, packed_b, _) in enumerate(candidates):
+                if b == a:
+                    continue
+                diff = guarded - packed_b
+                saving = diff & (((diff & guards) >> (FIELD - 1)) * low_bits)
+                s = saving % fold
+                if s == 0:
+                    continue  # wins nothing against the anchor
+                if mask_a | mask_b == full:
+                    consider((anchor_total - s, 2, dist_a + dist_b), (a, b))
+                savings.append((s, b, anchor - saving))
+            if max_pharmacies < 3:
+                continue
+            savings.sort(key=lambda c: -c[0])
+            for i, (s_b, b, pair) in enumerate(savings):
+                if time.perf_counter() > deadline:
+                    exhaustive = False
+                    break
+                if i + 1 == len(savings) or anchor_total - s_b - savings[i + 1][0] > best_key[0]:
+                    break
+                mask_ab = mask_a | candidates[b][3]
+                guarded_pair = pair | guards
+                for s_c, c, _ in savings[i + 1:]:
+                    if anchor_total - s_b - s_c > best_key[0]:
+                        break
+                    if mask_ab | candidates[c][3] != full:
+                        continue
+                    diff = guarded_pair - candidates[c][4]
+                    gain = diff & (((diff & guards) >> (FIELD - 1)) * low_bits)
+                    consider(
+                        (anchor_total - s_b - gain % fold, 3, dist_a + candidates[b][1] + candidates[c][1]),
+                        (a, b, c),
+                    )
+
+    if not best_set:
+        return None
+
+    # assign each item to the cheapest chosen pharmacy
+    assignment: Dict[str, List[int]] = {}
+    for i in range(n_items):
+        chosen = min(best_set, key=lambda p: (offers[candidates[p][2]].get(i, INF), candidates[p][1]))
+        assignment.setdefault(candidates[chosen][2], []).append(i)
+    return BasketSplit(int(best_key[0]), best_key[2], assignment, exhaustive)
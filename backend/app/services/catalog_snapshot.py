@@ -0,0 +1,562 @@
+# app/services/catalog_snapshot.py
+import abc
+import asyncio
+import bisect
+import fcntl
+import logging
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import String, any_, bindparam, func, select
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import Brand, Package, Pharmacy, PharmacyInventory, Product, ProductImage, Translation
+from ..schemas.product import PackageAvailabilityInfo, PharmacyLocationInfo, ProductDetailModel
+from .catalog_version import catalog_versions
+from .geo_index import nearby_pharmacies, pharmacy_geo
+from .translations import language_chain
+
+log = logging.getLogger(__name__)
+
+
+class PackageRecord:
+    __slots__ = ("id", "product_id", "gtin", "pack_size", "brand_name", "manufacturer", "country_code", "image_urls")
+
+    def __init__(self, id, product_id, gtin, pack_size, brand_name, manufacturer, country_code, image_urls):
+        self.id = id
+        self.product_id = product_id
+        self.gtin = gtin
+        self.pack_size = pack_size
+        self.brand_name = brand_name
+        self.manufacturer = manufacturer
+        self.country_code = country_code
+        self.image_urls = image_urls  # Optional[Tuple[str, ...]], None like the SQL path when there are none
+
+
+class ProductRecord:
+    __slots__ = ("id", "inn_name", "atc_code", "form", "strength", "brand_names", "package_ids", "names")
+
+    def __init__(self, id, inn_name, atc_code, form, strength):
+        self.id = id
+        self.inn_name = inn_name
+        self.atc_code = atc_code
+        self.form = form
+        self.strength = strength
+        self.brand_names: Tuple[str, ...] = ()
+        self.package_ids: Tuple[str, ...] = ()
+        self.names: Dict[str, Tuple[str, Optional[str]]] = {}  # language -> (name, description)
+
+
+class CatalogView(abc.ABC):
+    """
+    What product detail reads from a catalog snapshot: records by product id,
+    package id and gtin. Implemented in memory (CatalogSnapshot) and over the
+    shared snapshot file (MappedCatalogSnapshot).
+    """
+
+    version: Optional[int] = None
+
+    @abc.abstractmethod
+    def product(self, product_id: str) -> Optional[ProductRecord]:
+        ...
+
+    @abc.abstractmethod
+    def package(self, package_id: str) -> Optional[PackageRecord]:
+        ...
+
+    @abc.abstractmethod
+    def package_by_gtin(self, gtin: str) -> Optional[PackageRecord]:
+        ...
+
+    def product_detail(
+        self, product: ProductRecord, language: Optional[str], locations: Dict[str, list],
+    ) -> ProductDetailModel:
+        """Detail document from the snapshot plus {package_id: jsonb pharmacy locations} from the database."""
+        name, description = next(
+            (product.names[lang] for lang in language_chain(language) if lang in product.names), (None, None),
+        )
+        packages = []
+        for package_id in product.package_ids:
+            found = locations.get(package_id)
+            if not found:
+                continue  # like the SQL path: only packages with a matching pharmacy
+            package = self.package(package_id)
+            packages.append(PackageAvailabilityInfo(
+                package_id=package.id,
+                gtin=package.gtin,
+                pack_size=package.pack_size,
+                brand_name=package.brand_name,
+                manufacturer=package.manufacturer,
+                country_code=package.country_code,
+                image_urls=list(package.image_urls) if package.image_urls else None,
+                pharmacy_locations=[PharmacyLocationInfo.model_validate(loc) for loc in found],
+            ))
+        return ProductDetailModel(
+            product_id=product.id,
+            inn_name=product.inn_name,
+            display_name=name or product.inn_name,
+            description=description if name else None,
+            atc_code=product.atc_code,
+            form=product.form,
+            strength=product.strength,
+            brand_names=list(product.brand_names),
+            available_packages=packages,
+            language=language,
+        )
+
+
+class CatalogSnapshot(CatalogView):
+    """
+    Immutable copy of the catalog tables (products, brands, translations,
+    packages, images) as __slots__ records indexed by id, gtin and product.
+    Product detail assembles its metadata from here and only asks Postgres
+    for live inventory.
+    """
+
+    def __init__(self, version: Optional[int], products: Dict[str, ProductRecord], packages: Dict[str, PackageRecord]):
+        self.version = version
+        self.products = products
+        self.packages = packages
+        self.by_gtin: Dict[str, PackageRecord] = {p.gtin: p for p in packages.values() if p.gtin}
+
+    def product(self, product_id: str) -> Optional[ProductRecord]:
+        return self.products.get(product_id)
+
+    def package(self, package_id: str) -> Optional[PackageRecord]:
+        return self.packages.get(package_id)
+
+    def package_by_gtin(self, gtin: str) -> Optional[PackageRecord]:
+        return self.by_gtin.get(gtin)
+
+    @classmethod
+    def build(cls, version: Optional[int], products, brands, translations, packages, images) -> "CatalogSnapshot":
+        by_id: Dict[str, ProductRecord] = {row[0]: ProductRecord(*row) for row in products}
+        brand_info: Dict[str, Tuple[str, Optional[str]]] = {}
+        brand_names: Dict[str, set] = {}
+        for brand_id, product_id, brand_name, manufacturer in brands:
+            brand_info[brand_id] = (brand_name, manufacturer)
+            brand_names.setdefault(product_id, set()).add(brand_name)
+        for product_id, names in brand_names.items():
+            if product_id in by_id:
+                by_id[product_id].brand_names = tuple(sorted(names))
+
+        for product_id, language_code, name, description in translations:
+            product = by_id.get(product_id)
+            if product is not None and name:
+                product.names.setdefault(language_code, (name, description))
+
+        urls: Dict[str, List[str]] = {}
+        for package_id, image_url in images:  # primary image first
+            urls.setdefault(package_id, []).append(image_url)
+
+        package_records: Dict[str, PackageRecord] = {}
+        package_ids: Dict[str, List[str]] = {}
+        for package_id, product_id, brand_id, gtin, pack_size, country_code in packages:
+            brand_name, manufacturer = brand_info.get(brand_id, (None, None))
+            image_urls = urls.get(package_id)
+            package_records[package_id] = PackageRecord(
+                package_id, product_id, gtin, pack_size, brand_name, manufacturer, country_code,
+                tuple(image_urls) if image_urls else None,
+            )
+            package_ids.setdefault(product_id, []).append(package_id)
+        for product_id, ids in package_ids.items():
+            if product_id in by_id:
+                by_id[product_id].package_ids = tuple(ids)
+        return cls(version, by_id, package_records)
+
+
+
+# Shared snapshot file, mapped read-only by every worker. Layout:
+#   header, then 8-byte aligned sections of little-endian fixed-width records.
+#   Strings live once in a UTF-8 blob and are referenced by index into an
+#   offsets table (offsets[i]:offsets[i + 1]); NO_STRING stands for NULL.
+#   Products are sorted by id and own contiguous runs of brand names,
+#   translations and packages; packages own runs of image urls. Lookups by
+#   package id and gtin go through sorted index arrays, so a worker never
+#   builds per-process dicts.
+SNAPSHOT_MAGIC = b"SPCS"
+SNAPSHOT_FORMAT = 1
+NO_STRING = 0xFFFFFFFF
+SECTIONS = (
+    "string_offsets", "strings", "products", "brand_names", "translations",
+    "packages", "package_index", "gtin_index", "images", "pharmacies",
+)
+HEADER = struct.Struct("<4sHHqq" + "QQ" * len(SECTIONS))  # magic, format, -, catalog/pharmacies version, (offset, count) per section
+PRODUCT = struct.Struct("<11I")  # id, inn_name, atc_code, form, strength, (start, count) of brand names, translations, packages
+TRANSLATION = struct.Struct("<3I")  # language, name, description
+PACKAGE = struct.Struct("<8I")  # id, gtin, pack_size, brand_name, manufacturer, country_code, images start, count
+PHARMACY = struct.Struct("<I2dII")  # id, lat, lng, country, city
+U32 = struct.Struct("<I")
+
+
+class _StringTable:
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.blob = bytearray()
+        self.offsets = [0]
+
+    def ref(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        i = self.index.get(value)
+        if i is None:
+            i = self.index[value] = len(self.offsets) - 1
+            self.blob += value.encode()
+            self.offsets.append(len(self.blob))
+        return i
+
+
+def write_snapshot_file(
+    path: str,
+    snapshot: CatalogSnapshot,
+    pharmacies_version: Optional[int],
+    pharmacies: Sequence[Tuple[str, float, float, Optional[str], Optional[str]]],
+) -> None:
+    """Serialize snapshot (plus pharmacy coordinates) to path, written aside and renamed into place."""
+    strings = _StringTable()
+    ref = strings.ref
+    products, brand_names, translations, packages, images = bytearray(), bytearray(), bytearray(), bytearray(), bytearray()
+    package_rows: List[Tuple[str, Optional[str]]] = []  # (id, gtin) by package position
+    n_brands = n_translations = n_images = 0
+    for product in sorted(snapshot.products.values(), key=lambda p: p.id):
+        for name in product.brand_names:
+            brand_names += U32.pack(ref(name))
+        for language, (name, description) in product.names.items():
+            translations += TRANSLATION.pack(ref(language), ref(name), ref(description))
+        for package_id in product.package_ids:
+            package = snapshot.packages[package_id]
+            urls = package.image_urls or ()
+            for url in urls:
+                images += U32.pack(ref(url))
+            packages += PACKAGE.pack(
+                ref(package.id), ref(package.gtin), ref(package.pack_size), ref(package.brand_name),
+                ref(package.manufacturer), ref(package.country_code), n_images, len(urls),
+            )
+            n_images += len(urls)
+            package_rows.append((package.id, package.gtin))
+        products += PRODUCT.pack(
+            ref(product.id), ref(product.inn_name), ref(product.atc_code), ref(product.form), ref(product.strength),
+            n_brands, len(product.brand_names), n_translations, len(product.names),
+            len(package_rows) - len(product.package_ids), len(product.package_ids),
+        )
+        n_brands += len(product.brand_names)
+        n_translations += len(product.names)
+    package_index = sorted(range(len(package_rows)), key=lambda i: package_rows[i][0])
+    gtin_index = sorted((i for i, (_, gtin) in enumerate(package_rows) if gtin), key=lambda i: package_rows[i][1])
+    pharmacy_records = bytearray()
+    for pharmacy_id, lat, lng, country, city in pharmacies:
+        pharmacy_records += PHARMACY.pack(ref(pharmacy_id), float(lat), float(lng), ref(country), ref(city))
+
+    sections = [
+        (struct.pack(f"<{len(strings.offsets)}I", *strings.offsets), len(strings.offsets) - 1),
+        (bytes(strings.blob), len(strings.blob)),
+        (products, len(snapshot.products)),
+        (brand_names, n_brands),
+        (translations, n_translations),
+        (packages, len(package_rows)),
+        (struct.pack(f"<{len(package_index)}I", *package_index), len(package_index)),
+        (struct.pack(f"<{len(gtin_index)}I", *gtin_index), len(gtin_index)),
+        (images, n_images),
+        (pharmacy_records, len(pharmacies)),
+    ]
+    placement, offset = [], HEADER.size
+    for data, count in sections:
+        offset += -offset % 8
+        placement += [offset, count]
+        offset += len(data)
+    header = HEADER.pack(
+        SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, 0,
+        -1 if snapshot.version is None else snapshot.version,
+        -1 if pharmacies_version is None else pharmacies_version,
+        *placement,
+    )
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        for (data, _), start in zip(sections, placement[::2]):
+            f.write(b"\0" * (start - f.tell()))
+            f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class _SortedKeys:
+    """Sequence view of the string keys behind a sorted index array, for bisect."""
+
+    def __init__(self, order, key_of):
+        self.order = order
+        self.key_of = key_of
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __getitem__(self, i: int) -> str:
+        return self.key_of(self.order[i])
+
+
+class MappedCatalogSnapshot(CatalogView):
+    """
+    CatalogView served from a snapshot file mapped read-only. The pages
+    are shared by every worker mapping the same file, and records are decoded
+    on lookup, so per-worker memory does not grow with the catalog.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # the mapping is never closed explicitly: a request still holding the
+        # previous snapshot keeps reading it, and it is unmapped (and a
+        # replaced file freed) once the last reference goes
+        buf = self._buf = memoryview(self._map)
+        fields = HEADER.unpack_from(buf, 0)
+        if fields[0] != SNAPSHOT_MAGIC or fields[1] != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a format {SNAPSHOT_FORMAT} catalog snapshot")
+        self.version = None if fields[3] < 0 else fields[3]
+        self.pharmacies_version = None if fields[4] < 0 else fields[4]
+        self._sections = {name: (fields[5 + 2 * i], fields[6 + 2 * i]) for i, name in enumerate(SECTIONS)}
+        self._string_offsets = self._u32("string_offsets", extra=1)
+        self._strings_at = self._sections["strings"][0]
+        self._brand_names = self._u32("brand_names")
+        self._images = self._u32("images")
+        self._package_index = self._u32("package_index")
+        self._gtin_index = self._u32("gtin_index")
+        self.product_count = self._sections["products"][1]
+        self.package_count = self._sections["packages"][1]
+        self._product_ids = _SortedKeys(range(self.product_count), lambda i: self._field(PRODUCT, "products", i, 0))
+        self._package_ids = _SortedKeys(self._package_index, lambda i: self._field(PACKAGE, "packages", i, 0))
+        self._gtins = _SortedKeys(self._gtin_index, lambda i: self._field(PACKAGE, "packages", i, 1))
+
+    def _u32(self, section: str, extra: int = 0):
+        offset, count = self._sections[section]
+        return self._buf[offset:offset + 4 * (count + extra)].cast("I")
+
+    def _record(self, record: struct.Struct, section: str, i: int) -> tuple:
+        return record.unpack_from(self._buf, self._sections[section][0] + i * record.size)
+
+    def _string(self, i: int) -> Optional[str]:
+        if i == NO_STRING:
+            return None
+        start = self._strings_at + self._string_offsets[i]
+        return str(self._buf[start:self._strings_at + self._string_offsets[i + 1]], "utf-8")
+
+    def _field(self, record: struct.Struct, section: str, i: int, field: int) -> Optional[str]:
+        return self._string(self._record(record, section, i)[field])
+
+    @staticmethod
+    def _find(keys: _SortedKeys, key: str) -> Optional[int]:
+        i = bisect.bisect_left(keys, key)
+        return keys.order[i] if i < len(keys) and keys[i] == key else None
+
+    def _package_at(self, i: int) -> PackageRecord:
+        id_, gtin, pack_size, brand_name, manufacturer, country_code, start, count = self._record(PACKAGE, "packages", i)
+        s = self._string
+        return PackageRecord(
+            s(id_), None, s(gtin), s(pack_size), s(brand_name), s(manufacturer), s(country_code),
+            tuple(s(u) for u in self._images[start:start + count]) or None,
+        )
+
+    def product(self, product_id: str) -> Optional[ProductRecord]:
+        i = self._find(self._product_ids, product_id)
+        if i is None:
+            return None
+        s = self._string
+        (id_, inn_name, atc_code, form, strength,
+         brands_at, brands, translations_at, translations, packages_at, packages) = self._record(PRODUCT, "products", i)
+        product = ProductRecord(s(id_), s(inn_name), s(atc_code), s(form), s(strength))
+        product.brand_names = tuple(s(b) for b in self._brand_names[brands_at:brands_at + brands])
+        product.package_ids = tuple(
+            self._field(PACKAGE, "packages", p, 0) for p in range(packages_at, packages_at + packages)
+        )
+        for t in range(translations_at, translations_at + translations):
+            language, name, description = self._record(TRANSLATION, "translations", t)
+            product.names[s(language)] = (s(name), s(description))
+        return product
+
+    def package(self, package_id: str) -> Optional[PackageRecord]:
+        i = self._find(self._package_ids, package_id)
+        return None if i is None else self._package_at(i)
+
+    def package_by_gtin(self, gtin: str) -> Optional[PackageRecord]:
+        i = self._find(self._gtins, gtin)
+        return None if i is None else self._package_at(i)
+
+    def pharmacy_rows(self) -> Iterator[Tuple[str, float, float, Optional[str], Optional[str]]]:
+        s = self._string
+        for i in range(self._sections["pharmacies"][1]):
+            pharmacy_id, lat, lng, country, city = self._record(PHARMACY, "pharmacies", i)
+            yield s(pharmacy_id), lat, lng, s(country), s(city)
+
+
+def _newer_or_equal(have: Optional[int], want: Optional[int]) -> bool:
+    return want is None or (have is not None and have >= want)
+
+
+def open_if_current(path: str, catalog_version: Optional[int], pharmacies_version: Optional[int]):
+    """The snapshot at path if it is at least as new as the given versions, else None."""
+    try:
+        mapped = MappedCatalogSnapshot(path)
+    except (OSError, ValueError):
+        return None
+    if _newer_or_equal(mapped.version, catalog_version) and _newer_or_equal(mapped.pharmacies_version, pharmacies_version):
+        return mapped
+    return None
+
+
+def package_locations_stmt(
+    package_ids: Sequence[str],
+    lat: Optional[float],
+    lng: Optional[float],
+    radius_km: Optional[int],
+    only_in_stock: bool,
+):
+    """
+    Pharmacy locations per package, shaped like List[PharmacyLocationInfo]:
+    the live-inventory half of product_detail_stmt. The ids are one array
+    parameter, so every product shares one prepared statement.
+    """
+    # Pharmacies without coordinates are never returned
+    filters = [
+        PharmacyInventory.package_id == any_(bindparam("package_ids", list(package_ids), type_=ARRAY(String))),
+        Pharmacy.lat.isnot(None),
+        Pharmacy.lng.isnot(None),
+    ]
+    if only_in_stock:
+        filters += [PharmacyInventory.stock_quantity.isnot(None), PharmacyInventory.stock_quantity > 0]
+    location = func.jsonb_build_object(
+        "pharmacy_id", Pharmacy.id,
+        "pharmacy_name", Pharmacy.name,
+        "pharmacy_address", func.coalesce(Pharmacy.address, ""),
+        "pharmacy_city", func.coalesce(Pharmacy.city, ""),
+        "pharmacy_country", func.coalesce(Pharmacy.country, ""),
+        "lat", Pharmacy.lat,
+        "lng", Pharmacy.lng,
+        "price_cents", PharmacyInventory.price_cents,
+        "currency", func.coalesce(PharmacyInventory.currency, "EUR"),
+        "stock_quantity", func.coalesce(PharmacyInventory.stock_quantity, 0),
+        "last_updated", PharmacyInventory.last_updated,
+    )
+    stmt = (
+        select(PharmacyInventory.package_id, func.jsonb_agg(location, type_=JSONB))
+        .join(Pharmacy, PharmacyInventory.pharmacy_id == Pharmacy.id)
+        .where(*filters)
+        .group_by(PharmacyInventory.package_id)
+    )
+    if lat is not None and lng is not None and radius_km is not None:
+        nearby = nearby_pharmacies(lat, lng, radius_km)
+        stmt = stmt.join(nearby, nearby.c.pharmacy_id == PharmacyInventory.pharmacy_id)
+    return stmt
+
+
+class CatalogSnapshots:
+    """
+    Holds the current CatalogSnapshot and swaps in a rebuilt one when the
+    'catalog' version moves.
+
+    With a directory (CATALOG_SNAPSHOT_DIR) the snapshot is shared by all
+    workers on the host: whoever finds the file older than the versions it
+    has seen builds a new one under an exclusive flock and renames it into
+    place, the others wait on the lock and map the result. A worker starting
+    next to a current file maps it without touching the database. The file
+    also carries the pharmacy coordinates, which then feed the geo index.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.snapshot: Optional[CatalogView] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.snapshot is not None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, "catalog.snapshot")
+
+    async def _build(self) -> CatalogSnapshot:
+        version = catalog_versions.get("catalog")  # read before the rows, so a racing change still moves it
+        async with SessionLocal() as db:
+            products = (await db.execute(select(
+                Product.id, Product.inn_name, Product.atc_code, Product.form, Product.strength,
+            ))).all()
+            brands = (await db.execute(select(
+                Brand.id, Brand.product_id, Brand.brand_name, Brand.manufacturer,
+            ))).all()
+            translations = (await db.execute(select(
+                Translation.product_id, Translation.language_code,
+                Translation.translated_name, Translation.translated_description,
+            ))).all()
+            packages = (await db.execute(select(
+                Package.id, Package.product_id, Package.brand_id, Package.gtin,
+                Package.pack_size, Package.country_code,
+            ).order_by(Package.id))).all()
+            images = (await db.execute(
+                select(ProductImage.package_id, ProductImage.image_url)
+                .order_by(ProductImage.package_id, ProductImage.is_primary.desc().nulls_last(), ProductImage.id)
+            )).all()
+        return await asyncio.to_thread(CatalogSnapshot.build, version, products, brands, translations, packages, images)
+
+    async def _publish(self) -> None:
+        """Build the snapshot file from the database; the caller holds the flock."""
+        pharmacies_version = catalog_versions.get("pharmacies")
+        snapshot = await self._build()
+        async with SessionLocal() as db:
+            pharmacies = (await db.execute(
+                select(Pharmacy.id, Pharmacy.lat, Pharmacy.lng, Pharmacy.country, Pharmacy.city)
+                .where(Pharmacy.lat.isnot(None), Pharmacy.lng.isnot(None))
+            )).all()
+        await asyncio.to_thread(write_snapshot_file, self.path, snapshot, pharmacies_version, pharmacies)
+        log.info("published catalog snapshot file: %d products, %d packages, %d pharmacies (catalog version %s)",
+                 len(snapshot.products), len(snapshot.packages), len(pharmacies), snapshot.version)
+
+    async def _map_shared(self) -> MappedCatalogSnapshot:
+        wanted = catalog_versions.get("catalog"), catalog_versions.get("pharmacies")
+        mapped = await asyncio.to_thread(open_if_current, self.path, *wanted)
+        if mapped is not None:
+            return mapped
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            # another worker may have published while we waited
+            mapped = await asyncio.to_thread(open_if_current, self.path, *wanted)
+            if mapped is None:
+                await self._publish()
+                mapped = await asyncio.to_thread(MappedCatalogSnapshot, self.path)
+        finally:
+            os.close(fd)  # releases the flock
+        return mapped
+
+    async def rebuild(self, version: Optional[int] = None) -> None:
+        async with self._lock:
+            if not self.directory:
+                snapshot = await self._build()
+                self.snapshot = snapshot  # atomic swap; requests keep the snapshot they started with
+                log.info("catalog snapshot rebuilt: %d products, %d packages (catalog version %s)",
+                         len(snapshot.products), len(snapshot.packages), snapshot.version)
+                return
+            mapped = await self._map_shared()
+            self.snapshot = mapped
+            log.info("mapped catalog snapshot: %d products, %d packages (catalog version %s, pharmacies version %s)",
+                     mapped.product_count, mapped.package_count, mapped.version, mapped.pharmacies_version)
+            if settings.GEO_INDEX_ENABLED:
+                geo = pharmacy_geo.index
+                if geo is None or geo.version != mapped.pharmacies_version:
+                    await pharmacy_geo.load(mapped.pharmacies_version, list(mapped.pharmacy_rows()))
+
+    async def start(self) -> None:
+        catalog_versions.subscribe("catalog", self.rebuild)
+        if self.directory:
+            catalog_versions.subscribe("pharmacies", self.rebuild)
+        try:
+            await self.rebuild()
+        except Exception:
+            log.warning("catalog snapshot build failed; product detail stays on the joined query", exc_info=True)
+
+
+catalog_snapshot = CatalogSnapshots(settings.CATALOG_SNAPSHOT_DIR)
@@ -0,0 +1,93 @@
+# app/services/catalog_version.py
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Awaitable, Callable, DefaultDict, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import CatalogVersion
+
+log = logging.getLogger(__name__)
+
+Listener = Callable[[int], Awaitable[None]]
+
+
+class CatalogVersions:
+    """
+    Polls the catalog_versions counters and notifies listeners when one moves.
+
+    The counters are bumped by statement triggers on the source tables, so a
+    poll is a single primary-key read no matter how large the catalog is.
+    """
+
+    def __init__(self, poll_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.versions: Dict[str, int] = {}
+        self._listeners: DefaultDict[str, List[Listener]] = defaultdict(list)
+        self._task: Optional[asyncio.Task] = None
+        # set when start() could not read a baseline: listeners subscribed
+        # since may still be waiting for their first build
+        self._announce = False
+
+    def get(self, name: str) -> Optional[int]:
+        return self.versions.get(name)
+
+    def subscribe(self, name: str, listener: Listener) -> None:
+        self._listeners[name].append(listener)
+
+    async def _read(self) -> List[Tuple[str, int]]:
+        async with SessionLocal() as db:
+            res = await db.execute(select(CatalogVersion.name, CatalogVersion.version))
+            return res.all()
+
+    async def refresh(self) -> None:
+        rows = await self._read()
+
+        changed = []
+        for name, version in rows:
+            previous = self.versions.get(name)
+            self.versions[name] = version
+            # the first observation is the baseline, not a change; after a
+            # failed start it is reported, so builds that failed along with
+            # the start catch up on the first successful poll
+            if (previous is not None or self._announce) and previous != version:
+                changed.append((name, version))
+        self._announce = False
+
+        for name, version in changed:
+            for listener in self._listeners[name]:
+                try:
+                    await listener(version)
+                except Exception:
+                    log.exception("catalog listener failed for %s@%s", name, version)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                log.warning("catalog version poll failed", exc_info=True)
+
+    async def start(self) -> None:
+        try:
+            await self.refresh()
+        except Exception:
+            log.warning("initial catalog version read failed; will retry", exc_info=True)
+            self._announce = True
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+catalog_versions = CatalogVersions(settings.CATALOG_POLL_SECONDS)
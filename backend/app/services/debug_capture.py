@@ -0,0 +1,95 @@
+# app/services/debug_capture.py
+import asyncio
+import json
+import logging
+import os
+import random
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from ..core.config import settings
+
+log = logging.getLogger(__name__)
+
+
+class DebugCapture:
+    """
+    Sampled capture of endpoint responses for debugging.
+
+    Sampled records go into a bounded in-memory ring buffer (readable through
+    /admin/captures) and, when a directory is configured, are appended to
+    <dir>/<name>.jsonl by a background writer task. The request path never
+    touches the disk.
+    """
+
+    def __init__(self, sample_rate: float, buffer_size: int, directory: Optional[str], queue_size: int = 1000):
+        self.sample_rate = sample_rate
+        self.directory = directory
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self.dropped = 0
+
+    def capture(self, name: str, payload: Callable[[], Any], **params: Any) -> None:
+        """`payload` is only called (and params serialized) when the request is sampled."""
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return
+        record = {
+            "name": name,
+            "captured_at": datetime.now(timezone.utc).isoformat(),
+            "params": {
+                k: v.model_dump(mode="json") if hasattr(v, "model_dump") else v
+                for k, v in params.items()
+            },
+            "payload": payload(),
+        }
+        self._buffer.append(record)
+        if self._task is not None:
+            try:
+                self._queue.put_nowait(record)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def recent(self, name: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        records = [r for r in reversed(self._buffer) if name is None or r["name"] == name]
+        return records[:limit]
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        by_name: Dict[str, List[str]] = {}
+        for record in batch:
+            by_name.setdefault(record["name"], []).append(json.dumps(record, ensure_ascii=False, default=str))
+        for name, lines in by_name.items():
+            with open(os.path.join(self.directory, f"{name}.jsonl"), "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+
+    async def _writer(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < 500:
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception:
+                log.warning("failed to write %d debug captures", len(batch), exc_info=True)
+
+    async def start(self) -> None:
+        if self.directory and self.sample_rate > 0:
+            self._task = asyncio.create_task(self._writer())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+debug_capture = DebugCapture(
+    settings.DEBUG_CAPTURE_SAMPLE_RATE,
+    settings.DEBUG_CAPTURE_BUFFER_SIZE,
+    settings.DEBUG_CAPTURE_DIR,
+)
@@ -0,0 +1,187 @@
+# app/services/geo_index.py
+import asyncio
+import logging
+import math
+from array import array
+from collections import defaultdict
+from typing import AbstractSet, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, String, column, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import Pharmacy
+from ..models.pharmacies import EARTH_RADIUS_KM, bounding_box
+from .catalog_version import catalog_versions
+
+log = logging.getLogger(__name__)
+
+WORLD_KM = math.pi * EARTH_RADIUS_KM  # no two points are further apart
+
+
+class GeoIndex:
+    """
+    Immutable grid index over pharmacy coordinates.
+
+    Pharmacies are bucketed into cell_deg x cell_deg cells; a radius query
+    visits only the cells overlapping the query's bounding box and runs the
+    haversine on those candidates, using precomputed radians/cosines.
+    """
+
+    def __init__(
+        self,
+        version: Optional[int],
+        rows: Sequence[Tuple[str, float, float, Optional[str], Optional[str]]],
+        cell_deg: float,
+    ):
+        self.version = version
+        self.cell_deg = cell_deg
+        self.ids: List[str] = []
+        self.countries: List[Optional[str]] = []
+        self.cities: List[Optional[str]] = []
+        self._lat_rad = array("d")
+        self._lng_rad = array("d")
+        self._cos_lat = array("d")
+        cells: Dict[Tuple[int, int], array] = defaultdict(lambda: array("I"))
+        for pharmacy_id, lat, lng, country, city in rows:
+            i = len(self.ids)
+            self.ids.append(pharmacy_id)
+            self.countries.append(country)
+            self.cities.append(city)
+            self._lat_rad.append(math.radians(lat))
+            self._lng_rad.append(math.radians(lng))
+            self._cos_lat.append(math.cos(math.radians(lat)))
+            cells[self._cell(lat, lng)].append(i)
+        self._cells = dict(cells)
+        self._positions = {pid: i for i, pid in enumerate(self.ids)}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def place(self, pharmacy_id: str) -> Tuple[Optional[str], Optional[str]]:
+        """(country, city) of an indexed pharmacy."""
+        i = self._positions[pharmacy_id]
+        return self.countries[i], self.cities[i]
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def _candidate_cells(self, lat: float, lng: float, radius_km: float):
+        min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_km)
+        lo_r, lo_c = self._cell(min_lat, min_lng)
+        hi_r, hi_c = self._cell(max_lat, max_lng)
+        if (hi_r - lo_r + 1) * (hi_c - lo_c + 1) > len(self._cells):
+            # huge box: cheaper to walk the occupied cells
+            return [
+                idx for (r, c), idx in self._cells.items()
+                if lo_r <= r <= hi_r and lo_c <= c <= hi_c
+            ]
+        cells = self._cells
+        return [
+            cells[(r, c)]
+            for r in range(lo_r, hi_r + 1)
+            for c in range(lo_c, hi_c + 1)
+            if (r, c) in cells
+        ]
+
+    def within(self, lat: float, lng: float, radius_km: float) -> List[Tuple[str, float]]:
+        """(pharmacy_id, distance_km) within radius_km, nearest first."""
+        lat0 = math.radians(lat)
+        lng0 = math.radians(lng)
+        cos0 = math.cos(lat0)
+        # compare in haversine space; asin only for the hits
+        max_h = math.sin(min(radius_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+        lat_rad, lng_rad, cos_lat = self._lat_rad, self._lng_rad, self._cos_lat
+        sin, sqrt, asin = math.sin, math.sqrt, math.asin
+
+        hits = []
+        for bucket in self._candidate_cells(lat, lng, radius_km):
+            for i in bucket:
+                h = sin((lat_rad[i] - lat0) / 2) ** 2 + cos0 * cos_lat[i] * sin((lng_rad[i] - lng0) / 2) ** 2
+                if h <= max_h:
+                    hits.append((2 * EARTH_RADIUS_KM * asin(sqrt(min(h, 1.0))), i))
+        hits.sort()
+        ids = self.ids
+        return [(ids[i], d) for d, i in hits]
+
+    def nearest(self, lat: float, lng: float, k: int, max_radius_km: Optional[float] = None) -> List[Tuple[str, float]]:
+        """k nearest (pharmacy_id, distance_km), growing the search radius until k are found."""
+        limit = min(max_radius_km or WORLD_KM, WORLD_KM)
+        radius = min(self.cell_deg * 111.0, limit)
+        while True:
+            hits = self.within(lat, lng, radius)
+            if len(hits) >= k or radius >= limit:
+                return hits[:k]
+            radius = min(radius * 2, limit)
+
+
+class PharmacyGeo:
+    """Holds the current GeoIndex; rebuilt and swapped when the pharmacies table changes."""
+
+    def __init__(self, cell_deg: float):
+        self.cell_deg = cell_deg
+        self.index: Optional[GeoIndex] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    async def load(self, version: Optional[int], rows) -> None:
+        """Index rows of (id, lat, lng, country, city) and swap them in."""
+        index = await asyncio.to_thread(GeoIndex, version, rows, self.cell_deg)
+        self.index = index
+        log.info("pharmacy geo index rebuilt: %d pharmacies (version %s)", len(index), index.version)
+
+    async def rebuild(self, version: Optional[int] = None) -> None:
+        async with self._lock:
+            async with SessionLocal() as db:
+                rows = (await db.execute(
+                    select(Pharmacy.id, Pharmacy.lat, Pharmacy.lng, Pharmacy.country, Pharmacy.city)
+                    .where(Pharmacy.lat.isnot(None), Pharmacy.lng.isnot(None))
+                )).all()
+            await self.load(version or catalog_versions.get("pharmacies"), rows)
+
+    async def start(self) -> None:
+        catalog_versions.subscribe("pharmacies", self.rebuild)
+        try:
+            await self.rebuild()
+        except Exception:
+            log.warning("pharmacy geo index build failed; radius queries stay in SQL", exc_info=True)
+
+
+pharmacy_geo = PharmacyGeo(settings.GEO_INDEX_CELL_DEGREES)
+
+
+def nearby_pharmacies(lat: float, lng: float, radius_km: float, among: Optional[AbstractSet[str]] = None):
+    """
+    FROM-able (pharmacy_id, distance_km) for pharmacies within radius_km,
+    optionally restricted to the pharmacy ids in `among`.
+
+    Served by the in-memory index as `unnest(ids, distances)` when it is
+    loaded, so no distance math runs in Postgres; otherwise the bounding box +
+    haversine filter is done in SQL.
+    """
+    if settings.GEO_INDEX_ENABLED and pharmacy_geo.ready:
+        hits = pharmacy_geo.index.within(lat, lng, radius_km)
+        if among is not None:
+            hits = [(pid, d) for pid, d in hits if pid in among]
+        return (
+            func.unnest(
+                literal([pid for pid, _ in hits], ARRAY(String)),
+                literal([d for _, d in hits], ARRAY(Float)),
+            )
+            .table_valued(column("pharmacy_id", String), column("distance_km", Float))
+            .render_derived(name="nearby")
+        )
+    # haversine once per bounding-box survivor; MATERIALIZED keeps Postgres
+    # from inlining the CTE and repeating the expression in the outer filter
+    in_box = (
+        select(Pharmacy.id.label("pharmacy_id"), Pharmacy.distance_to(lat, lng).label("distance_km"))
+        .where(Pharmacy.in_bounding_box(lat, lng, radius_km))
+    )
+    if among is not None:
+        in_box = in_box.where(Pharmacy.id.in_(list(among)))
+    in_box = in_box.cte("in_box").prefix_with("MATERIALIZED")
+    return select(in_box).where(in_box.c.distance_km <= radius_km).subquery("nearby")
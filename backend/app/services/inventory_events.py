@@ -0,0 +1,166 @@
+# app/services/inventory_events.py
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import asyncpg
+from sqlalchemy.engine import make_url
+
+from ..core.config import settings
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "inventory_changes"
+
+
+class InventoryChange:
+    """New state of one pharmacy/package row; stock and price are None when the row is gone."""
+
+    __slots__ = ("package_id", "pharmacy_id", "stock_quantity", "price_cents")
+
+    def __init__(self, package_id: str, pharmacy_id: str, stock_quantity: Optional[int], price_cents: Optional[int]):
+        self.package_id = package_id
+        self.pharmacy_id = pharmacy_id
+        self.stock_quantity = stock_quantity
+        self.price_cents = price_cents
+
+    @property
+    def in_stock(self) -> bool:
+        return self.stock_quantity is not None and self.stock_quantity > 0
+
+
+# (changes, reset): with reset=True events may have been missed and
+# everything derived from inventory has to be dropped or rebuilt
+Listener = Callable[[List[InventoryChange], bool], Awaitable[None]]
+
+
+def listen_dsn() -> str:
+    """
+    asyncpg DSN for the LISTEN connection (the SQLAlchemy URL minus the driver
+    suffix). LISTEN needs a session of its own, so behind a transaction-pooling
+    PgBouncer DATABASE_LISTEN_URL must point at Postgres directly.
+    """
+    return make_url(settings.DATABASE_LISTEN_URL or settings.DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class InventoryEvents:
+    """
+    Per-worker consumer of the inventory_changes NOTIFY channel.
+
+    A dedicated asyncpg connection (outside the pool; LISTEN is per session)
+    receives the trigger payloads. Changes are coalesced per pharmacy/package
+    for coalesce_seconds and then handed to the listeners in one batch, so a
+    burst of updates costs one invalidation pass. While the connection is
+    down `connected` is False and dependent caches must not be trusted; a
+    reset is dispatched on every disconnect and reconnect.
+    """
+
+    def __init__(self, coalesce_seconds: float, keepalive_seconds: float = 30.0):
+        self.coalesce_seconds = coalesce_seconds
+        self.keepalive_seconds = keepalive_seconds
+        self.connected = False
+        self.notifications = 0
+        self.dispatches = 0
+        self._listeners: List[Listener] = []
+        self._pending: Dict[Tuple[str, str], InventoryChange] = {}
+        self._reset = False
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(self, listener: Listener) -> None:
+        self._listeners.append(listener)
+
+    def _on_notify(self, conn, pid: int, channel: str, payload: str) -> None:
+        self.notifications += 1
+        try:
+            data = json.loads(payload)
+            if data.get("reset"):
+                self._reset = True
+            for package_id, pharmacy_id, stock, price in data.get("c", ()):
+                self._pending[package_id, pharmacy_id] = InventoryChange(package_id, pharmacy_id, stock, price)
+        except (ValueError, TypeError, AttributeError):
+            log.warning("unreadable inventory notification: %.200s", payload)
+            self._reset = True
+        self._wakeup.set()
+
+    def _request_reset(self) -> None:
+        self._reset = True
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            # let the rest of a burst arrive before fanning out
+            await asyncio.sleep(self.coalesce_seconds)
+            self._wakeup.clear()
+            changes = list(self._pending.values())
+            self._pending = {}
+            reset, self._reset = self._reset, False
+            if not changes and not reset:
+                continue
+            self.dispatches += 1
+            for listener in self._listeners:
+                try:
+                    await listener(changes, reset)
+                except Exception:
+                    log.exception("inventory listener failed (%d changes, reset=%s)", len(changes), reset)
+
+    async def _listen(self) -> None:
+        backoff = 1.0
+        first = True
+        while True:
+            try:
+                conn = await asyncpg.connect(listen_dsn())
+            except Exception:
+                log.warning("inventory LISTEN connect failed; retrying in %.0fs", backoff, exc_info=True)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+                continue
+            lost = asyncio.Event()
+            conn.add_termination_listener(lambda _conn: lost.set())
+            try:
+                await conn.add_listener(CHANNEL, self._on_notify)
+                self.connected = True
+                backoff = 1.0
+                if not first:
+                    self._request_reset()  # changes made while we were away were not seen
+                first = False
+                log.info("listening on %s", CHANNEL)
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        # a silently dropped TCP connection never terminates on its own
+                        await asyncio.wait_for(conn.fetchval("SELECT 1"), 10)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("inventory LISTEN connection lost", exc_info=True)
+            finally:
+                if self.connected:
+                    self.connected = False
+                    self._request_reset()
+                if not conn.is_closed():
+                    conn.terminate()
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._listen())]
+        # give the first connect a moment so caches start out enabled
+        for _ in range(20):
+            if self.connected:
+                break
+            await asyncio.sleep(0.05)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+
+
+inventory_events = InventoryEvents(settings.INVENTORY_EVENTS_COALESCE_MS / 1000)
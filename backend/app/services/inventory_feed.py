@@ -0,0 +1,227 @@
+# app/services/inventory_feed.py
+"""
+Partner inventory feed ingestion.
+
+Feeds are CSV (with a header row) or NDJSON with the fields pharmacy_id,
+package_id, price_cents, currency, stock_quantity and optionally
+last_updated. Rows are streamed into the unlogged inventory_staging table
+with COPY and merged into pharmacy_inventory with one INSERT ... ON CONFLICT
+that only touches rows whose price, currency or stock changed.
+
+    python -m app.services.inventory_feed feed.csv [--format ndjson]
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+import logging
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Iterable, List, Optional, Tuple
+
+from ..core.db import engine
+from ..schemas.pharmacy import InventoryFeedReport
+
+log = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+STAGING_COLUMNS = (
+    "batch_id", "pharmacy_id", "package_id", "price_cents", "currency", "stock_quantity", "last_updated",
+)
+FeedRow = Tuple[str, str, Optional[int], str, Optional[int], Optional[datetime]]
+
+
+class FeedError(ValueError):
+    """A feed line that cannot be parsed; the whole batch is rejected."""
+
+
+MERGE_SQL = """
+WITH latest AS (
+    SELECT DISTINCT ON (pharmacy_id, package_id)
+           pharmacy_id, package_id, price_cents, currency, stock_quantity, last_updated
+      FROM inventory_staging
+     WHERE batch_id = $1
+     ORDER BY pharmacy_id, package_id, seq DESC
+), src AS (
+    SELECT l.*
+      FROM latest l
+      JOIN pharmacies ph ON ph.id = l.pharmacy_id
+      JOIN packages pk ON pk.id = l.package_id
+), merged AS (
+    INSERT INTO pharmacy_inventory AS inv
+           (id, pharmacy_id, package_id, price_cents, currency, stock_quantity, last_updated)
+    SELECT gen_random_uuid()::text, pharmacy_id, package_id, price_cents, currency, stock_quantity,
+           coalesce(last_updated, now())
+      FROM src
+    ON CONFLICT (pharmacy_id, package_id) DO UPDATE
+       SET price_cents = EXCLUDED.price_cents,
+           currency = EXCLUDED.currency,
+           stock_quantity = EXCLUDED.stock_quantity,
+           last_updated = EXCLUDED.last_updated
+     WHERE (inv.price_cents, inv.currency, inv.stock_quantity)
+           IS DISTINCT FROM (EXCLUDED.price_cents, EXCLUDED.currency, EXCLUDED.stock_quantity)
+    RETURNING (xmax = 0) AS inserted
+)
+SELECT (SELECT count(*) FROM latest) AS distinct_rows,
+       (SELECT count(*) FROM src) AS matched,
+       count(*) FILTER (WHERE inserted) AS inserted,
+       count(*) FILTER (WHERE NOT inserted) AS updated
+  FROM merged
+"""
+
+
+def _int(value, field: str, line_no: int) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise FeedError(f"line {line_no}: {field} is not an integer: {value!r}")
+
+
+def _currency(value, line_no: int) -> str:
+    if value is None or value == "":
+        return "EUR"
+    if not isinstance(value, str) or len(value) != 3 or not (value.isascii() and value.isalpha()):
+        raise FeedError(f"line {line_no}: currency is not a 3-letter code: {value!r}")
+    return value.upper()
+
+
+def _timestamp(value, line_no: int) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        ts = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise FeedError(f"line {line_no}: last_updated is not an ISO timestamp: {value!r}")
+    # the column is timestamp without time zone, stored as UTC
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+def _row(record: dict, line_no: int) -> FeedRow:
+    pharmacy_id = record.get("pharmacy_id")
+    package_id = record.get("package_id")
+    if not pharmacy_id or not package_id:
+        raise FeedError(f"line {line_no}: pharmacy_id and package_id are required")
+    return (
+        str(pharmacy_id),
+        str(package_id),
+        _int(record.get("price_cents"), "price_cents", line_no),
+        _currency(record.get("currency"), line_no),
+        _int(record.get("stock_quantity"), "stock_quantity", line_no),
+        _timestamp(record.get("last_updated"), line_no),
+    )
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[str]:
+    """Decode a byte stream into lines without holding the whole body."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+async def parse_feed(lines: AsyncIterable[str], fmt: str) -> AsyncIterator[FeedRow]:
+    """
+    Feed lines to staging rows. CSV is parsed line by line, so quoted fields
+    must not contain newlines.
+    """
+    if fmt not in FORMATS:
+        raise FeedError(f"unknown feed format {fmt!r}")
+    header: Optional[List[str]] = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        line = line.rstrip("\r")
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise FeedError(f"line {line_no}: invalid JSON ({e.msg})")
+            if not isinstance(record, dict):
+                raise FeedError(f"line {line_no}: expected a JSON object")
+        else:
+            fields = next(csv.reader([line]))
+            if header is None:
+                header = [f.strip() for f in fields]
+                continue
+            record = dict(zip(header, fields))
+        yield _row(record, line_no)
+
+
+async def _aiter(items: Iterable) -> AsyncIterator:
+    for item in items:
+        yield item
+
+
+async def ingest(rows: AsyncIterable[FeedRow]) -> InventoryFeedReport:
+    """COPY rows into staging under a fresh batch id, then merge them into pharmacy_inventory."""
+    batch_id = uuid.uuid4().hex
+    started = time.perf_counter()
+    staged = 0
+
+    async def records():
+        nonlocal staged
+        async for row in rows:
+            staged += 1
+            yield (batch_id, *row)
+
+    async with engine.connect() as conn:
+        pg = (await conn.get_raw_connection()).driver_connection
+        try:
+            await pg.copy_records_to_table("inventory_staging", records=records(), columns=STAGING_COLUMNS)
+            async with pg.transaction():
+                result = await pg.fetchrow(MERGE_SQL, batch_id)
+        finally:
+            await pg.execute("DELETE FROM inventory_staging WHERE batch_id = $1", batch_id)
+
+    seconds = time.perf_counter() - started
+    distinct_rows, matched = result["distinct_rows"], result["matched"]
+    inserted, updated = result["inserted"], result["updated"]
+    report = InventoryFeedReport(
+        batch_id=batch_id,
+        staged=staged,
+        inserted=inserted,
+        updated=updated,
+        unchanged=matched - inserted - updated,
+        duplicates=staged - distinct_rows,
+        rejected=distinct_rows - matched,
+        seconds=round(seconds, 3),
+        rows_per_second=round(staged / seconds, 1) if seconds > 0 else 0.0,
+    )
+    log.info(
+        "inventory feed %s: %d staged, %d inserted, %d updated, %d unchanged, %d rejected in %.2fs",
+        batch_id, staged, inserted, updated, report.unchanged, report.rejected, seconds,
+    )
+    return report
+
+
+async def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Load a partner inventory feed into pharmacy_inventory.")
+    parser.add_argument("path", help="feed file, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension, else csv")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("ndjson" if args.path.endswith((".ndjson", ".jsonl")) else "csv")
+    source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8-sig", newline="")
+    try:
+        report = await ingest(parse_feed(_aiter(source), fmt))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(json.dumps(report.model_dump(), indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
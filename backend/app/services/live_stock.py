@@ -0,0 +1,211 @@
+# app/services/live_stock.py
+import asyncio
+from collections import defaultdict
+from typing import Any, DefaultDict, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Package, Pharmacy, PharmacyInventory, Product
+from .geo_index import nearby_pharmacies
+from .inventory_events import InventoryChange
+
+RESYNC = {"type": "resync"}
+
+
+class LiveSubscription:
+    """
+    One open product page: the product's packages, the pharmacies in range
+    and the last known (stock, price) per pharmacy/package, which is what
+    deltas are computed against.
+
+    While the baseline is (re)read the subscription is already registered:
+    changes arriving meanwhile are buffered and replayed on top of it, so
+    nothing committed between the read and the registration is lost.
+    """
+
+    def __init__(self, product_id: str, lat: float, lng: float, radius_km: float, queue_size: int = 100):
+        self.product_id = product_id
+        self.lat = lat
+        self.lng = lng
+        self.radius_km = radius_km
+        self.package_ids: Set[str] = set()
+        self.pharmacies: Dict[str, Dict[str, Any]] = {}  # id -> name/address/... and distance_km
+        self.state: Dict[Tuple[str, str], Tuple[Optional[int], Optional[int]]] = {}
+        self.queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+        self.loading = True  # until the first baseline is in
+        self.pending: List[InventoryChange] = []
+
+    async def load_packages(self, db: AsyncSession) -> bool:
+        """(Re)read the product's package ids; False if the product does not exist."""
+        self.package_ids = set((await db.execute(
+            select(Package.id).where(Package.product_id == self.product_id)
+        )).scalars())
+        if self.package_ids:
+            return True
+        return (await db.execute(select(Product.id).where(Product.id == self.product_id))).first() is not None
+
+    def begin_load(self) -> None:
+        """Buffer changes from now on; call before rereading the baseline of a registered subscription."""
+        self.loading = True
+        self.pending = []
+
+    async def load_state(self, db: AsyncSession) -> None:
+        """
+        (Re)read nearby pharmacies and their inventory, then replay the
+        changes buffered meanwhile. They arrive in commit order and carry
+        absolute values, so the state ends at the newest of baseline and events.
+        """
+        self.loading = True
+        try:
+            await self._read_state(db)
+        finally:
+            self.loading = False
+            pending, self.pending = self.pending, []
+        messages = [m for m in map(self.delta, pending) if m is not None]
+        if messages:
+            self.push({"type": "deltas", "changes": messages})
+
+    async def _read_state(self, db: AsyncSession) -> None:
+        if not self.package_ids:
+            self.pharmacies, self.state = {}, {}
+            return
+        nearby = nearby_pharmacies(self.lat, self.lng, self.radius_km)
+        pharmacy_rows = (await db.execute(
+            select(
+                Pharmacy.id, Pharmacy.name, Pharmacy.address, Pharmacy.city, Pharmacy.country,
+                Pharmacy.lat, Pharmacy.lng, nearby.c.distance_km,
+            ).join(nearby, nearby.c.pharmacy_id == Pharmacy.id)
+        )).all()
+        self.pharmacies = {
+            pid: {
+                "pharmacy_name": name,
+                "pharmacy_address": address or "",
+                "pharmacy_city": city or "",
+                "pharmacy_country": country or "",
+                "lat": lat,
+                "lng": lng,
+                "distance_km": round(float(distance), 3),
+            }
+            for pid, name, address, city, country, lat, lng, distance in pharmacy_rows
+        }
+        inventory_rows = (await db.execute(
+            select(
+                PharmacyInventory.package_id, PharmacyInventory.pharmacy_id,
+                PharmacyInventory.stock_quantity, PharmacyInventory.price_cents,
+            )
+            .join(nearby, nearby.c.pharmacy_id == PharmacyInventory.pharmacy_id)
+            .where(PharmacyInventory.package_id.in_(self.package_ids))
+        )).all()
+        self.state = {(pkg, ph): (stock, price) for pkg, ph, stock, price in inventory_rows}
+
+    def delta(self, change: InventoryChange) -> Optional[Dict[str, Any]]:
+        """Message for a change to a nearby row, or None when nothing the page shows moved."""
+        if self.loading:
+            self.pending.append(change)
+            return None
+        pharmacy = self.pharmacies.get(change.pharmacy_id)
+        if pharmacy is None:
+            return None
+        key = (change.package_id, change.pharmacy_id)
+        old_stock, old_price = self.state.get(key, (None, None))
+        was_in_stock = old_stock is not None and old_stock > 0
+        if change.stock_quantity is None and change.price_cents is None:
+            self.state.pop(key, None)
+        else:
+            self.state[key] = (change.stock_quantity, change.price_cents)
+
+        if change.in_stock and not was_in_stock:
+            kind = "in_stock"
+        elif was_in_stock and not change.in_stock:
+            kind = "out_of_stock"
+        elif change.in_stock and change.price_cents != old_price:
+            kind = "price"
+        elif change.in_stock and change.stock_quantity != old_stock:
+            kind = "stock"
+        else:
+            return None
+
+        message = {
+            "type": kind,
+            "package_id": change.package_id,
+            "pharmacy_id": change.pharmacy_id,
+            "stock_quantity": change.stock_quantity or 0,
+            "price_cents": change.price_cents,
+        }
+        if kind == "in_stock":
+            # enough to add a PharmacyLocationInfo row the page has not seen
+            message.update(pharmacy)
+        else:
+            message["distance_km"] = pharmacy["distance_km"]
+        return message
+
+    def push(self, message: Dict[str, Any]) -> None:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # a client this far behind gets a resync instead of a backlog
+            self.overflowed = True
+
+
+class LiveStock:
+    """
+    Fans the per-worker inventory change feed out to open product pages.
+    Subscriptions are indexed by package id, so a change only touches the
+    pages showing that package. The ids a subscription is indexed under are
+    kept here, not read back from the subscription, so remove() cleans up
+    exactly what was registered even if package_ids was reloaded since.
+    """
+
+    def __init__(self):
+        self._by_package: DefaultDict[str, Set[LiveSubscription]] = defaultdict(set)
+        self._indexed: Dict[LiveSubscription, FrozenSet[str]] = {}
+
+    @property
+    def subscriptions(self) -> Set[LiveSubscription]:
+        return set(self._indexed)
+
+    def _unindex(self, sub: LiveSubscription, package_ids: Iterable[str]) -> None:
+        for package_id in package_ids:
+            subs = self._by_package.get(package_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._by_package[package_id]
+
+    def add(self, sub: LiveSubscription) -> None:
+        self._indexed[sub] = frozenset(sub.package_ids)
+        for package_id in sub.package_ids:
+            self._by_package[package_id].add(sub)
+
+    def reindex(self, sub: LiveSubscription) -> None:
+        """Move a registered subscription to its reloaded package ids without a moment unregistered."""
+        previous = self._indexed.get(sub)
+        if previous is None:
+            return  # removed meanwhile; do not bring it back
+        current = frozenset(sub.package_ids)
+        self._unindex(sub, previous - current)
+        for package_id in current - previous:
+            self._by_package[package_id].add(sub)
+        self._indexed[sub] = current
+
+    def remove(self, sub: LiveSubscription) -> None:
+        self._unindex(sub, self._indexed.pop(sub, ()))
+
+    async def on_inventory_changes(self, changes: List[InventoryChange], reset: bool) -> None:
+        if reset:
+            for sub in self._indexed:
+                sub.push(RESYNC)
+            return
+        batches: DefaultDict[LiveSubscription, List[Dict[str, Any]]] = defaultdict(list)
+        for change in changes:
+            for sub in self._by_package.get(change.package_id, ()):
+                message = sub.delta(change)
+                if message is not None:
+                    batches[sub].append(message)
+        for sub, messages in batches.items():
+            sub.push({"type": "deltas", "changes": messages})
+
+
+live_stock = LiveStock()
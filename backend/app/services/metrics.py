@@ -0,0 +1,348 @@
+# app/services/metrics.py
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, DefaultDict, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..core.config import settings
+from ..core.db import WAIT_BUCKETS, pool_stats, read_engine
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _histogram(bounds: Sequence[float]) -> List[float]:
+    # per-bucket counts (last one is +Inf) followed by the sum
+    return [0] * (len(bounds) + 1) + [0.0]
+
+
+def _observe(hist: List[float], bounds: Sequence[float], value: float) -> None:
+    hist[bisect_left(bounds, value)] += 1
+    hist[-1] += value
+
+
+class Metrics:
+    """
+    Request counters and histograms of this worker. Only touched from the
+    event loop thread, so plain dicts and lists need no locking. Histograms
+    are flat lists of per-bucket counts plus the sum, which keeps snapshots
+    cheap to write and to add up across workers.
+    """
+
+    def __init__(self):
+        self.requests: DefaultDict[Tuple[str, str, int], int] = defaultdict(int)
+        self.latency: Dict[Tuple[str, str], List[float]] = {}
+        self.sizes: Dict[Tuple[str, str], List[float]] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status: int, seconds: float, size: int) -> None:
+        self.requests[method, route, status] += 1
+        key = (method, route)
+        hist = self.latency.get(key)
+        if hist is None:
+            hist = self.latency[key] = _histogram(LATENCY_BUCKETS)
+            self.sizes[key] = _histogram(SIZE_BUCKETS)
+        _observe(hist, LATENCY_BUCKETS, seconds)
+        _observe(self.sizes[key], SIZE_BUCKETS, size)
+
+    def snapshot(self) -> Dict[str, Any]:
+        pools = {"primary": pool_stats()}
+        if read_engine is not None:
+            pools["replica"] = pool_stats(read_engine)
+        return {
+            "requests": [[m, r, s, n] for (m, r, s), n in self.requests.items()],
+            "latency": [[m, r, h] for (m, r), h in self.latency.items()],
+            "sizes": [[m, r, h] for (m, r), h in self.sizes.items()],
+            "in_flight": self.in_flight,
+            "pools": pools,
+        }
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding `metrics`, labelled by route template (/products/{product_id}/packages)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_counting(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        metrics.in_flight += 1
+        try:
+            await self.app(scope, receive, send_counting)
+        finally:
+            metrics.in_flight -= 1
+            # the router stores the matched route in the scope; unmatched
+            # paths share one label so scanners cannot blow up cardinality
+            route = scope.get("route")
+            metrics.observe(
+                scope["method"], getattr(route, "path", "unmatched"), status,
+                time.perf_counter() - started, size,
+            )
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+    return "{" + body + "}" if body else ""
+
+
+def _render_histogram(lines: List[str], name: str, bounds: Sequence[float],
+                      series: Dict[Tuple, List[float]], label_names: Sequence[str]) -> None:
+    for key, hist in sorted(series.items()):
+        labels = dict(zip(label_names, key))
+        cumulative = 0
+        for bound, count in zip([*bounds, "+Inf"], hist[:-1]):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(**labels)} {hist[-1]}")
+        lines.append(f"{name}_count{_labels(**labels)} {cumulative}")
+
+
+def _add(into: Dict[Tuple, List[float]], key: Tuple, hist: Sequence[float]) -> None:
+    current = into.get(key)
+    into[key] = list(hist) if current is None else [a + b for a, b in zip(current, hist)]
+
+
+def render(snapshots: Iterable[Dict[str, Any]]) -> str:
+    """Prometheus text exposition of the sum of the given worker snapshots."""
+    requests: DefaultDict[Tuple, int] = defaultdict(int)
+    latency: Dict[Tuple, List[float]] = {}
+    sizes: Dict[Tuple, List[float]] = {}
+    pool_gauges: DefaultDict[Tuple[str, str], float] = defaultdict(float)
+    pool_waits: Dict[Tuple, List[float]] = {}
+    in_flight = workers = 0
+    for snap in snapshots:
+        workers += not snap.get("retired")
+        in_flight += snap["in_flight"]
+        for m, r, s, n in snap["requests"]:
+            requests[m, r, s] += n
+        for m, r, h in snap["latency"]:
+            _add(latency, (m, r), h)
+        for m, r, h in snap["sizes"]:
+            _add(sizes, (m, r), h)
+        for pool, stats in snap["pools"].items():
+            for field in ("size", "checked_out", "overflow", "checkouts", "timeouts"):
+                pool_gauges[pool, field] += stats[field]
+            _add(pool_waits, (pool,), [*stats["wait_buckets"].values(), stats["wait_seconds_total"]])
+
+    lines = [
+        "# HELP http_requests_total Requests by method, route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (m, r, s), n in sorted(requests.items()):
+        lines.append(f"http_requests_total{_labels(method=m, route=r, status=s)} {n}")
+    lines += ["# HELP http_request_duration_seconds Request latency.",
+              "# TYPE http_request_duration_seconds histogram"]
+    _render_histogram(lines, "http_request_duration_seconds", LATENCY_BUCKETS, latency, ("method", "route"))
+    lines += ["# HELP http_response_size_bytes Response body size.",
+              "# TYPE http_response_size_bytes histogram"]
+    _render_histogram(lines, "http_response_size_bytes", SIZE_BUCKETS, sizes, ("method", "route"))
+    lines += ["# HELP http_requests_in_flight Requests being handled.",
+              "# TYPE http_requests_in_flight gauge",
+              f"http_requests_in_flight {in_flight}",
+              "# HELP app_workers Worker processes included in these metrics.",
+              "# TYPE app_workers gauge",
+              f"app_workers {workers}"]
+    gauges = (("size", "db_pool_size", "gauge", "Connections kept open."),
+              ("checked_out", "db_pool_checked_out", "gauge", "Connections in use."),
+              ("overflow", "db_pool_overflow", "gauge", "Connections above pool size (negative while below)."),
+              ("checkouts", "db_pool_checkouts_total", "counter", "Connections handed out."),
+              ("timeouts", "db_pool_checkout_timeouts_total", "counter", "Checkouts that gave up waiting."))
+    for field, name, kind, doc in gauges:
+        lines += [f"# HELP {name} {doc}", f"# TYPE {name} {kind}"]
+        for (pool, f), value in sorted(pool_gauges.items()):
+            if f == field:
+                lines.append(f"{name}{_labels(pool=pool)} {value:g}")
+    lines += ["# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection.",
+              "# TYPE db_pool_checkout_wait_seconds histogram"]
+    _render_histogram(lines, "db_pool_checkout_wait_seconds", WAIT_BUCKETS, pool_waits, ("pool",))
+    return "\n".join(lines) + "\n"
+
+
+def retire(retired: Optional[Dict[str, Any]], snap: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    `retired` plus the counters and histograms of `snap`, a worker that is
+    gone. Gauges are left out: they described the worker while it ran.
+    """
+    requests: DefaultDict[Tuple, int] = defaultdict(int)
+    latency: Dict[Tuple, List[float]] = {}
+    sizes: Dict[Tuple, List[float]] = {}
+    pools: Dict[str, Dict[str, Any]] = {}
+    for s in filter(None, (retired, snap)):
+        for m, r, st, n in s["requests"]:
+            requests[m, r, st] += n
+        for m, r, h in s["latency"]:
+            _add(latency, (m, r), h)
+        for m, r, h in s["sizes"]:
+            _add(sizes, (m, r), h)
+        for pool, stats in s["pools"].items():
+            into = pools.setdefault(pool, {"size": 0, "checked_out": 0, "overflow": 0, "checkouts": 0, "timeouts": 0,
+                                           "wait_seconds_total": 0.0, "wait_buckets": {}})
+            for field in ("checkouts", "timeouts", "wait_seconds_total"):
+                into[field] += stats[field]
+            for bound, count in stats["wait_buckets"].items():
+                into["wait_buckets"][bound] = into["wait_buckets"].get(bound, 0) + count
+    return {
+        "retired": True,
+        "requests": [[m, r, st, n] for (m, r, st), n in requests.items()],
+        "latency": [[m, r, h] for (m, r), h in latency.items()],
+        "sizes": [[m, r, h] for (m, r), h in sizes.items()],
+        "in_flight": 0,
+        "pools": pools,
+    }
+
+
+class MetricsExporter:
+    """
+    Aggregation across uvicorn/gunicorn workers. With METRICS_DIR set, every
+    worker publishes its snapshot to <dir>/<pid>.json (written aside and
+    renamed, so readers never see half a file) every flush_seconds and
+    whenever it serves /metrics; the scrape then adds up all files younger
+    than stale_seconds. Files of workers that are gone age out; before
+    they are removed their counters are added to <dir>/retired.json, which
+    every scrape includes, so totals do not drop when a worker restarts.
+    Folding and reading happen under a flock on <dir>/.lock, so a file is
+    never counted twice or not at all.
+    """
+
+    def __init__(self, directory: Optional[str], flush_seconds: float, stale_seconds: float):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.stale_seconds = stale_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def _path(self) -> str:
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def _retired_path(self) -> str:
+        return os.path.join(self.directory, "retired.json")
+
+    @staticmethod
+    def _dump(path: str, snap: Dict[str, Any]) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(snap, f)
+        os.replace(tmp, path)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+
+    def _write(self, snap: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._dump(self._path(), snap)
+
+    def _load_retired(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._retired_path()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _read_all(self) -> List[Dict[str, Any]]:
+        snaps, stale = [], []
+        cutoff = time.time() - self.stale_seconds
+        with self._locked():
+            retired = self._load_retired()
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                if path == self._retired_path():
+                    continue
+                try:
+                    mtime = os.path.getmtime(path)
+                    with open(path) as f:
+                        snap = json.load(f)
+                except (OSError, ValueError):
+                    continue  # replaced or removed while we looked
+                if mtime < cutoff:
+                    stale.append(path)
+                    retired = retire(retired, snap)
+                else:
+                    snaps.append(snap)
+            if stale:
+                self._dump(self._retired_path(), retired)
+                for path in stale:
+                    os.unlink(path)
+        return snaps + [retired] if retired else snaps
+
+    def _retire_self(self) -> None:
+        with self._locked():
+            self._dump(self._retired_path(), retire(self._load_retired(), metrics.snapshot()))
+            try:
+                os.unlink(self._path())
+            except FileNotFoundError:
+                pass  # never published
+
+    async def collect(self) -> str:
+        snap = metrics.snapshot()
+        if not self.directory:
+            return render([snap])
+
+        def publish_and_read():
+            self._write(snap)
+            return self._read_all()
+
+        return render(await asyncio.to_thread(publish_and_read))
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await asyncio.to_thread(self._write, metrics.snapshot())
+            except OSError:
+                log.warning("could not publish metrics snapshot", exc_info=True)
+
+    async def start(self) -> None:
+        if self.directory:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.directory:
+            try:
+                await asyncio.to_thread(self._retire_self)
+            except OSError:
+                log.warning("could not retire metrics snapshot", exc_info=True)
+
+
+metrics_exporter = MetricsExporter(settings.METRICS_DIR, settings.METRICS_FLUSH_SECONDS, settings.METRICS_STALE_SECONDS)
@@ -0,0 +1,146 @@
+# app/services/query_stats.py
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+
+from ..core.config import settings
+from ..core.db import engine, read_engine
+
+log = logging.getLogger(__name__)
+
+
+class QueryStats:
+    """Statements executed on behalf of one request (or one `collect_queries` block)."""
+
+    __slots__ = ("count", "seconds", "slowest_seconds", "slowest_statement")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.count += 1
+        self.seconds += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+
+    def server_timing(self) -> str:
+        value = f'db;dur={self.seconds * 1000:.1f};desc="{self.count} queries"'
+        if self.count:
+            value += f", db-slowest;dur={self.slowest_seconds * 1000:.1f}"
+        return value
+
+
+# Set per request by QueryStatsMiddleware when sampled. SQLAlchemy runs the
+# cursor calls in a greenlet that shares the awaiting task's context, so the
+# engine events below see the request's value.
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and _current.get() is not None:
+        context._query_stats_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_query_stats_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument(target) -> None:
+    for name, fn in (("before_cursor_execute", _before_cursor_execute),
+                     ("after_cursor_execute", _after_cursor_execute)):
+        if not event.contains(target.sync_engine, name, fn):
+            event.listen(target.sync_engine, name, fn)
+
+
+for _target in (engine, read_engine):
+    if _target is not None:
+        instrument(_target)
+
+
+@contextmanager
+def collect_queries() -> Iterator[QueryStats]:
+    """Count the statements run inside the block (in this task and the tasks it awaits)."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def max_queries(limit: int) -> Iterator[QueryStats]:
+    """
+    N+1 guard for tests (the `max_queries` fixture in tests/conftest.py):
+    fails when the block runs more than `limit` statements.
+
+        with max_queries(1):
+            await client.get(f"/products/{pid}/packages")
+
+    Needs the app to run in the caller's task (the `client` fixture:
+    httpx.AsyncClient with ASGITransport); with the threaded TestClient read
+    the Server-Timing header instead.
+    """
+    with collect_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise AssertionError(
+            f"{stats.count} queries, expected at most {limit}; slowest: {stats.slowest_statement}"
+        )
+
+
+class QueryStatsMiddleware:
+    """
+    ASGI middleware: for a sampled share of requests, counts queries and DB
+    time and reports them in a Server-Timing header. Requests that run many
+    statements are logged with the slowest one.
+    """
+
+    def __init__(self, app, sample_rate: float = settings.QUERY_STATS_SAMPLE_RATE,
+                 warn_queries: int = settings.QUERY_STATS_WARN_QUERIES):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.warn_queries = warn_queries
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (
+            _current.get() is None and (self.sample_rate <= 0 or random.random() >= self.sample_rate)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        # reuse the caller's collector (max_queries in a test) when there is one
+        stats = _current.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = _current.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"server-timing", stats.server_timing().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            if token is not None:
+                _current.reset(token)
+            if stats.count >= self.warn_queries:
+                log.warning(
+                    "%s %s ran %d queries (%.1f ms); slowest %.1f ms: %.300s",
+                    scope["method"], scope["path"], stats.count, stats.seconds * 1000,
+                    stats.slowest_seconds * 1000, stats.slowest_statement,
+                )
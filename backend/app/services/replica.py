@@ -0,0 +1,134 @@
+# app/services/replica.py
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from fastapi import Request, Response
+from sqlalchemy import text
+
+from ..core.config import settings
+from ..core.db import ReadSessionLocal, SessionLocal, engine, read_engine
+
+log = logging.getLogger(__name__)
+
+# Set on responses to writes (bookings) with the commit's wall-clock time;
+# clients echo it on their next reads, which stay on the primary until the
+# replica has replayed past that moment. Any other value always reads the
+# primary.
+READ_YOUR_WRITES_HEADER = "x-read-your-writes"
+
+
+class ReplicaMonitor:
+    """
+    Tracks how far the read replica is behind the primary.
+
+    Every poll reads the primary's current WAL position and then the
+    replica's replay position. If the replica has replayed up to it, every
+    commit made before the poll is visible there, and `synced_at` moves to
+    the poll time. Lag is the age of that point, so an idle primary does not
+    look like a lagging replica. The replica is skipped while the lag is
+    over max_lag_seconds or a poll fails.
+    """
+
+    def __init__(self, poll_seconds: float, max_lag_seconds: float):
+        self.poll_seconds = poll_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.synced_at = float("-inf")  # monotonic
+        self.primary_reads = 0
+        self.replica_reads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lag_seconds(self) -> float:
+        return time.monotonic() - self.synced_at
+
+    @property
+    def usable(self) -> bool:
+        return read_engine is not None and self.lag_seconds <= self.max_lag_seconds
+
+    def caught_up_since(self, moment: float) -> bool:
+        """Whether the replica is known to show every commit made before `moment` (monotonic)."""
+        return self.synced_at >= moment
+
+    async def poll(self) -> None:
+        polled_at = time.monotonic()
+        async with engine.connect() as conn:
+            primary_lsn = (await conn.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar()
+        async with read_engine.connect() as conn:
+            # NULL when the "replica" is not in recovery (a standalone copy in dev)
+            behind = (await conn.execute(
+                text("SELECT pg_wal_lsn_diff(CAST(:lsn AS pg_lsn), pg_last_wal_replay_lsn())"),
+                {"lsn": primary_lsn},
+            )).scalar()
+        if behind is None or behind <= 0:
+            self.synced_at = polled_at
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("replica lag poll failed; reads stay on the primary until it recovers", exc_info=True)
+            await asyncio.sleep(self.poll_seconds)
+
+    async def start(self) -> None:
+        if read_engine is None:
+            return
+        try:
+            await self.poll()
+        except Exception:
+            log.warning("replica not reachable at startup", exc_info=True)
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+replica_monitor = ReplicaMonitor(settings.REPLICA_POLL_SECONDS, settings.REPLICA_MAX_LAG_SECONDS)
+
+
+def mark_write(response: Response) -> None:
+    """Have the client's next reads see the write just committed (see READ_YOUR_WRITES_HEADER)."""
+    response.headers[READ_YOUR_WRITES_HEADER] = f"{time.time():.3f}"
+
+
+def _reads_own_write(request: Request) -> bool:
+    value = request.headers.get(READ_YOUR_WRITES_HEADER)
+    if not value:
+        return False
+    try:
+        written_at = float(value)
+    except ValueError:
+        return True
+    # wall clock (shared by the workers) to this process's monotonic clock
+    return not replica_monitor.caught_up_since(time.monotonic() - (time.time() - written_at))
+
+
+async def get_read_db(request: Request):
+    """
+    Session for read-only routes: the replica when one is configured and
+    fresh enough, the primary otherwise or while the replica may not show a
+    write the client made. Sessions on the replica carry info["replica"] = True.
+    """
+    if replica_monitor.usable and not _reads_own_write(request):
+        replica_monitor.replica_reads += 1
+        factory = ReadSessionLocal
+    else:
+        if read_engine is not None:
+            replica_monitor.primary_reads += 1
+        factory = SessionLocal
+    async with factory() as session:
+        yield session
+
+
+def on_replica(db) -> bool:
+    return bool(db.info.get("replica"))
@@ -0,0 +1,213 @@
+# app/services/reservations.py
+import asyncio
+import datetime
+import logging
+import uuid
+from typing import Optional, Tuple
+
+from sqlalchemy import func, insert, literal, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import Booking, Package, PharmacyInventory
+
+log = logging.getLogger(__name__)
+
+# pg_try_advisory_xact_lock key: one expiry sweep at a time across all workers
+SWEEP_LOCK_KEY = 0x5EB00C
+
+
+class InsufficientStock(Exception):
+    """The pharmacy does not have qty of the package (or does not list it with a price)."""
+
+
+def _hold_stmt(booking_id: str, user_uid: str, pharmacy_id: str, package_id: str, qty: int, minutes: int):
+    # Take the stock and write the booking in one statement. The conditional
+    # UPDATE row-locks the inventory row; a concurrent hold on the same row
+    # waits for that lock and then re-checks stock_quantity >= qty against the
+    # committed value, so two holds can never both take the last unit. Each
+    # hold locks exactly one inventory row, so holds cannot deadlock each other.
+    taken = (
+        update(PharmacyInventory)
+        .where(
+            PharmacyInventory.pharmacy_id == pharmacy_id,
+            PharmacyInventory.package_id == package_id,
+            PharmacyInventory.stock_quantity >= qty,
+            PharmacyInventory.price_cents.isnot(None),
+        )
+        .values(stock_quantity=PharmacyInventory.stock_quantity - qty)
+        .returning(PharmacyInventory.pharmacy_id, PharmacyInventory.package_id, PharmacyInventory.price_cents)
+        .cte("taken")
+    )
+    now = func.now()
+    return (
+        insert(Booking)
+        .from_select(
+            ["id", "user_uid", "pharmacy_id", "product_id", "package_id", "qty",
+             "price_cents_at_booking", "status", "expires_at", "created_at"],
+            select(
+                literal(booking_id), literal(user_uid), taken.c.pharmacy_id, Package.product_id,
+                taken.c.package_id, literal(qty), taken.c.price_cents, literal("held"),
+                now + datetime.timedelta(minutes=minutes), now,
+            ).join(Package, Package.id == taken.c.package_id),
+        )
+        .returning(Booking)
+    )
+
+
+async def hold(
+    db: AsyncSession, user_uid: str, pharmacy_id: str, package_id: str, qty: int,
+    minutes: Optional[int] = None,
+) -> Booking:
+    """Set qty units aside for minutes (RESERVATION_MINUTES by default) and return the held booking."""
+    stmt = _hold_stmt(
+        str(uuid.uuid4()), user_uid, pharmacy_id, package_id, qty,
+        settings.RESERVATION_MINUTES if minutes is None else minutes,
+    )
+    booking = (await db.execute(stmt)).scalar_one_or_none()
+    await db.commit()
+    if booking is None:
+        raise InsufficientStock(f"{pharmacy_id}/{package_id}: fewer than {qty} in stock")
+    return booking
+
+
+async def confirm(db: AsyncSession, booking_id: str, user_uid: str) -> Optional[Booking]:
+    """Turn a live hold into a confirmed booking; None when it is not the user's, not held or already expired."""
+    booking = (await db.execute(
+        update(Booking)
+        .where(
+            Booking.id == booking_id,
+            Booking.user_uid == user_uid,
+            Booking.status == "held",
+            Booking.expires_at > func.now(),
+        )
+        .values(status="confirmed", updated_at=func.now())
+        .returning(Booking)
+    )).scalar_one_or_none()
+    await db.commit()
+    return booking
+
+
+def _release_stmt(released):
+    """
+    Give the qty of the `released` booking rows back to inventory, summed per
+    pharmacy/package so each inventory row is updated once. Selects
+    (bookings released, units restocked); data-modifying CTEs always run to
+    completion, so bookings are counted even if their inventory row is gone.
+    """
+    totals = (
+        select(released.c.pharmacy_id, released.c.package_id, func.sum(released.c.qty).label("qty"))
+        .group_by(released.c.pharmacy_id, released.c.package_id)
+        .cte("totals")
+    )
+    restocked = (
+        update(PharmacyInventory)
+        .where(
+            PharmacyInventory.pharmacy_id == totals.c.pharmacy_id,
+            PharmacyInventory.package_id == totals.c.package_id,
+        )
+        .values(stock_quantity=func.coalesce(PharmacyInventory.stock_quantity, 0) + totals.c.qty)
+        .returning(totals.c.qty)
+        .cte("restocked")
+    )
+    return select(
+        select(func.count()).select_from(released).scalar_subquery(),
+        select(func.coalesce(func.sum(restocked.c.qty), 0)).scalar_subquery(),
+    )
+
+
+async def cancel(db: AsyncSession, booking_id: str, user_uid: str) -> bool:
+    """Cancel a live hold and return its stock; False when there was no such hold."""
+    released = (
+        update(Booking)
+        .where(Booking.id == booking_id, Booking.user_uid == user_uid, Booking.status == "held")
+        .values(status="cancelled", updated_at=func.now())
+        .returning(Booking.pharmacy_id, Booking.package_id, Booking.qty)
+        .cte("released")
+    )
+    bookings, _units = (await db.execute(_release_stmt(released))).one()
+    await db.commit()
+    return bookings > 0
+
+
+async def sweep_expired(db: AsyncSession, batch_size: int) -> Optional[Tuple[int, int]]:
+    """
+    Expire up to batch_size overdue holds and return their stock, in one
+    transaction. Returns (bookings expired, units restocked), or None when
+    another worker is sweeping.
+    """
+    # Concurrent sweeps would lock inventory rows in arbitrary order against
+    # each other, so only one runs at a time; SKIP LOCKED leaves holds that a
+    # user is cancelling or confirming right now for the next round.
+    if not (await db.execute(select(func.pg_try_advisory_xact_lock(SWEEP_LOCK_KEY)))).scalar():
+        await db.rollback()
+        return None
+    due = (
+        select(Booking.id)
+        .where(Booking.status == "held", Booking.expires_at <= func.now())
+        .order_by(Booking.expires_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .cte("due")
+    )
+    released = (
+        update(Booking)
+        .where(Booking.id == due.c.id)
+        .values(status="expired", updated_at=func.now())
+        .returning(Booking.pharmacy_id, Booking.package_id, Booking.qty)
+        .cte("released")
+    )
+    bookings, units = (await db.execute(_release_stmt(released))).one()
+    await db.commit()
+    return int(bookings), int(units)
+
+
+class ReservationSweeper:
+    """Background task expiring overdue holds every interval_seconds, batch by batch."""
+
+    def __init__(self, interval_seconds: float, batch_size: int):
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self.expired = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Sweep until a batch comes back short; the number of holds expired."""
+        total = 0
+        while True:
+            async with SessionLocal() as db:
+                result = await sweep_expired(db, self.batch_size)
+            if result is None:
+                return total
+            bookings, units = result
+            total += bookings
+            if bookings:
+                log.info("expired %d holds, %d units back in stock", bookings, units)
+            if bookings < self.batch_size:
+                return total
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                self.expired += await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                log.warning("reservation sweep failed", exc_info=True)
+            await asyncio.sleep(self.interval_seconds)
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+reservation_sweeper = ReservationSweeper(settings.RESERVATION_SWEEP_SECONDS, settings.RESERVATION_SWEEP_BATCH)
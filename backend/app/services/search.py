@@ -0,0 +1,158 @@
+# app/services/search.py
+import logging
+import re
+import unicodedata
+from typing import FrozenSet, Optional
+
+from sqlalchemy import func, literal, select, union_all
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import Brand, Product, ProductSearchDoc, Translation
+from .cache import TTLCache
+from .catalog_version import catalog_versions
+from .translations import language_chain, translation_stmt
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DOC_LANGUAGE = "en"  # always present in product_search_docs
+
+# keyed by (folded q, language, limit, mode, catalog version)
+search_cache = TTLCache(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL_SECONDS)
+
+
+async def invalidate_search_cache(version: int) -> None:
+    """catalog_versions listener; old keys can no longer match anyway, this frees them."""
+    search_cache.clear()
+
+
+def fold(text: str) -> str:
+    """Lowercase, strip accents and collapse whitespace ("Ibuprofén  400" -> "ibuprofen 400")."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return " ".join(stripped.casefold().split())
+
+
+def _prefix_tsquery(folded: str) -> str:
+    """Prefix tsquery from word characters only, e.g. "ibu 400" -> "ibu:* & 400:*"."""
+    return " & ".join(f"{word}:*" for word in re.findall(r"\w+", folded))
+
+
+def _similarity(column, q: str):
+    """Best of whole-string and word similarity (word_similarity favours prefixes)."""
+    return func.greatest(func.similarity(column, q), func.word_similarity(q, column))
+
+
+def _trgm_match(column, q: str):
+    """`col % q OR q <% col` - both operators are served by the gin_trgm_ops indexes."""
+    return column.op("%")(q) | literal(q).op("<%")(column)
+
+
+def trigram_search_stmt(q: str, language: str, limit: int):
+    """
+    Ranked pg_trgm product search.
+
+    Each indexed column is searched on its own (one index scan each), the
+    candidate product ids are unioned and ranked by their best score.
+    Thresholds come from pg_trgm.similarity_threshold /
+    pg_trgm.word_similarity_threshold, which the engine sets per connection.
+    """
+    per_branch = settings.SEARCH_CANDIDATE_LIMIT
+
+    def branch(product_id_col, column, *where):
+        score = _similarity(column, q)
+        return (
+            select(product_id_col.label("product_id"), score.label("score"))
+            .where(_trgm_match(column, q), *where)
+            .order_by(score.desc())
+            .limit(per_branch)
+        )
+
+    candidates = union_all(
+        branch(Product.id, Product.inn_name),
+        branch(Product.id, Product.atc_code),
+        branch(Brand.product_id, Brand.brand_name),
+        branch(Translation.product_id, Translation.translated_name, Translation.language_code == language),
+    ).subquery("candidates")
+
+    ranked = (
+        select(candidates.c.product_id, func.max(candidates.c.score).label("score"))
+        .group_by(candidates.c.product_id)
+        .subquery("ranked")
+    )
+
+    translated_name = translation_stmt(Product.id, language, Translation.translated_name).scalar_subquery()
+
+    return (
+        select(
+            Product.id,
+            Product.inn_name,
+            func.coalesce(translated_name, Product.inn_name).label("display_name"),
+            Product.form,
+            Product.strength,
+        )
+        .join(ranked, ranked.c.product_id == Product.id)
+        .order_by(ranked.c.score.desc(), Product.inn_name)
+        .limit(limit)
+    )
+
+
+class DocLanguages:
+    """
+    Languages product_search_docs has rows for (every translated language,
+    plus "en"), reloaded when the catalog version moves. The docs language of
+    a search is picked from it in Python, so the statement binds a single
+    language_code instead of probing the table for one.
+    """
+
+    def __init__(self):
+        self.languages: Optional[FrozenSet[str]] = None
+
+    def resolve(self, language: Optional[str]) -> str:
+        """First language of the chain that has docs; "en" until the languages are known."""
+        if self.languages is not None:
+            for lang in language_chain(language):
+                if lang in self.languages:
+                    return lang
+        return DEFAULT_DOC_LANGUAGE
+
+    async def refresh(self, version: Optional[int] = None) -> None:
+        async with SessionLocal() as db:
+            rows = await db.execute(select(Translation.language_code).distinct())
+            self.languages = frozenset(rows.scalars()) | {DEFAULT_DOC_LANGUAGE}
+
+    async def start(self) -> None:
+        catalog_versions.subscribe("catalog", self.refresh)
+        try:
+            await self.refresh()
+        except Exception:
+            log.warning("could not load search doc languages; docs search uses %r", DEFAULT_DOC_LANGUAGE, exc_info=True)
+
+
+doc_languages = DocLanguages()
+
+
+def docs_search_stmt(q: str, language: str, limit: int):
+    """
+    Ranked search over product_search_docs: one table, one row per product for
+    the language, matched by trigram similarity or tsvector word prefixes.
+    Languages without docs fall back along language_chain, then to the "en"
+    rows; the display name is resolved along the chain as well.
+    """
+    folded = fold(q)
+    doc = ProductSearchDoc
+    score = _similarity(doc.search_text, folded)
+    match = _trgm_match(doc.search_text, folded)
+    tsquery = _prefix_tsquery(folded)
+    if tsquery:
+        match = match | doc.search_tsv.op("@@")(func.to_tsquery("simple", tsquery))
+
+    # the docs' display_name only knows translation -> en -> inn_name
+    translated_name = translation_stmt(doc.product_id, language, Translation.translated_name).scalar_subquery()
+
+    return (
+        select(doc.product_id, doc.inn_name, func.coalesce(translated_name, doc.inn_name), doc.form, doc.strength)
+        .where(doc.language_code == doc_languages.resolve(language), match)
+        .order_by(score.desc(), doc.inn_name)
+        .limit(limit)
+    )
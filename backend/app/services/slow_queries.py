@@ -0,0 +1,181 @@
+# app/services/slow_queries.py
+import asyncio
+import datetime
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+from sqlalchemy import event
+
+from ..core.config import settings
+from ..core.db import engine, read_engine
+
+log = logging.getLogger(__name__)
+
+# only these can be EXPLAINed without side effects (EXPLAIN without ANALYZE runs nothing)
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def _jsonable(value: Any, depth: int = 0) -> Any:
+    """Bound parameter in a form that survives json.dumps; long values and lists are cut."""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        return value if len(value) <= 200 else value[:200] + "..."
+    if isinstance(value, (list, tuple)) and depth == 0:
+        items = [_jsonable(v, 1) for v in value[:50]]
+        return items + [f"... {len(value) - 50} more"] if len(value) > 50 else items
+    if isinstance(value, (datetime.date, datetime.datetime, datetime.timedelta)):
+        return str(value)
+    return repr(value)[:200]
+
+
+class SlowQueryLog:
+    """
+    Opt-in recorder of statements slower than threshold_ms.
+
+    Cursor events stamp each execution; slow ones go into a bounded ring
+    buffer with their bound parameters (readable through /admin/slow-queries)
+    and are queued for EXPLAIN (FORMAT JSON). A background task runs the
+    EXPLAIN on its own connection to the database that ran the statement, so
+    plans never take a pooled connection. EXPLAINs are limited to
+    explains_per_minute, a statement text is explained again only after
+    explain_cooldown_seconds, and a full queue drops plans rather than
+    piling up work while the database is already slow.
+    """
+
+    def __init__(self, threshold_ms: float, buffer_size: int, explains_per_minute: float,
+                 explain_cooldown_seconds: float = 600.0, queue_size: int = 20):
+        self.threshold_seconds = threshold_ms / 1000
+        self.explains_per_minute = explains_per_minute
+        self.explain_cooldown_seconds = explain_cooldown_seconds
+        self.records: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self.recorded = 0
+        self.explained = 0
+        self.rate_limited = 0
+        self._tokens = explains_per_minute
+        self._refilled_at = time.monotonic()
+        self._plans: Dict[str, Tuple[float, Any]] = {}  # statement -> (explained at, plan)
+        self._queue: "asyncio.Queue[Tuple[str, str, Sequence[Any], Dict[str, Any]]]" = asyncio.Queue(maxsize=queue_size)
+        self._conns: Dict[str, asyncpg.Connection] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_seconds > 0
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._slow_query_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_slow_query_started", None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        if seconds >= self.threshold_seconds:
+            dsn = conn.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+            self.record(statement, parameters, seconds, dsn, executemany)
+
+    def instrument(self, target) -> None:
+        event.listen(target.sync_engine, "before_cursor_execute", self._before)
+        event.listen(target.sync_engine, "after_cursor_execute", self._after)
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self.explains_per_minute,
+                           self._tokens + (now - self._refilled_at) * self.explains_per_minute / 60)
+        self._refilled_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return True
+        return False
+
+    def record(self, statement: str, parameters: Any, seconds: float, dsn: str, executemany: bool = False) -> None:
+        self.recorded += 1
+        entry: Dict[str, Any] = {
+            "recorded_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "ms": round(seconds * 1000, 1),
+            "statement": statement,
+            "parameters": _jsonable(list(parameters or ()) if not executemany else f"{len(parameters)} rows"),
+            "database": dsn.rsplit("@", 1)[-1],  # host/db only, never the password
+            "plan": None,
+            "explain": "skipped",
+        }
+        self.records.append(entry)
+        if self._task is None or executemany or not statement.lstrip().upper().startswith(EXPLAINABLE):
+            return
+        cached = self._plans.get(statement)
+        if cached is not None and time.monotonic() - cached[0] < self.explain_cooldown_seconds:
+            entry["plan"], entry["explain"] = cached[1], "cached"
+            return
+        if not self._take_token():
+            self.rate_limited += 1
+            entry["explain"] = "rate limited"
+            return
+        try:
+            self._queue.put_nowait((dsn, statement, tuple(parameters or ()), entry))
+            entry["explain"] = "pending"
+        except asyncio.QueueFull:
+            self.rate_limited += 1
+            entry["explain"] = "queue full"
+
+    async def _explain(self, dsn: str, statement: str, parameters: Sequence[Any]) -> Any:
+        conn = self._conns.get(dsn)
+        if conn is None or conn.is_closed():
+            conn = self._conns[dsn] = await asyncpg.connect(dsn, statement_cache_size=0)
+        async with conn.transaction():
+            # SET LOCAL also works behind a transaction-pooling PgBouncer
+            await conn.execute("SET LOCAL statement_timeout = 5000")
+            plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {statement}", *parameters)
+        return json.loads(plan) if isinstance(plan, str) else plan
+
+    async def _worker(self) -> None:
+        while True:
+            dsn, statement, parameters, entry = await self._queue.get()
+            try:
+                plan = await self._explain(dsn, statement, parameters)
+                self._plans[statement] = (time.monotonic(), plan)
+                if len(self._plans) > 1000:
+                    self._plans.pop(next(iter(self._plans)))
+                entry["plan"], entry["explain"] = plan, "done"
+                self.explained += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                entry["explain"] = f"failed: {type(e).__name__}: {e}"[:300]
+                stale = self._conns.pop(dsn, None)
+                if stale is not None and not stale.is_closed():
+                    stale.terminate()
+
+    def recent(self, limit: int = 20, min_ms: float = 0.0) -> List[Dict[str, Any]]:
+        return [r for r in reversed(self.records) if r["ms"] >= min_ms][:limit]
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        for target in (engine, read_engine):
+            if target is not None:
+                self.instrument(target)
+        if self.explains_per_minute > 0:
+            self._task = asyncio.create_task(self._worker())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for conn in self._conns.values():
+            await conn.close()
+        self._conns = {}
+
+
+slow_queries = SlowQueryLog(
+    settings.SLOW_QUERY_MS, settings.SLOW_QUERY_BUFFER_SIZE, settings.SLOW_QUERY_EXPLAINS_PER_MINUTE,
+)
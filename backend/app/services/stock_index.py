@@ -0,0 +1,139 @@
+# app/services/stock_index.py
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from ..core.config import settings
+from ..core.db import SessionLocal
+from ..models import PharmacyInventory
+from .inventory_events import InventoryChange, inventory_events
+
+log = logging.getLogger(__name__)
+
+
+class StockBitmaps:
+    """
+    In-stock bitmaps.
+
+    Pharmacies get dense positions and each package keeps one int bitset of
+    the pharmacies that have it in stock, so "which pharmacies have all of
+    these packages" is an AND of one int per requested package. Built in
+    bulk, then patched per change from inventory events.
+    """
+
+    def __init__(self, rows: Sequence[Tuple[str, str]]):
+        positions: Dict[str, int] = {}
+        by_package: Dict[str, List[int]] = defaultdict(list)
+        for pharmacy_id, package_id in rows:
+            pos = positions.setdefault(pharmacy_id, len(positions))
+            by_package[package_id].append(pos)
+        self.pharmacy_ids: List[str] = list(positions)
+        self._positions = positions
+        # set bits in a bytearray and convert once; OR-ing into a growing int
+        # would copy it for every row
+        n_bytes = (len(self.pharmacy_ids) + 7) // 8
+        self._bitmaps: Dict[str, int] = {}
+        for package_id, members in by_package.items():
+            buf = bytearray(n_bytes)
+            for pos in members:
+                buf[pos >> 3] |= 1 << (pos & 7)
+            self._bitmaps[package_id] = int.from_bytes(buf, "little")
+
+    def __len__(self) -> int:
+        return len(self.pharmacy_ids)
+
+    def apply(self, changes: Iterable[InventoryChange]) -> None:
+        """Set or clear one bit per change (ints are immutable, so readers never see a half update)."""
+        for change in changes:
+            pos = self._positions.get(change.pharmacy_id)
+            if pos is None:
+                if not change.in_stock:
+                    continue
+                pos = self._positions[change.pharmacy_id] = len(self.pharmacy_ids)
+                self.pharmacy_ids.append(change.pharmacy_id)
+            bits = self._bitmaps.get(change.package_id, 0)
+            if change.in_stock:
+                bits |= 1 << pos
+            else:
+                bits &= ~(1 << pos)
+            self._bitmaps[change.package_id] = bits
+
+    def pharmacies_with_all(self, package_ids: Iterable[str]) -> FrozenSet[str]:
+        """Pharmacies that have every one of package_ids in stock."""
+        bits = -1
+        for package_id in set(package_ids):
+            bits &= self._bitmaps.get(package_id, 0)
+            if not bits:
+                return frozenset()
+        if bits == -1:
+            return frozenset()
+        # walk the set bits through the binary string (lowest bit first)
+        ids = self.pharmacy_ids
+        digits = bin(bits)[:1:-1]
+        result = []
+        pos = digits.find("1")
+        while pos != -1:
+            result.append(ids[pos])
+            pos = digits.find("1", pos + 1)
+        return frozenset(result)
+
+
+class PharmacyStock:
+    """
+    Holds the current StockBitmaps, patched from inventory events. They are
+    only trusted while the listener is connected; the reset dispatched on
+    reconnect rebuilds them. Writers pay nothing for this beyond the
+    inventory NOTIFY trigger.
+    """
+
+    def __init__(self):
+        self.bitmaps: Optional[StockBitmaps] = None
+        self._lock = asyncio.Lock()
+        self._backlog: List[InventoryChange] = []
+
+    @property
+    def ready(self) -> bool:
+        return self.bitmaps is not None and inventory_events.connected
+
+    async def rebuild(self) -> None:
+        async with self._lock:
+            async with SessionLocal() as db:
+                rows = (await db.execute(
+                    select(PharmacyInventory.pharmacy_id, PharmacyInventory.package_id)
+                    .where(PharmacyInventory.stock_quantity > 0)
+                )).all()
+            bitmaps = await asyncio.to_thread(StockBitmaps, rows)
+            # replay what arrived while building; setting a bit twice is harmless
+            bitmaps.apply(self._backlog)
+            self._backlog = []
+            self.bitmaps = bitmaps
+            log.info("stock bitmaps rebuilt: %d pharmacies, %d rows", len(bitmaps), len(rows))
+
+    async def on_inventory_changes(self, changes: List[InventoryChange], reset: bool) -> None:
+        if reset:
+            await self.rebuild()
+            return
+        if self._lock.locked():
+            self._backlog.extend(changes)
+        if self.bitmaps is not None:
+            self.bitmaps.apply(changes)
+
+    async def start(self) -> None:
+        inventory_events.subscribe(self.on_inventory_changes)
+        try:
+            await self.rebuild()
+        except Exception:
+            log.warning("stock bitmap build failed; must_have_all stays in SQL", exc_info=True)
+
+
+pharmacy_stock = PharmacyStock()
+
+
+def pharmacies_with_all(package_ids: Sequence[str]) -> Optional[FrozenSet[str]]:
+    """Pharmacies stocking every package, or None when the bitmaps are not available."""
+    if settings.STOCK_INDEX_ENABLED and pharmacy_stock.ready:
+        return pharmacy_stock.bitmaps.pharmacies_with_all(package_ids)
+    return None
@@ -0,0 +1,42 @@
+# app/services/translations.py
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from sqlalchemy import String, any_, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
+
+from ..core.config import settings
+from ..models import Translation
+
+# keyed by the raw ?language= value, so bounded; an evicted chain is cheap to rebuild
+@lru_cache(maxsize=64)
+def language_chain(language: Optional[str]) -> Tuple[str, ...]:
+    """
+    Languages to try for a product name, best first: the requested one, its
+    LANGUAGE_FALLBACKS entry, then the "*" entry ("sk" -> ("sk", "cs", "en")).
+    Products translated in none of them show their inn_name.
+    """
+    candidates = ([language] if language else []) + settings.LANGUAGE_FALLBACKS.get(language or "", [])
+    candidates += settings.LANGUAGE_FALLBACKS.get("*", [])
+    return tuple(dict.fromkeys(candidates))
+
+
+def translation_stmt(product_id, language: Optional[str], *columns):
+    """
+    SELECT of `columns` from the one translation row of product_id that
+    language_chain(language) prefers. Only the chain's languages are read,
+    through idx_translations_prod_lang; the chain is a single array
+    parameter, so every language shares one prepared statement.
+    """
+    chain = literal(list(language_chain(language)), ARRAY(String))
+    return (
+        select(*columns)
+        .where(
+            Translation.product_id == product_id,
+            Translation.language_code == any_(chain),
+            Translation.translated_name.isnot(None),
+        )
+        .order_by(func.array_position(chain, Translation.language_code))
+        .limit(1)
+        .correlate_except(Translation)  # the outer query may join translations itself
+    )
@@ -0,0 +1,159 @@
+# app/services/typeahead.py
+import asyncio
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from ..core.db import SessionLocal
+from ..models import Brand, Product, Translation
+from ..schemas.product import ProductSearchItem
+from .catalog_version import catalog_versions
+from .search import fold
+from .translations import language_chain
+
+log = logging.getLogger(__name__)
+
+# "*" holds the language-independent names and serves languages whose whole chain has no translations
+ANY_LANGUAGE = "*"
+
+
+def _word_suffixes(name: str) -> Iterable[str]:
+    """Suffixes starting at every word, so "500 mg" matches "paracetamol 500 mg" too."""
+    words = fold(name).split()
+    for i in range(len(words)):
+        yield " ".join(words[i:])
+
+
+class _LanguageIndex:
+    __slots__ = ("keys", "product_ids", "items")
+
+    def __init__(self, entries: List[Tuple[str, str]], items: Dict[str, ProductSearchItem]):
+        entries.sort()
+        self.keys = [k for k, _ in entries]
+        self.product_ids = [pid for _, pid in entries]
+        self.items = items
+
+
+class PrefixIndex:
+    """
+    Immutable per-language prefix index over product, brand and translated names.
+
+    Each language keeps a sorted array of folded name suffixes; a lookup is one
+    bisect plus a scan over the matching run.
+    """
+
+    def __init__(self, version: Optional[int], languages: Dict[str, _LanguageIndex]):
+        self.version = version
+        self._languages = languages
+
+    @classmethod
+    def build(
+        cls,
+        version: Optional[int],
+        products: List[Tuple[str, str, Optional[str], Optional[str], Optional[str]]],
+        brands: List[Tuple[str, str]],
+        translations: List[Tuple[str, str, str]],
+    ) -> "PrefixIndex":
+        base_entries: List[Tuple[str, str]] = []
+        base_items: Dict[str, ProductSearchItem] = {}
+        for pid, inn_name, atc_code, form, strength in products:
+            base_items[pid] = ProductSearchItem(
+                product_id=pid, inn_name=inn_name, display_name=inn_name, form=form, strength=strength,
+            )
+            base_entries.extend((key, pid) for key in _word_suffixes(inn_name))
+            if atc_code:
+                base_entries.append((fold(atc_code), pid))
+        for pid, brand_name in brands:
+            if pid in base_items:
+                base_entries.extend((key, pid) for key in _word_suffixes(brand_name))
+
+        per_lang_entries: DefaultDict[str, List[Tuple[str, str]]] = defaultdict(list)
+        per_lang_names: DefaultDict[str, Dict[str, str]] = defaultdict(dict)
+        for pid, language_code, translated_name in translations:
+            if pid not in base_items or not translated_name:
+                continue
+            per_lang_entries[language_code].extend((key, pid) for key in _word_suffixes(translated_name))
+            per_lang_names[language_code].setdefault(pid, translated_name)
+
+        languages = {ANY_LANGUAGE: _LanguageIndex(list(base_entries), base_items)}
+        for language_code, entries in per_lang_entries.items():
+            # display names follow the fallback chain, like the database paths
+            chain = [per_lang_names[lang] for lang in language_chain(language_code) if lang in per_lang_names]
+            items = {}
+            for pid, item in base_items.items():
+                name = next((names[pid] for names in chain if pid in names), None)
+                items[pid] = item.model_copy(update={"display_name": name}) if name else item
+            languages[language_code] = _LanguageIndex(base_entries + entries, items)
+        return cls(version, languages)
+
+    def _index_for(self, language: Optional[str]) -> _LanguageIndex:
+        for lang in language_chain(language):
+            index = self._languages.get(lang)
+            if index is not None:
+                return index
+        return self._languages[ANY_LANGUAGE]
+
+    def search(self, q: str, language: Optional[str], limit: int) -> List[ProductSearchItem]:
+        prefix = fold(q)
+        if not prefix:
+            return []
+        index = self._index_for(language)
+        keys, product_ids = index.keys, index.product_ids
+
+        results: List[ProductSearchItem] = []
+        seen = set()
+        i = bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            pid = product_ids[i]
+            if pid not in seen:
+                seen.add(pid)
+                results.append(index.items[pid])
+                if len(results) >= limit:
+                    break
+            i += 1
+        return results
+
+
+class Typeahead:
+    """Holds the current PrefixIndex and swaps in a rebuilt one when the catalog changes."""
+
+    def __init__(self):
+        self.index: Optional[PrefixIndex] = None
+        self._lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.index is not None
+
+    def search(self, q: str, language: Optional[str], limit: int) -> List[ProductSearchItem]:
+        return self.index.search(q, language, limit)
+
+    async def rebuild(self, version: Optional[int] = None) -> None:
+        async with self._lock:
+            async with SessionLocal() as db:
+                products = (await db.execute(select(
+                    Product.id, Product.inn_name, Product.atc_code, Product.form, Product.strength,
+                ))).all()
+                brands = (await db.execute(select(Brand.product_id, Brand.brand_name))).all()
+                translations = (await db.execute(select(
+                    Translation.product_id, Translation.language_code, Translation.translated_name,
+                ))).all()
+            # sorting/allocation is CPU work; keep it off the event loop
+            index = await asyncio.to_thread(
+                PrefixIndex.build, version or catalog_versions.get("catalog"), products, brands, translations,
+            )
+            self.index = index  # atomic swap; readers keep whatever index they already hold
+            log.info("typeahead index rebuilt (catalog version %s)", index.version)
+
+    async def start(self) -> None:
+        catalog_versions.subscribe("catalog", self.rebuild)
+        try:
+            await self.rebuild()
+        except Exception:
+            log.warning("typeahead index build failed; falling back to database search", exc_info=True)
+
+
+typeahead = Typeahead()
@@ -0,0 +1,87 @@
+# app/services/warmup.py
+import asyncio
+import logging
+import time
+from typing import List
+
+from ..core.config import settings
+from ..core.db import engine, read_engine
+from .availability import product_detail_stmt
+from .catalog_snapshot import package_locations_stmt
+from .search import docs_search_stmt, trigram_search_stmt
+
+log = logging.getLogger(__name__)
+
+WARMUP_QUERY = "zzzq"
+
+
+def hot_statements() -> List:
+    """
+    The statements behind the busiest endpoints, with arguments that match
+    nothing (cheaply). Running them compiles each into SQLAlchemy's statement cache and
+    prepares it in asyncpg's per-connection cache, which is what the first
+    real requests would otherwise pay for.
+    """
+    return [
+        product_detail_stmt("", "en", None, None, None, True),
+        product_detail_stmt("", "en", None, None, None, False),
+        package_locations_stmt([], None, None, None, True),
+        # a pattern with trigrams that matches nothing: "" would make the GIN index scan everything
+        docs_search_stmt(WARMUP_QUERY, "en", 20),
+        trigram_search_stmt(WARMUP_QUERY, "en", 20),
+    ]
+
+
+class _AllOpen:
+    """Holds each warm-up connection until all of them are open, so each one is a separate connection."""
+
+    def __init__(self, count: int):
+        self.remaining = count
+        self.event = asyncio.Event()
+
+    def arrive(self) -> None:
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self.event.set()
+
+
+async def _warm_connection(target, statements: List, all_open: _AllOpen) -> None:
+    arrived = False
+    try:
+        async with target.connect() as conn:
+            for stmt in statements:
+                await conn.execute(stmt)
+            await conn.rollback()
+            all_open.arrive()
+            arrived = True
+            await all_open.event.wait()
+    finally:
+        # a failed connection must not leave the others waiting
+        if not arrived:
+            all_open.arrive()
+
+
+async def warm_pool(target, connections: int) -> None:
+    statements = hot_statements() if settings.WARMUP_STATEMENTS else []
+    all_open = _AllOpen(connections)
+    results = await asyncio.gather(
+        *(_warm_connection(target, statements, all_open) for _ in range(connections)), return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def warm_up() -> None:
+    """Open DB_WARM_CONNECTIONS connections per engine and prepare the hot statements on them."""
+    connections = min(settings.DB_WARM_CONNECTIONS, settings.DB_POOL_SIZE)
+    if connections <= 0:
+        return
+    started = time.perf_counter()
+    targets = [engine] + ([read_engine] if read_engine is not None else [])
+    try:
+        await asyncio.gather(*(warm_pool(target, connections) for target in targets))
+    except Exception:
+        log.warning("database warm-up failed; first requests will connect on demand", exc_info=True)
+        return
+    log.info("warmed %d connection(s) per engine in %.0f ms", connections, (time.perf_counter() - started) * 1000)
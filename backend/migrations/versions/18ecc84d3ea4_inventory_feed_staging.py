@@ -0,0 +1,65 @@
+"""unique pharmacy/package inventory rows and an unlogged feed staging table
+
+Revision ID: 18ecc84d3ea4
+Revises: b714e2cb5371
+Create Date: 2025-09-15 09:52:31.207461
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "18ecc84d3ea4"
+down_revision: Union[str, Sequence[str], None] = "b714e2cb5371"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Keep the most recently updated row of any duplicated pair
+    op.execute(
+        """
+        DELETE FROM pharmacy_inventory
+         WHERE id IN (
+            SELECT id FROM (
+                SELECT id,
+                       row_number() OVER (
+                           PARTITION BY pharmacy_id, package_id
+                           ORDER BY last_updated DESC NULLS LAST, id
+                       ) AS rn
+                  FROM pharmacy_inventory
+            ) ranked
+             WHERE rn > 1
+         );
+        """
+    )
+    op.create_unique_constraint(
+        "uq_pharmacy_inventory_pharmacy_package", "pharmacy_inventory", ["pharmacy_id", "package_id"]
+    )
+
+    # Feed rows land here via COPY before the set-based merge; unlogged
+    # because a crashed load is simply re-sent
+    op.execute(
+        """
+        CREATE UNLOGGED TABLE inventory_staging (
+            seq            bigserial,
+            batch_id       text NOT NULL,
+            pharmacy_id    text NOT NULL,
+            package_id     text NOT NULL,
+            price_cents    integer,
+            currency       varchar(3),
+            stock_quantity integer,
+            last_updated   timestamp,
+            staged_at      timestamptz NOT NULL DEFAULT now()
+        );
+        """
+    )
+    op.execute("CREATE INDEX idx_inventory_staging_batch ON inventory_staging (batch_id);")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS inventory_staging;")
+    op.drop_constraint("uq_pharmacy_inventory_pharmacy_package", "pharmacy_inventory", type_="unique")
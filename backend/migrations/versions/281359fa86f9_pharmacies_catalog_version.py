@@ -0,0 +1,32 @@
+"""bump a pharmacies catalog version on pharmacy changes
+
+Revision ID: 281359fa86f9
+Revises: f09a06c81724
+Create Date: 2025-09-12 16:03:44.118927
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "281359fa86f9"
+down_revision: Union[str, Sequence[str], None] = "f09a06c81724"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.execute("INSERT INTO catalog_versions (name, version) VALUES ('pharmacies', 0) ON CONFLICT DO NOTHING;")
+    op.execute(
+        "CREATE TRIGGER trg_pharmacies_catalog_version "
+        "AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pharmacies "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('pharmacies');"
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS trg_pharmacies_catalog_version ON pharmacies;")
+    op.execute("DELETE FROM catalog_versions WHERE name = 'pharmacies';")
@@ -0,0 +1,66 @@
+"""typed bookings columns, package_id and reservation indexes
+
+Revision ID: 3687964ceb06
+Revises: 5f6a2e9f0759
+Create Date: 2025-09-18 10:31:12.406285
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3687964ceb06"
+down_revision: Union[str, Sequence[str], None] = "5f6a2e9f0759"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.execute(
+        """
+        ALTER TABLE bookings
+            ALTER COLUMN qty TYPE integer USING nullif(qty, '')::integer,
+            ALTER COLUMN price_cents_at_booking TYPE integer USING nullif(price_cents_at_booking, '')::integer,
+            ALTER COLUMN price_cents_at_booking DROP NOT NULL,
+            ALTER COLUMN expires_at TYPE timestamptz USING nullif(expires_at, '')::timestamptz,
+            ALTER COLUMN created_at TYPE timestamptz USING nullif(created_at, '')::timestamptz,
+            ALTER COLUMN created_at SET DEFAULT now();
+        """
+    )
+    op.add_column("bookings", sa.Column("package_id", sa.String(), nullable=True))
+    op.add_column("bookings", sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+    op.create_foreign_key("fk_bookings_package_id", "bookings", "packages", ["package_id"], ["id"])
+    op.create_check_constraint("ck_bookings_qty_positive", "bookings", "qty > 0")
+    op.create_check_constraint(
+        "ck_bookings_status", "bookings", "status IN ('held', 'confirmed', 'cancelled', 'expired')"
+    )
+    # the sweeper only ever looks at live holds, oldest first
+    op.create_index(
+        "idx_bookings_held_expires_at", "bookings", ["expires_at"],
+        postgresql_where=sa.text("status = 'held'"),
+    )
+    op.create_index("idx_bookings_pharmacy_package", "bookings", ["pharmacy_id", "package_id"])
+
+
+def downgrade():
+    op.drop_index("idx_bookings_pharmacy_package", table_name="bookings")
+    op.drop_index("idx_bookings_held_expires_at", table_name="bookings")
+    op.drop_constraint("ck_bookings_status", "bookings", type_="check")
+    op.drop_constraint("ck_bookings_qty_positive", "bookings", type_="check")
+    op.drop_constraint("fk_bookings_package_id", "bookings", type_="foreignkey")
+    op.drop_column("bookings", "updated_at")
+    op.drop_column("bookings", "package_id")
+    op.execute(
+        """
+        ALTER TABLE bookings
+            ALTER COLUMN created_at DROP DEFAULT,
+            ALTER COLUMN qty TYPE varchar USING qty::text,
+            ALTER COLUMN price_cents_at_booking TYPE varchar USING coalesce(price_cents_at_booking::text, ''),
+            ALTER COLUMN price_cents_at_booking SET NOT NULL,
+            ALTER COLUMN expires_at TYPE varchar USING expires_at::text,
+            ALTER COLUMN created_at TYPE varchar USING created_at::text;
+        """
+    )
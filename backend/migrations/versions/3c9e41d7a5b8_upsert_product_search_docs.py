@@ -0,0 +1,94 @@
+"""refresh_product_search_docs upserts instead of delete + insert
+
+Revision ID: 3c9e41d7a5b8
+Revises: fbccf8daa2b1
+Create Date: 2025-09-20 11:27:50.644391
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "3c9e41d7a5b8"
+down_revision: Union[str, Sequence[str], None] = "fbccf8daa2b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# docs of the given products (NULL = all), unchanged from a74d381d3ad9
+DOCS = """
+            SELECT p.id, l.language_code,
+                   COALESCE(t.translated_name, t_en.translated_name, p.inn_name),
+                   p.inn_name, p.form, p.strength,
+                   doc.search_text, to_tsvector('simple', doc.search_text)
+              FROM products p
+             CROSS JOIN (SELECT DISTINCT language_code FROM translations UNION SELECT 'en') l
+              LEFT JOIN LATERAL (
+                   SELECT translated_name FROM translations
+                    WHERE product_id = p.id AND language_code = l.language_code LIMIT 1) t ON true
+              LEFT JOIN LATERAL (
+                   SELECT translated_name FROM translations
+                    WHERE product_id = p.id AND language_code = 'en' LIMIT 1) t_en ON true
+             CROSS JOIN LATERAL (
+                   SELECT lower(unaccent(concat_ws(' ',
+                          t.translated_name, p.inn_name, p.atc_code,
+                          (SELECT string_agg(b.brand_name, ' ') FROM brands b WHERE b.product_id = p.id)
+                   ))) AS search_text) doc
+             WHERE p_product_ids IS NULL OR p.id = ANY(p_product_ids)
+"""
+
+
+def upgrade():
+    # Two transactions refreshing the same product both deleted its rows and
+    # then inserted them again; the second insert failed on the primary key.
+    # Rows are now upserted (rewritten only when they changed), and only the
+    # rows of languages no translation uses any more are deleted. Rows of
+    # deleted products go with them (ON DELETE CASCADE).
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_product_search_docs(p_product_ids text[]) RETURNS void AS $$
+        BEGIN
+            DELETE FROM product_search_docs d
+             WHERE (p_product_ids IS NULL OR d.product_id = ANY(p_product_ids))
+               AND d.language_code <> 'en'
+               AND NOT EXISTS (SELECT 1 FROM translations t WHERE t.language_code = d.language_code);
+
+            INSERT INTO product_search_docs AS d
+                   (product_id, language_code, display_name, inn_name, form, strength, search_text, search_tsv)
+        """
+        + DOCS
+        + """
+            ON CONFLICT (product_id, language_code) DO UPDATE
+               SET display_name = EXCLUDED.display_name,
+                   inn_name = EXCLUDED.inn_name,
+                   form = EXCLUDED.form,
+                   strength = EXCLUDED.strength,
+                   search_text = EXCLUDED.search_text,
+                   search_tsv = EXCLUDED.search_tsv
+             WHERE (d.display_name, d.inn_name, d.form, d.strength, d.search_text)
+                   IS DISTINCT FROM
+                   (EXCLUDED.display_name, EXCLUDED.inn_name, EXCLUDED.form, EXCLUDED.strength, EXCLUDED.search_text);
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_product_search_docs(p_product_ids text[]) RETURNS void AS $$
+        BEGIN
+            DELETE FROM product_search_docs
+             WHERE p_product_ids IS NULL OR product_id = ANY(p_product_ids);
+
+            INSERT INTO product_search_docs
+                   (product_id, language_code, display_name, inn_name, form, strength, search_text, search_tsv)
+        """
+        + DOCS
+        + """;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
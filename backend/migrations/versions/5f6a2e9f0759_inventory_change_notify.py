@@ -0,0 +1,104 @@
+"""publish pharmacy_inventory changes on the inventory_changes NOTIFY channel
+
+Revision ID: 5f6a2e9f0759
+Revises: 18ecc84d3ea4
+Create Date: 2025-09-16 14:08:47.915032
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "5f6a2e9f0759"
+down_revision: Union[str, Sequence[str], None] = "18ecc84d3ea4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Payload: {"c": [[package_id, pharmacy_id, stock_quantity, price_cents], ...]},
+    # nulls for a removed row. NOTIFY payloads are capped at 8000 bytes, so
+    # changes go out 40 per notification; statements touching more rows than
+    # that is worth (bulk feeds, TRUNCATE) send {"reset": true} instead.
+    # Notifications are delivered on commit, in commit order.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_inventory_changes() RETURNS trigger AS $$
+        DECLARE
+            changes jsonb;
+            payload text;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                RETURN NULL;
+            ELSIF TG_OP = 'INSERT' THEN
+                SELECT jsonb_agg(jsonb_build_array(package_id, pharmacy_id, stock_quantity, price_cents))
+                  INTO changes
+                  FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT jsonb_agg(jsonb_build_array(package_id, pharmacy_id, NULL, NULL))
+                  INTO changes
+                  FROM old_rows;
+            ELSE
+                SELECT jsonb_agg(c) INTO changes FROM (
+                    SELECT jsonb_build_array(n.package_id, n.pharmacy_id, n.stock_quantity, n.price_cents) AS c
+                      FROM new_rows n
+                      JOIN old_rows o ON o.id = n.id
+                     WHERE (o.stock_quantity, o.price_cents, o.pharmacy_id, o.package_id)
+                           IS DISTINCT FROM (n.stock_quantity, n.price_cents, n.pharmacy_id, n.package_id)
+                    UNION ALL
+                    -- a row moved to another pharmacy/package: the old pair is gone
+                    SELECT jsonb_build_array(o.package_id, o.pharmacy_id, NULL, NULL)
+                      FROM new_rows n
+                      JOIN old_rows o ON o.id = n.id
+                     WHERE (o.pharmacy_id, o.package_id) IS DISTINCT FROM (n.pharmacy_id, n.package_id)
+                ) moved;
+            END IF;
+
+            IF changes IS NULL THEN
+                RETURN NULL;
+            END IF;
+            IF jsonb_array_length(changes) > 2000 THEN
+                PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                RETURN NULL;
+            END IF;
+            FOR payload IN
+                SELECT jsonb_build_object('c', jsonb_agg(e ORDER BY ord))::text
+                  FROM jsonb_array_elements(changes) WITH ORDINALITY AS t(e, ord)
+                 GROUP BY (ord - 1) / 40
+            LOOP
+                PERFORM pg_notify('inventory_changes', payload);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_notify_ins AFTER INSERT ON pharmacy_inventory "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_inventory_changes();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_notify_upd AFTER UPDATE ON pharmacy_inventory "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_inventory_changes();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_notify_del AFTER DELETE ON pharmacy_inventory "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_inventory_changes();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_notify_trunc AFTER TRUNCATE ON pharmacy_inventory "
+        "FOR EACH STATEMENT EXECUTE FUNCTION notify_inventory_changes();"
+    )
+
+
+def downgrade():
+    for suffix in ("ins", "upd", "del", "trunc"):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_pharmacy_inventory_notify_{suffix} ON pharmacy_inventory;")
+    op.execute("DROP FUNCTION IF EXISTS notify_inventory_changes();")
@@ -0,0 +1,82 @@
+"""drop the stock catalog version; stock bitmaps follow the inventory NOTIFY stream
+
+Revision ID: 7d2b0c4e9f16
+Revises: 3c9e41d7a5b8
+Create Date: 2025-09-20 12:05:31.118702
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7d2b0c4e9f16"
+down_revision: Union[str, Sequence[str], None] = "3c9e41d7a5b8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # Every statement that moved a row in or out of stock updated the one
+    # 'stock' row of catalog_versions and held its lock until commit, which
+    # serialized those writers. The bitmaps it invalidated are patched from
+    # the inventory_changes notifications (5f6a2e9f0759) and are not used
+    # while that listener is down, so the counter has no reader left.
+    for suffix in ("ins", "upd", "del", "trunc"):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_pharmacy_inventory_stock_{suffix} ON pharmacy_inventory;")
+    op.execute("DROP FUNCTION IF EXISTS bump_stock_version();")
+    op.execute("DELETE FROM catalog_versions WHERE name = 'stock';")
+
+
+def downgrade():
+    op.execute("INSERT INTO catalog_versions (name, version) VALUES ('stock', 0) ON CONFLICT DO NOTHING;")
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_stock_version() RETURNS trigger AS $$
+        DECLARE
+            crossed boolean;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT EXISTS (SELECT 1 FROM new_rows WHERE stock_quantity > 0) INTO crossed;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT EXISTS (SELECT 1 FROM old_rows WHERE stock_quantity > 0) INTO crossed;
+            ELSE
+                SELECT EXISTS (
+                    SELECT 1
+                      FROM new_rows n
+                      JOIN old_rows o ON o.id = n.id
+                     WHERE (coalesce(o.stock_quantity, 0) > 0) <> (coalesce(n.stock_quantity, 0) > 0)
+                        OR (n.stock_quantity > 0
+                            AND (o.pharmacy_id <> n.pharmacy_id OR o.package_id <> n.package_id))
+                ) INTO crossed;
+            END IF;
+            IF crossed THEN
+                UPDATE catalog_versions
+                   SET version = version + 1, updated_at = now()
+                 WHERE name = 'stock';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_ins AFTER INSERT ON pharmacy_inventory "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_stock_version();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_upd AFTER UPDATE ON pharmacy_inventory "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_stock_version();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_del AFTER DELETE ON pharmacy_inventory "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_stock_version();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_trunc AFTER TRUNCATE ON pharmacy_inventory "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('stock');"
+    )
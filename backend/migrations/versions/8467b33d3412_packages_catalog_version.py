@@ -0,0 +1,34 @@
+"""bump the catalog version on packages and product_images changes
+
+Revision ID: 8467b33d3412
+Revises: 3687964ceb06
+Create Date: 2025-09-19 09:14:37.220917
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8467b33d3412"
+down_revision: Union[str, Sequence[str], None] = "3687964ceb06"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The in-process catalog snapshot also holds package and image rows
+TABLES = ("packages", "product_images")
+
+
+def upgrade():
+    for table in TABLES:
+        op.execute(
+            f"CREATE TRIGGER trg_{table}_catalog_version "
+            f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('catalog');"
+        )
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_catalog_version ON {table};")
@@ -0,0 +1,58 @@
+"""add catalog_versions counters bumped by catalog triggers
+
+Revision ID: 94550891b328
+Revises: 2ca1f0fb2d13
+Create Date: 2025-09-08 18:42:10.512304
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "94550891b328"
+down_revision: Union[str, Sequence[str], None] = "2ca1f0fb2d13"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ("products", "brands", "translations")
+
+
+def upgrade():
+    op.create_table(
+        "catalog_versions",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("version", sa.BigInteger(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=False, server_default=sa.func.now()),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.execute("INSERT INTO catalog_versions (name, version) VALUES ('catalog', 0);")
+
+    # One bump per statement, so bulk imports cost a single counter update
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_catalog_version() RETURNS trigger AS $$
+        BEGIN
+            UPDATE catalog_versions
+               SET version = version + 1, updated_at = now()
+             WHERE name = TG_ARGV[0];
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    for table in CATALOG_TABLES:
+        op.execute(
+            f"CREATE TRIGGER trg_{table}_catalog_version "
+            f"AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table} "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('catalog');"
+        )
+
+
+def downgrade():
+    for table in CATALOG_TABLES:
+        op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_catalog_version ON {table};")
+    op.execute("DROP FUNCTION IF EXISTS bump_catalog_version();")
+    op.drop_table("catalog_versions")
@@ -0,0 +1,148 @@
+"""add product_search_docs maintained by triggers
+
+Revision ID: a74d381d3ad9
+Revises: 94550891b328
+Create Date: 2025-09-09 21:15:37.204118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = "a74d381d3ad9"
+down_revision: Union[str, Sequence[str], None] = "94550891b328"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# source table -> column holding the product id
+SOURCE_TABLES = {"products": "id", "brands": "product_id", "translations": "product_id"}
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS unaccent;")
+
+    op.create_table(
+        "product_search_docs",
+        sa.Column("product_id", sa.String(), nullable=False),
+        sa.Column("language_code", sa.String(length=5), nullable=False),
+        sa.Column("display_name", sa.String(), nullable=False),
+        sa.Column("inn_name", sa.String(), nullable=False),
+        sa.Column("form", sa.String(), nullable=True),
+        sa.Column("strength", sa.String(), nullable=True),
+        sa.Column("search_text", sa.String(), nullable=False),
+        sa.Column("search_tsv", postgresql.TSVECTOR(), nullable=False),
+        sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("product_id", "language_code"),
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_search_docs_text_trgm ON product_search_docs USING gin (search_text gin_trgm_ops);"
+    )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_search_docs_tsv ON product_search_docs USING gin (search_tsv);"
+    )
+
+    # Rebuild the docs of the given products (NULL = all products).
+    # One row per language known to translations (plus 'en'); display name
+    # falls back translation -> en translation -> inn_name.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION refresh_product_search_docs(p_product_ids text[]) RETURNS void AS $$
+        BEGIN
+            DELETE FROM product_search_docs
+             WHERE p_product_ids IS NULL OR product_id = ANY(p_product_ids);
+
+            INSERT INTO product_search_docs
+                   (product_id, language_code, display_name, inn_name, form, strength, search_text, search_tsv)
+            SELECT p.id, l.language_code,
+                   COALESCE(t.translated_name, t_en.translated_name, p.inn_name),
+                   p.inn_name, p.form, p.strength,
+                   doc.search_text, to_tsvector('simple', doc.search_text)
+              FROM products p
+             CROSS JOIN (SELECT DISTINCT language_code FROM translations UNION SELECT 'en') l
+              LEFT JOIN LATERAL (
+                   SELECT translated_name FROM translations
+                    WHERE product_id = p.id AND language_code = l.language_code LIMIT 1) t ON true
+              LEFT JOIN LATERAL (
+                   SELECT translated_name FROM translations
+                    WHERE product_id = p.id AND language_code = 'en' LIMIT 1) t_en ON true
+             CROSS JOIN LATERAL (
+                   SELECT lower(unaccent(concat_ws(' ',
+                          t.translated_name, p.inn_name, p.atc_code,
+                          (SELECT string_agg(b.brand_name, ' ') FROM brands b WHERE b.product_id = p.id)
+                   ))) AS search_text) doc
+             WHERE p_product_ids IS NULL OR p.id = ANY(p_product_ids);
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    # Statement-level sync: collects the touched product ids from the transition
+    # tables and refreshes only those. TG_ARGV[0] names the product id column.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION sync_product_search_docs() RETURNS trigger AS $$
+        DECLARE
+            ids text[];
+            old_ids text[];
+            new_language boolean := false;
+        BEGIN
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                EXECUTE format('SELECT array_agg(DISTINCT %I) FROM new_rows', TG_ARGV[0]) INTO ids;
+                IF TG_TABLE_NAME = 'translations' THEN
+                    EXECUTE 'SELECT EXISTS (SELECT 1 FROM new_rows n WHERE NOT EXISTS (
+                                 SELECT 1 FROM product_search_docs d WHERE d.language_code = n.language_code))'
+                       INTO new_language;
+                END IF;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                EXECUTE format('SELECT array_agg(DISTINCT %I) FROM old_rows', TG_ARGV[0]) INTO old_ids;
+                ids := array_cat(ids, old_ids);
+            END IF;
+
+            IF new_language THEN
+                -- a language no product had before: every product needs a row for it
+                PERFORM refresh_product_search_docs(NULL);
+            ELSIF ids IS NOT NULL THEN
+                PERFORM refresh_product_search_docs(ids);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+    # transition tables allow only one event per trigger
+    for table, column in SOURCE_TABLES.items():
+        op.execute(
+            f"CREATE TRIGGER trg_{table}_search_docs_ins AFTER INSERT ON {table} "
+            f"REFERENCING NEW TABLE AS new_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION sync_product_search_docs('{column}');"
+        )
+        op.execute(
+            f"CREATE TRIGGER trg_{table}_search_docs_upd AFTER UPDATE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION sync_product_search_docs('{column}');"
+        )
+        op.execute(
+            f"CREATE TRIGGER trg_{table}_search_docs_del AFTER DELETE ON {table} "
+            f"REFERENCING OLD TABLE AS old_rows "
+            f"FOR EACH STATEMENT EXECUTE FUNCTION sync_product_search_docs('{column}');"
+        )
+
+    # Backfill
+    op.execute("SELECT refresh_product_search_docs(NULL);")
+
+
+def downgrade():
+    for table in SOURCE_TABLES:
+        for suffix in ("ins", "upd", "del"):
+            op.execute(f"DROP TRIGGER IF EXISTS trg_{table}_search_docs_{suffix} ON {table};")
+    op.execute("DROP FUNCTION IF EXISTS sync_product_search_docs();")
+    op.execute("DROP FUNCTION IF EXISTS refresh_product_search_docs(text[]);")
+    op.execute("DROP INDEX IF EXISTS idx_search_docs_tsv;")
+    op.execute("DROP INDEX IF EXISTS idx_search_docs_text_trgm;")
+    op.drop_table("product_search_docs")
@@ -0,0 +1,82 @@
+"""bump a stock catalog version when inventory stock crosses zero
+
+Revision ID: b714e2cb5371
+Revises: 281359fa86f9
+Create Date: 2025-09-14 11:27:05.640318
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "b714e2cb5371"
+down_revision: Union[str, Sequence[str], None] = "281359fa86f9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    op.execute("INSERT INTO catalog_versions (name, version) VALUES ('stock', 0) ON CONFLICT DO NOTHING;")
+
+    # Price and quantity updates are far more frequent than a row going in or
+    # out of stock; only the latter changes the in-memory stock bitmaps.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION bump_stock_version() RETURNS trigger AS $$
+        DECLARE
+            crossed boolean;
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT EXISTS (SELECT 1 FROM new_rows WHERE stock_quantity > 0) INTO crossed;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT EXISTS (SELECT 1 FROM old_rows WHERE stock_quantity > 0) INTO crossed;
+            ELSE
+                SELECT EXISTS (
+                    SELECT 1
+                      FROM new_rows n
+                      JOIN old_rows o ON o.id = n.id
+                     WHERE (coalesce(o.stock_quantity, 0) > 0) <> (coalesce(n.stock_quantity, 0) > 0)
+                        OR (n.stock_quantity > 0
+                            AND (o.pharmacy_id <> n.pharmacy_id OR o.package_id <> n.package_id))
+                ) INTO crossed;
+            END IF;
+            IF crossed THEN
+                UPDATE catalog_versions
+                   SET version = version + 1, updated_at = now()
+                 WHERE name = 'stock';
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+    # transition tables allow only one event per trigger
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_ins AFTER INSERT ON pharmacy_inventory "
+        "REFERENCING NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_stock_version();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_upd AFTER UPDATE ON pharmacy_inventory "
+        "REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_stock_version();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_del AFTER DELETE ON pharmacy_inventory "
+        "REFERENCING OLD TABLE AS old_rows "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_stock_version();"
+    )
+    op.execute(
+        "CREATE TRIGGER trg_pharmacy_inventory_stock_trunc AFTER TRUNCATE ON pharmacy_inventory "
+        "FOR EACH STATEMENT EXECUTE FUNCTION bump_catalog_version('stock');"
+    )
+
+
+def downgrade():
+    for suffix in ("ins", "upd", "del", "trunc"):
+        op.execute(f"DROP TRIGGER IF EXISTS trg_pharmacy_inventory_stock_{suffix} ON pharmacy_inventory;")
+    op.execute("DROP FUNCTION IF EXISTS bump_stock_version();")
+    op.execute("DELETE FROM catalog_versions WHERE name = 'stock';")
@@ -0,0 +1,54 @@
+"""numeric pharmacy coordinates with a GiST point index
+
+Revision ID: f09a06c81724
+Revises: a74d381d3ad9
+Create Date: 2025-09-11 19:27:52.860341
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "f09a06c81724"
+down_revision: Union[str, Sequence[str], None] = "a74d381d3ad9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade():
+    # The b-tree over the text values can't serve range queries
+    op.execute("DROP INDEX IF EXISTS idx_pharmacies_lat_lng;")
+
+    for column in ("lat", "lng"):
+        op.alter_column(
+            "pharmacies",
+            column,
+            existing_type=sa.VARCHAR(),
+            type_=sa.Float(),
+            existing_nullable=True,
+            postgresql_using=f"NULLIF(trim({column}), '')::double precision",
+        )
+
+    # Bounding-box prefilter: point(lng, lat) <@ box(...)
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pharmacies_geo ON pharmacies USING gist (point(lng, lat));"
+    )
+
+
+def downgrade():
+    op.execute("DROP INDEX IF EXISTS idx_pharmacies_geo;")
+    for column in ("lat", "lng"):
+        op.alter_column(
+            "pharmacies",
+            column,
+            existing_type=sa.Float(),
+            type_=sa.VARCHAR(),
+            existing_nullable=True,
+            postgresql_using=f"{column}::text",
+        )
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_pharmacies_lat_lng ON pharmacies(lat, lng);"
+    )
@@ -0,0 +1,138 @@
+"""inventory_changes notifications: size check before aggregating, unique payloads
+
+Revision ID: fbccf8daa2b1
+Revises: 8467b33d3412
+Create Date: 2025-09-20 10:42:13.508126
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "fbccf8daa2b1"
+down_revision: Union[str, Sequence[str], None] = "8467b33d3412"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Same transition-table queries as 5f6a2e9f0759; only the guards and the
+# payload differ, so both bodies share them.
+CHANGES = """
+            IF TG_OP = 'INSERT' THEN
+                SELECT jsonb_agg(jsonb_build_array(package_id, pharmacy_id, stock_quantity, price_cents))
+                  INTO changes
+                  FROM new_rows;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT jsonb_agg(jsonb_build_array(package_id, pharmacy_id, NULL, NULL))
+                  INTO changes
+                  FROM old_rows;
+            ELSE
+                SELECT jsonb_agg(c) INTO changes FROM (
+                    SELECT jsonb_build_array(n.package_id, n.pharmacy_id, n.stock_quantity, n.price_cents) AS c
+                      FROM new_rows n
+                      JOIN old_rows o ON o.id = n.id
+                     WHERE (o.stock_quantity, o.price_cents, o.pharmacy_id, o.package_id)
+                           IS DISTINCT FROM (n.stock_quantity, n.price_cents, n.pharmacy_id, n.package_id)
+                    UNION ALL
+                    -- a row moved to another pharmacy/package: the old pair is gone
+                    SELECT jsonb_build_array(o.package_id, o.pharmacy_id, NULL, NULL)
+                      FROM new_rows n
+                      JOIN old_rows o ON o.id = n.id
+                     WHERE (o.pharmacy_id, o.package_id) IS DISTINCT FROM (n.pharmacy_id, n.package_id)
+                ) moved;
+            END IF;
+
+            IF changes IS NULL THEN
+                RETURN NULL;
+            END IF;
+"""
+
+
+def upgrade():
+    # The row count is checked on the transition table, capped at 2001 rows,
+    # before any jsonb is built: a bulk feed statement costs a reset, not an
+    # aggregate of every row it touched. A statement under the limit can
+    # still send up to twice as many entries when rows move pharmacy/package.
+    #
+    # NOTIFY drops a payload identical to one already queued by the same
+    # transaction, which would lose a later statement that happens to send
+    # the same chunk again (stock 5 -> 4 -> 5 -> 4). Every chunk therefore
+    # carries the transaction id ("tx") and a running number within the
+    # transaction ("n"), kept in a transaction-local setting.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_inventory_changes() RETURNS trigger AS $$
+        DECLARE
+            changes jsonb;
+            chunk jsonb;
+            sent bigint;
+        BEGIN
+            -- separate branches: each trigger only has its own transition tables
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                RETURN NULL;
+            ELSIF TG_OP = 'DELETE' THEN
+                IF (SELECT count(*) FROM (SELECT 1 FROM old_rows LIMIT 2001) s) > 2000 THEN
+                    PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                    RETURN NULL;
+                END IF;
+            ELSIF (SELECT count(*) FROM (SELECT 1 FROM new_rows LIMIT 2001) s) > 2000 THEN
+                PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                RETURN NULL;
+            END IF;
+        """
+        + CHANGES
+        + """
+            sent := coalesce(nullif(current_setting('inventory_changes.sent', true), ''), '0')::bigint;
+            FOR chunk IN
+                SELECT jsonb_agg(e ORDER BY ord)
+                  FROM jsonb_array_elements(changes) WITH ORDINALITY AS t(e, ord)
+                 GROUP BY (ord - 1) / 40
+                 ORDER BY (ord - 1) / 40
+            LOOP
+                sent := sent + 1;
+                PERFORM pg_notify(
+                    'inventory_changes',
+                    jsonb_build_object('c', chunk, 'tx', txid_current(), 'n', sent)::text
+                );
+            END LOOP;
+            PERFORM set_config('inventory_changes.sent', sent::text, true);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
+
+
+def downgrade():
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_inventory_changes() RETURNS trigger AS $$
+        DECLARE
+            changes jsonb;
+            payload text;
+        BEGIN
+            IF TG_OP = 'TRUNCATE' THEN
+                PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                RETURN NULL;
+            END IF;
+        """
+        + CHANGES
+        + """
+            IF jsonb_array_length(changes) > 2000 THEN
+                PERFORM pg_notify('inventory_changes', '{"reset": true}');
+                RETURN NULL;
+            END IF;
+            FOR payload IN
+                SELECT jsonb_build_object('c', jsonb_agg(e ORDER BY ord))::text
+                  FROM jsonb_array_elements(changes) WITH ORDINALITY AS t(e, ord)
+                 GROUP BY (ord - 1) / 40
+            LOOP
+                PERFORM pg_notify('inventory_changes', payload);
+            END LOOP;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    )
@@ -0,0 +1,97 @@
+"""
+Cold start benchmark.
+
+Measures, over several fresh processes:
+  import   - `import app.main` in a new interpreter
+  ready    - uvicorn launch until /health?ready=true answers 200 (lifespan done, DB reachable)
+  first    - latency of the first request to each --path
+  second   - the same request again (what a warm worker pays)
+
+    cd backend && DATABASE_URL=postgresql+asyncpg://... python -m scripts.bench_startup \\
+        --path "/products/search?q=ibu" --path "/products/<id>/packages"
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def timed_get(url: str, timeout: float = 10.0) -> float:
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+    return time.perf_counter() - started
+
+
+def measure_import() -> float:
+    out = subprocess.run(
+        [sys.executable, "-c",
+         "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"],
+        check=True, capture_output=True, text=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_server(port: int, paths, ready_timeout: float):
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=os.environ.copy(),
+    )
+    try:
+        while True:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+            try:
+                timed_get(f"{base}/health?ready=true", timeout=1.0)
+                break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                if time.perf_counter() - started > ready_timeout:
+                    raise RuntimeError("not ready in time")
+                time.sleep(0.01)
+        ready = time.perf_counter() - started
+        first = [timed_get(base + p) for p in paths]
+        second = [timed_get(base + p) for p in paths]
+        return ready, first, second
+    finally:
+        server.terminate()
+        server.wait(10)
+
+
+def ms(values) -> str:
+    return f"median {statistics.median(values) * 1000:7.1f} ms   max {max(values) * 1000:7.1f} ms"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", action="append", default=[], help="request to time after startup (repeatable)")
+    parser.add_argument("--ready-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+    paths = args.path or ["/products/search?q=a"]
+
+    imports = [measure_import() for _ in range(args.runs)]
+    print(f"import   {ms(imports)}")
+
+    readies, firsts, seconds = [], {p: [] for p in paths}, {p: [] for p in paths}
+    for _ in range(args.runs):
+        ready, first, second = measure_server(args.port, paths, args.ready_timeout)
+        readies.append(ready)
+        for p, a, b in zip(paths, first, second):
+            firsts[p].append(a)
+            seconds[p].append(b)
+    print(f"ready    {ms(readies)}")
+    for p in paths:
+        print(f"first    {ms(firsts[p])}   {p}")
+        print(f"second   {ms(seconds[p])}   {p}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
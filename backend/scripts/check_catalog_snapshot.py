@@ -0,0 +1,76 @@
+"""
+Offline check of the shared catalog snapshot file.
+
+Builds a synthetic catalog in memory, writes it with write_snapshot_file,
+maps it back and checks that every product detail, gtin lookup and pharmacy
+row matches the in-memory snapshot; then times lookups on the mapping and
+checks that a stale file is refused by open_if_current.
+
+    cd backend && python -m scripts.check_catalog_snapshot --products 20000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from app.seeds.synthetic_catalog import synthetic
+from app.services.catalog_snapshot import CatalogSnapshot, MappedCatalogSnapshot, open_if_current, write_snapshot_file
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    args = parser.parse_args()
+
+    snapshot = CatalogSnapshot.build(7, *synthetic(args.products))
+    pharmacies = [(f"ph-{i}", 48.0 + i / 1000, 17.0 + i / 1000, "SK", None if i % 2 else "Bratislava") for i in range(500)]
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "catalog.snapshot")
+        started = time.perf_counter()
+        write_snapshot_file(path, snapshot, 3, pharmacies)
+        print(f"wrote {os.path.getsize(path) / 1e6:.1f} MB in {time.perf_counter() - started:.2f}s")
+        mapped = MappedCatalogSnapshot(path)
+
+        if (mapped.version, mapped.pharmacies_version) != (7, 3):
+            failures.append(f"versions {mapped.version}, {mapped.pharmacies_version}")
+        for product in snapshot.products.values():
+            other = mapped.product(product.id)
+            locations = {pid: [] for pid in product.package_ids}  # empty: packages are skipped either way
+            if other is None or (
+                other.brand_names, other.package_ids, other.names,
+            ) != (product.brand_names, product.package_ids, product.names):
+                failures.append(f"product {product.id}")
+            elif snapshot.product_detail(product, "de", locations) != mapped.product_detail(other, "de", locations):
+                failures.append(f"detail {product.id}")
+        for package in snapshot.packages.values():
+            other = mapped.package(package.id)
+            fields = ("id", "gtin", "pack_size", "brand_name", "manufacturer", "country_code", "image_urls")
+            if other is None or any(getattr(other, f) != getattr(package, f) for f in fields):
+                failures.append(f"package {package.id}")
+            if package.gtin and mapped.package_by_gtin(package.gtin).id != package.id:
+                failures.append(f"gtin {package.gtin}")
+        if mapped.product("prod-missing") is not None or mapped.package_by_gtin("0") is not None:
+            failures.append("lookup of a missing key found something")
+        if [tuple(r) for r in mapped.pharmacy_rows()] != pharmacies:
+            failures.append("pharmacy rows differ")
+
+        ids = list(snapshot.products)[:: max(1, len(snapshot.products) // 1000)]
+        started = time.perf_counter()
+        for pid in ids:
+            mapped.product(pid)
+        print(f"mapped product lookup: {(time.perf_counter() - started) / len(ids) * 1e6:.1f}us")
+
+        if open_if_current(path, 8, 3) is not None or open_if_current(path, 7, 3) is None:
+            failures.append("open_if_current version check")
+
+    for failure in failures[:20]:
+        print("FAIL:", failure)
+    if not failures:
+        print(f"ok: {len(snapshot.products)} products and {len(snapshot.packages)} packages round-trip through the file")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""
+End-to-end check of the inventory change stream against a local Postgres.
+
+Bumps the stock of one pharmacy_inventory row, waits for the coalesced event
+to reach a listener, and restores the row.
+
+    cd backend && DATABASE_URL=postgresql+asyncpg://... python -m scripts.check_inventory_events
+"""
+import asyncio
+import sys
+
+from sqlalchemy import select, update
+
+from app.core.db import SessionLocal
+from app.models import PharmacyInventory
+from app.services.inventory_events import inventory_events
+
+
+async def main() -> int:
+    received = asyncio.Queue()
+
+    async def listener(changes, reset):
+        await received.put((changes, reset))
+
+    inventory_events.subscribe(listener)
+    await inventory_events.start()
+    if not inventory_events.connected:
+        print("could not LISTEN; is DATABASE_URL reachable?")
+        return 1
+
+    try:
+        async with SessionLocal() as db:
+            row = (await db.execute(
+                select(PharmacyInventory.id, PharmacyInventory.pharmacy_id,
+                       PharmacyInventory.package_id, PharmacyInventory.stock_quantity).limit(1)
+            )).one_or_none()
+            if row is None:
+                print("pharmacy_inventory is empty; seed it first")
+                return 1
+            inv_id, pharmacy_id, package_id, stock = row
+            new_stock = (stock or 0) + 1
+            await db.execute(update(PharmacyInventory).where(PharmacyInventory.id == inv_id)
+                             .values(stock_quantity=new_stock))
+            await db.commit()
+            try:
+                changes, reset = await asyncio.wait_for(received.get(), 5)
+            finally:
+                await db.execute(update(PharmacyInventory).where(PharmacyInventory.id == inv_id)
+                                 .values(stock_quantity=stock))
+                await db.commit()
+
+        hit = [c for c in changes if (c.pharmacy_id, c.package_id) == (pharmacy_id, package_id)]
+        if reset or not hit or hit[0].stock_quantity != new_stock:
+            print(f"unexpected event: reset={reset} changes={[(c.pharmacy_id, c.package_id, c.stock_quantity) for c in changes]}")
+            return 1
+        print(f"ok: {pharmacy_id}/{package_id} stock {stock} -> {new_stock} arrived as one coalesced event")
+        return 0
+    except asyncio.TimeoutError:
+        print("no inventory event within 5s; is migration 5f6a2e9f0759 applied?")
+        return 1
+    finally:
+        await inventory_events.stop()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,40 @@
+"""
+Concurrency stress check of the reservation engine against a local Postgres
+(app/seeds/reservation_stress.py), with larger numbers than
+tests/test_reservations_stress.py.
+
+    cd backend && DATABASE_URL=postgresql+asyncpg://... python -m scripts.stress_reservations --clients 500
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from app.core.db import SessionLocal, engine
+from app.seeds.reservation_stress import run_stress
+
+
+async def main(args) -> int:
+    try:
+        failures = await run_stress(SessionLocal, args.clients, args.stock, args.max_qty, args.sweepers, args.batch)
+    finally:
+        await engine.dispose()
+    if failures is None:
+        print("pharmacy_inventory has no priced rows; seed it first")
+        return 1
+    for failure in failures:
+        print("FAIL:", failure)
+    if not failures:
+        print("ok: no overselling, every hold released exactly once, stock restored")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=300)
+    parser.add_argument("--stock", type=int, default=200)
+    parser.add_argument("--max-qty", type=int, default=3)
+    parser.add_argument("--sweepers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=50)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(asyncio.run(main(parser.parse_args())))
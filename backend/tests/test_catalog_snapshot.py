@@ -0,0 +1,36 @@
+# tests/test_catalog_snapshot.py
+import os
+
+import pytest
+
+from app.seeds.synthetic_catalog import synthetic
+from app.services.catalog_snapshot import CatalogSnapshot, CatalogView, MappedCatalogSnapshot, write_snapshot_file
+
+
+def test_mapped_file_serves_the_same_details(tmp_path):
+    snapshot = CatalogSnapshot.build(7, *synthetic(300))
+    path = os.path.join(tmp_path, "catalog.snapshot")
+    write_snapshot_file(path, snapshot, 3, [("ph-1", 48.1, 17.1, "SK", None)])
+    mapped = MappedCatalogSnapshot(path)
+
+    assert isinstance(mapped, CatalogView) and not isinstance(mapped, CatalogSnapshot)
+    assert (mapped.version, mapped.pharmacies_version) == (7, 3)
+    for product in snapshot.products.values():
+        locations = {pid: [] for pid in product.package_ids}
+        assert mapped.product_detail(mapped.product(product.id), "sk", locations) == \
+            snapshot.product_detail(product, "sk", locations)
+    for package in snapshot.packages.values():
+        assert mapped.package(package.id).image_urls == package.image_urls
+        if package.gtin:
+            assert mapped.package_by_gtin(package.gtin).id == package.id
+    assert mapped.product("missing") is None
+    assert list(mapped.pharmacy_rows()) == [("ph-1", 48.1, 17.1, "SK", None)]
+
+
+def test_catalog_view_requires_the_lookups():
+    class Partial(CatalogView):
+        def product(self, product_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
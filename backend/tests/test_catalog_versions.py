@@ -0,0 +1,44 @@
+# tests/test_catalog_versions.py
+import pytest
+
+from app.services.catalog_version import CatalogVersions
+
+pytestmark = pytest.mark.anyio
+
+
+def versions(*reads):
+    """CatalogVersions whose reads return (or raise) `reads` in turn, with a recording 'catalog' listener."""
+    holder = CatalogVersions(poll_seconds=3600)
+    reads = list(reads)
+    seen = []
+
+    async def read():
+        result = reads.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def listener(version):
+        seen.append(version)
+
+    holder._read = read
+    holder.subscribe("catalog", listener)
+    return holder, seen
+
+
+async def test_first_read_is_the_baseline():
+    holder, seen = versions([("catalog", 1)], [("catalog", 1)], [("catalog", 2)])
+    await holder.start()
+    await holder.refresh()
+    await holder.refresh()
+    await holder.stop()
+    assert seen == [2]
+
+
+async def test_first_read_after_a_failed_start_is_reported():
+    holder, seen = versions(OSError("database down"), [("catalog", 1)], [("catalog", 1)])
+    await holder.start()
+    await holder.refresh()
+    await holder.refresh()
+    await holder.stop()
+    assert seen == [1]
@@ -0,0 +1,30 @@
+# tests/test_health.py
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from unittest import mock
+
+import pytest
+
+from app import main
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_ready_probe_answers_503_when_connect_hangs(client):
+    @asynccontextmanager
+    async def hanging_connect():
+        await asyncio.sleep(60)
+        yield
+
+    with mock.patch.object(main, "engine", mock.Mock(connect=hanging_connect)):
+        started = time.perf_counter()
+        response = await client.get("/health", params={"ready": "true"})
+    assert response.status_code == 503
+    assert time.perf_counter() - started < 5
+
+
+async def test_liveness_does_not_touch_the_database(client):
+    response = await client.get("/health")
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
@@ -0,0 +1,34 @@
+# tests/test_inventory_feed.py
+import pytest
+
+from app.services.inventory_feed import FeedError, parse_feed
+
+pytestmark = pytest.mark.anyio
+
+
+async def lines(*items):
+    for item in items:
+        yield item
+
+
+async def rows(fmt, *items):
+    return [row async for row in parse_feed(lines(*items), fmt)]
+
+
+async def test_currency_defaults_and_is_normalized():
+    parsed = await rows(
+        "ndjson",
+        '{"pharmacy_id": "ph", "package_id": "a", "price_cents": 100}',
+        '{"pharmacy_id": "ph", "package_id": "b", "currency": "czk"}',
+    )
+    assert [row[3] for row in parsed] == ["EUR", "CZK"]
+
+
+@pytest.mark.parametrize("currency", ['"EURO"', '"E1"', "978", '["EUR"]'])
+async def test_bad_currency_is_a_feed_error_with_the_line(currency):
+    with pytest.raises(FeedError, match="line 2: currency"):
+        await rows(
+            "ndjson",
+            '{"pharmacy_id": "ph", "package_id": "a"}',
+            f'{{"pharmacy_id": "ph", "package_id": "b", "currency": {currency}}}',
+        )
@@ -0,0 +1,70 @@
+# tests/test_live_stock.py
+import pytest
+
+from app.services.inventory_events import InventoryChange
+from app.services.live_stock import LiveStock, LiveSubscription
+
+pytestmark = pytest.mark.anyio
+
+PHARMACY = {
+    "pharmacy_name": "A", "pharmacy_address": "", "pharmacy_city": "", "pharmacy_country": "",
+    "lat": 48.1, "lng": 17.1, "distance_km": 1.0,
+}
+
+
+def subscription(baseline, during_load=()):
+    """A registered LiveSubscription whose baseline read sees `baseline` while `during_load` changes arrive."""
+    feed = LiveStock()
+    sub = LiveSubscription("p1", 48.1, 17.1, 10)
+    sub.package_ids = {"k1"}
+    feed.add(sub)
+
+    async def read_state(db):
+        await feed.on_inventory_changes(list(during_load), False)
+        sub.pharmacies = {"ph1": PHARMACY}
+        sub.state = dict(baseline)
+
+    sub._read_state = read_state
+    return feed, sub
+
+
+async def test_changes_during_the_baseline_read_are_replayed():
+    # committed after the read saw stock 0, delivered while it was still running
+    feed, sub = subscription({}, [InventoryChange("k1", "ph1", 3, 250)])
+    await sub.load_state(None)
+    message = sub.queue.get_nowait()
+    assert [c["type"] for c in message["changes"]] == ["in_stock"]
+    assert sub.state[("k1", "ph1")] == (3, 250)
+
+
+async def test_replayed_changes_already_in_the_baseline_send_nothing():
+    feed, sub = subscription({("k1", "ph1"): (3, 250)}, [InventoryChange("k1", "ph1", 3, 250)])
+    await sub.load_state(None)
+    assert sub.queue.empty()
+
+
+async def test_changes_after_the_load_are_live():
+    feed, sub = subscription({("k1", "ph1"): (3, 250)})
+    await sub.load_state(None)
+    await feed.on_inventory_changes([InventoryChange("k1", "ph1", 0, 250)], False)
+    assert sub.queue.get_nowait()["changes"][0]["type"] == "out_of_stock"
+
+
+async def test_reindex_keeps_the_subscription_registered():
+    feed, sub = subscription({})
+    await sub.load_state(None)
+    sub.package_ids = {"k1", "k2"}
+    feed.reindex(sub)
+    sub.pharmacies = {"ph1": PHARMACY}
+    await feed.on_inventory_changes([InventoryChange("k2", "ph1", 1, 100)], False)
+    assert sub.queue.get_nowait()["changes"][0]["package_id"] == "k2"
+
+
+async def test_remove_after_a_reload_unregisters_the_indexed_ids():
+    feed, sub = subscription({})
+    await sub.load_state(None)
+    # cancelled between reloading the package ids and reindexing
+    sub.package_ids = {"k2"}
+    feed.remove(sub)
+    feed.reindex(sub)  # a late reindex must not register it again
+    assert not feed.subscriptions and not feed._by_package
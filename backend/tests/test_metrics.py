@@ -0,0 +1,33 @@
+# tests/test_metrics.py
+import os
+import time
+
+from app.services.metrics import Metrics, MetricsExporter, render
+
+
+def snapshot(requests: int):
+    worker = Metrics()
+    for _ in range(requests):
+        worker.observe("GET", "/products/search", 200, 0.01, 100)
+    return worker.snapshot()
+
+
+def total(text: str) -> str:
+    return next(line for line in text.splitlines() if line.startswith("http_requests_total"))
+
+
+def test_totals_survive_a_worker_going_away(tmp_path):
+    exporter = MetricsExporter(str(tmp_path), flush_seconds=5.0, stale_seconds=60.0)
+    exporter._dump(str(tmp_path / "101.json"), snapshot(3))
+    exporter._dump(str(tmp_path / "102.json"), snapshot(4))
+    before = render(exporter._read_all())
+
+    # worker 101 died a while ago: its file ages out and is folded into retired.json
+    old = time.time() - 120
+    os.utime(tmp_path / "101.json", (old, old))
+    after = render(exporter._read_all())
+    assert not (tmp_path / "101.json").exists()
+    assert total(after) == total(before) == 'http_requests_total{method="GET",route="/products/search",status="200"} 7'
+    assert "app_workers 1" in after
+    # a second scrape does not fold it again
+    assert total(render(exporter._read_all())) == total(before)
@@ -0,0 +1,67 @@
+# tests/test_query_counts.py
+import pytest
+from sqlalchemy import select
+
+from app.core.db import SessionLocal
+from app.models import Package
+from app.services.catalog_snapshot import catalog_snapshot
+from app.services.typeahead import PrefixIndex, typeahead
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def typeahead_index():
+    previous = typeahead.index
+    typeahead.index = PrefixIndex.build(
+        1,
+        [("p1", "ibuprofen", "M01AE01", "tablet", "400 mg"), ("p2", "paracetamol", "N02BE01", "tablet", "500 mg")],
+        [("p1", "Brufen")],
+        [("p1", "de", "Ibuprofen DE")],
+    )
+    yield
+    typeahead.index = previous
+
+
+async def test_typeahead_runs_no_queries(client, max_queries, typeahead_index):
+    with max_queries(0):
+        response = await client.get("/products/typeahead", params={"q": "bru", "language": "de"})
+    assert response.status_code == 200
+    assert [item["display_name"] for item in response.json()] == ["Ibuprofen DE"]
+
+
+async def test_search_is_one_query(client, max_queries, database):
+    for mode in ("docs", "trigram", "ilike"):
+        with max_queries(1):
+            response = await client.get("/products/search", params={"q": f"zzzq-{mode}", "mode": mode})
+        assert response.status_code == 200
+
+
+async def test_product_packages_query_budget(client, max_queries, database):
+    # unknown product: the joined detail statement, then 404
+    with max_queries(1):
+        response = await client.get("/products/no-such-product/packages")
+    assert response.status_code == 404
+
+
+async def test_product_packages_query_budget_for_a_product(client, max_queries, database):
+    async with SessionLocal() as db:
+        product_id = (await db.execute(select(Package.product_id).limit(1))).scalar()
+    if product_id is None:
+        pytest.skip("no packages; seed the database first")
+    params = {"lat": 48.15, "lng": 17.11, "radius_km": 50}
+    previous = catalog_snapshot.snapshot
+    try:
+        # without a snapshot: the joined detail statement alone
+        catalog_snapshot.snapshot = None
+        with max_queries(1):
+            response = await client.get(f"/products/{product_id}/packages", params=params)
+        assert response.status_code == 200
+
+        # with one: only the nearby inventory read
+        await catalog_snapshot.rebuild()
+        with max_queries(1):
+            response = await client.get(f"/products/{product_id}/packages", params={**params, "language": "de"})
+        assert response.status_code == 200
+    finally:
+        catalog_snapshot.snapshot = previous
@@ -0,0 +1,22 @@
+# tests/test_replica.py
+import time
+
+from starlette.requests import Request
+
+from app.services.replica import READ_YOUR_WRITES_HEADER, _reads_own_write, replica_monitor
+
+
+def request(value=None):
+    headers = [(READ_YOUR_WRITES_HEADER.encode(), value.encode())] if value is not None else []
+    return Request({"type": "http", "headers": headers})
+
+
+def test_reads_stay_on_the_primary_until_the_replica_passes_the_write(monkeypatch):
+    written = f"{time.time():.3f}"
+    monkeypatch.setattr(replica_monitor, "synced_at", time.monotonic() - 5)
+    assert not _reads_own_write(request())
+    assert _reads_own_write(request(written))
+    assert _reads_own_write(request("yes"))  # not a time: always the primary
+    # a poll after the write found the replica caught up
+    monkeypatch.setattr(replica_monitor, "synced_at", time.monotonic() + 1)
+    assert not _reads_own_write(request(written))
@@ -0,0 +1,31 @@
+# tests/test_reservations_stress.py
+"""
+Reservation engine under concurrent holds, cancels and expiry sweeps
+(app/seeds/reservation_stress.py). It rewrites an inventory row and
+creates bookings in the database at DATABASE_URL, so it only runs when
+asked for:
+
+    cd backend && DATABASE_URL=postgresql+asyncpg://... python -m pytest -m stress
+
+scripts/stress_reservations.py runs the same scenario with larger numbers.
+"""
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.core.config import settings
+from app.seeds.reservation_stress import run_stress
+
+pytestmark = [pytest.mark.anyio, pytest.mark.stress]
+
+
+async def test_no_oversell_and_each_hold_released_once(database):
+    # an engine of its own: the app's pool stays untouched by this test's event loop
+    engine = create_async_engine(settings.DATABASE_URL, pool_size=20, max_overflow=20)
+    try:
+        sessions = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+        failures = await run_stress(sessions, clients=200, stock=120, max_qty=3, sweepers=4, batch=25)
+    finally:
+        await engine.dispose()
+    if failures is None:
+        pytest.skip("pharmacy_inventory has no priced rows; seed the database first")
+    assert failures == []
@@ -0,0 +1,34 @@
+# tests/test_search_languages.py
+from sqlalchemy.dialects import postgresql
+
+from app.services.search import DocLanguages, docs_search_stmt, doc_languages
+from app.services.translations import language_chain
+
+
+def test_doc_language_follows_the_fallback_chain():
+    languages = DocLanguages()
+    assert languages.resolve("sk") == "en"  # not loaded yet
+    languages.languages = frozenset({"en", "cs", "de"})
+    assert language_chain("sk")[:2] == ("sk", "cs")
+    assert languages.resolve("sk") == "cs"
+    assert languages.resolve("de") == "de"
+    assert languages.resolve("pl") == "en"
+    assert languages.resolve(None) == "en"
+
+
+def test_docs_search_binds_one_language_and_resolves_the_name(monkeypatch):
+    monkeypatch.setattr(doc_languages, "languages", frozenset({"en", "cs"}))
+    compiled = docs_search_stmt("ibu", "sk", 5).compile(dialect=postgresql.dialect())
+    sql = str(compiled)
+    # no probe of product_search_docs for a language: the chain was resolved in Python
+    assert sql.count("FROM product_search_docs") == 1
+    assert "product_search_docs.language_code = %(language_code_1)s" in sql
+    assert compiled.params["language_code_1"] == "cs"
+    # display name resolved along the chain, like trigram/ilike/typeahead/snapshot
+    assert "FROM translations" in sql and list(language_chain("sk")) in compiled.params.values()
+
+
+def test_language_chains_are_bounded():
+    for i in range(500):
+        assert language_chain(f"x{i}")[0] == f"x{i}"
+    assert language_chain.cache_info().currsize <= 64
@@ -0,0 +1,145 @@
+# tests/test_token_verifier.py
+"""
+Firebase ID token verifier, offline: an RSA key and self-signed certificate
+are minted locally and served through a fake cert fetcher (no network).
+"""
+import datetime
+import threading
+import time
+from unittest import mock
+
+import jwt
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.core import auth
+from app.core.auth import SigningKeys, TokenVerifier
+
+pytestmark = pytest.mark.anyio
+
+PROJECT = "sponfa-local"
+
+
+def mint_key():
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "local")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=1))
+        .sign(key, hashes.SHA256())
+    )
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+def mint_token(key, kid, **overrides):
+    now = int(time.time())
+    claims = {
+        "aud": PROJECT, "iss": f"https://securetoken.google.com/{PROJECT}",
+        "sub": "user-1", "iat": now, "auth_time": now, "exp": now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture(scope="module")
+def keys_ab():
+    return mint_key(), mint_key()
+
+
+@pytest.fixture
+def published(keys_ab):
+    (_, cert_a), _ = keys_ab
+    return {"a": cert_a}
+
+
+@pytest.fixture
+def verifier(published):
+    async def fetch():
+        return dict(published), 3600.0
+
+    return TokenVerifier(PROJECT, SigningKeys(fetch, min_refetch_seconds=0.0), cache_size=100)
+
+
+async def test_good_token_verifies_and_is_cached(verifier, keys_ab):
+    (key_a, _), _ = keys_ab
+    token = mint_token(key_a, "a")
+    claims = await verifier.verify(token)
+    assert claims["uid"] == "user-1"
+    for _ in range(100):
+        assert await verifier.verify(token) is claims
+    assert verifier.keys.fetches == 1
+
+
+@pytest.mark.parametrize("label, overrides", [
+    ("wrong audience", {"aud": "other"}),
+    ("wrong issuer", {"iss": "https://example.com"}),
+    ("expired", {"exp": int(time.time()) - 60}),
+    ("empty sub", {"sub": ""}),
+    ("future auth_time", {"auth_time": int(time.time()) + 3600}),
+    ("string auth_time", {"auth_time": "yesterday"}),
+    ("null auth_time", {"auth_time": None}),
+])
+async def test_bad_claims_are_rejected(verifier, keys_ab, label, overrides):
+    (key_a, _), _ = keys_ab
+    with pytest.raises(jwt.InvalidTokenError):
+        await verifier.verify(mint_token(key_a, "a", **overrides))
+
+
+async def test_bad_signature_and_unknown_kid_are_rejected(verifier, keys_ab):
+    _, (key_b, _) = keys_ab
+    with pytest.raises(jwt.InvalidTokenError):
+        await verifier.verify(mint_token(key_b, "a"))
+    with pytest.raises(jwt.InvalidTokenError):
+        await verifier.verify(mint_token(key_b, "b"))
+
+
+async def test_rotated_kid_refetches_once(verifier, published, keys_ab):
+    (key_a, _), (key_b, cert_b) = keys_ab
+    await verifier.verify(mint_token(key_a, "a"))
+    fetches = verifier.keys.fetches
+    # Google rotates a new key in; the first token using it refetches once
+    published["b"] = cert_b
+    claims = await verifier.verify(mint_token(key_b, "b", sub="user-2"))
+    assert claims["uid"] == "user-2"
+    assert verifier.keys.fetches == fetches + 1
+
+
+def test_firebase_admin_initializes_once_under_concurrency():
+    apps = []
+
+    def get_app():
+        if not apps:
+            raise ValueError("no default app")
+        return apps[0]
+
+    def initialize_app():
+        if apps:
+            raise ValueError("The default Firebase app already exists.")
+        time.sleep(0.01)  # widen the race
+        apps.append(object())
+        return apps[0]
+
+    firebase_admin = mock.MagicMock(get_app=get_app, initialize_app=initialize_app)
+    fb_auth = mock.MagicMock(verify_id_token=lambda token: {"uid": token})
+    firebase_admin.auth = fb_auth
+    errors = []
+
+    def verify(i):
+        try:
+            auth._firebase_admin_verify(f"user-{i}")
+        except Exception as e:
+            errors.append(e)
+
+    with mock.patch.dict("sys.modules", {"firebase_admin": firebase_admin, "firebase_admin.auth": fb_auth}):
+        threads = [threading.Thread(target=verify, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    assert errors == []
+    assert len(apps) == 1